@@ -0,0 +1,159 @@
+from collections import OrderedDict
+import os
+import threading
+import numpy as np
+
+# Columnar day files: one array per column, np.savez_compressed (zip + deflate).
+# Strings are stored as one UTF-8 byte array plus offsets, so no pickling is
+# needed to read them back; every column has a null mask.
+ARCHIVE_FORMAT_VERSION = 1
+# Column kinds; every other column is an integer
+STRING_COLUMNS = {"timestamp", "patient_id", "risk_level", "explanation"}
+FLOAT_COLUMNS = {"temperature"}
+# Decoded day files kept in memory for repeated /history pages
+ARCHIVE_CACHE_DAYS = 8
+
+_cache = OrderedDict()  # (path, inode, mtime_ns) -> decoded columns
+_cache_lock = threading.Lock()
+
+def day_path(directory, day):
+    return os.path.join(directory, f"readings-{day}.npz")
+
+def list_days(directory):
+    """Days with an archive file in directory, oldest first"""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(name[len("readings-"):-len(".npz")] for name in os.listdir(directory)
+                  if name.startswith("readings-") and name.endswith(".npz"))
+
+def _pack(name, values, arrays):
+    null = np.array([value is None for value in values], dtype=bool)
+    arrays[f"{name}__null"] = null
+    if name in STRING_COLUMNS:
+        encoded = [(value or "").encode("utf-8") for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        arrays[f"{name}__data"] = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        arrays[f"{name}__offsets"] = offsets
+    elif name in FLOAT_COLUMNS:
+        arrays[name] = np.array([0.0 if value is None else value for value in values], dtype=np.float64)
+    else:
+        arrays[name] = np.array([0 if value is None else value for value in values], dtype=np.int64)
+
+def _unpack(name, arrays):
+    null = arrays[f"{name}__null"]
+    if name in STRING_COLUMNS:
+        blob = arrays[f"{name}__data"].tobytes()
+        offsets = arrays[f"{name}__offsets"].tolist()
+        values = [blob[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(null))]
+    else:
+        values = arrays[name].tolist()
+    column = np.empty(len(values), dtype=object)
+    column[:] = values
+    column[null] = None
+    return column
+
+def read_day(path):
+    """Decoded columns of a day file: {"id": int64 array, other columns: object arrays}"""
+    with open(path, "rb") as f:
+        # Identity of the file actually opened: a concurrent os.replace can't pair it with
+        # stale rows, and a rewrite within the mtime granularity still gets a new inode
+        stat = os.fstat(f.fileno())
+        key = (path, stat.st_ino, stat.st_mtime_ns)
+        with _cache_lock:
+            if key in _cache:
+                _cache.move_to_end(key)
+                return _cache[key]
+        with np.load(f, allow_pickle=False) as arrays:
+            names = [str(name) for name in arrays["__columns__"]]
+            columns = {name: _unpack(name, arrays) for name in names}
+    columns["id"] = columns["id"].astype(np.int64)
+    with _cache_lock:
+        _cache[key] = columns
+        while len(_cache) > ARCHIVE_CACHE_DAYS:
+            _cache.popitem(last=False)
+    return columns
+
+def day_rows(path):
+    """Every reading in a day file as dicts, oldest id first"""
+    columns = read_day(path)
+    return _rows(columns, np.arange(len(columns["id"])), list(columns))
+
+def _rows(columns, indices, names):
+    values = [columns[name][indices].tolist() for name in names]
+    return [dict(zip(names, row)) for row in zip(*values)]
+
+def write_day(directory, day, rows, replace=False):
+    """Merge rows into the day's file (same id: the new row wins), atomically.
+
+    With replace, the file holds exactly rows afterwards. Returns
+    (readings, min_id, max_id, bytes) of the file afterwards, or None if
+    it ended up empty and was removed.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = day_path(directory, day)
+    existing = day_rows(path) if os.path.exists(path) and not replace else []
+    merged = {row["id"]: row for row in existing}
+    merged.update((row["id"], row) for row in rows)
+    if not merged:
+        if os.path.exists(path):
+            os.remove(path)
+        return None
+    ordered = [merged[reading_id] for reading_id in sorted(merged)]
+    names = list(ordered[0])
+    arrays = {"__columns__": np.array(names), "__version__": np.array(ARCHIVE_FORMAT_VERSION)}
+    for name in names:
+        _pack(name, [row[name] for row in ordered], arrays)
+
+    # Readers only ever see a complete file under the final name
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(f, **arrays)
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+    return len(ordered), ordered[0]["id"], ordered[-1]["id"], os.path.getsize(path)
+
+def remove_patient(directory, day, patient_id):
+    """Rewrite a day file without one patient's readings; same return as write_day"""
+    path = day_path(directory, day)
+    kept = [row for row in day_rows(path) if row["patient_id"] != patient_id]
+    if not kept:
+        os.remove(path)
+        return None
+    # replace, or the merge would bring the removed readings back; the old
+    # file stays in place until write_day swaps in the new one
+    return write_day(directory, day, kept, replace=True)
+
+def select(path, names, patient_id=None, risk_level=None, start=None, end=None,
+           before_id=None, since_id=None, descending=True, limit=None):
+    """Readings in a day file matching get_readings' filters, ordered by id"""
+    columns = read_day(path)
+    ids = columns["id"]
+    mask = np.ones(len(ids), dtype=bool)
+    if before_id is not None:
+        mask &= ids < before_id
+    if since_id is not None:
+        mask &= ids > since_id
+    for name, value in (("patient_id", patient_id), ("risk_level", risk_level)):
+        if value is not None:
+            mask &= columns[name] == value
+    if start is not None:
+        mask &= columns["timestamp"] >= start
+    if end is not None:
+        mask &= columns["timestamp"] <= end
+    indices = np.flatnonzero(mask)
+    # Files are written sorted by id
+    if descending:
+        indices = indices[::-1]
+    if limit is not None:
+        indices = indices[:limit]
+    return _rows(columns, indices, names)
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
@@ -0,0 +1,170 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import logging
+import threading
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Threads per breaker running calls that have a call_timeout
+CALL_WORKERS = 4
+
+logger = logging.getLogger("cardiosense.circuit_breaker")
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a dependency whose breaker is open"""
+
+class CircuitBreaker:
+    """Failure-rate circuit breaker with a background recovery probe.
+
+    The breaker opens when at least failure_rate of the last `window`
+    calls failed (once min_calls have been seen). A call counts as failed
+    if it raised or took longer than slow_call_seconds. With call_timeout
+    set, the caller never waits longer than that for a call: it runs on the
+    breaker's threads and, if still running at the timeout, counts as failed
+    and raises TimeoutError while it finishes in the background. While open, calls
+    are rejected at once with CircuitOpenError. After open_seconds the
+    breaker goes half-open and runs probe() in a background thread: success
+    closes it, failure (or outlasting call_timeout) keeps it open for another
+    open_seconds. Requests never serve as the trial call.
+    """
+
+    def __init__(self, name, probe, failure_rate=0.5, window=10, min_calls=4,
+                 open_seconds=30.0, slow_call_seconds=None, call_timeout=None):
+        self.name = name
+        self.probe = probe
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.slow_call_seconds = slow_call_seconds
+        self.call_timeout = call_timeout
+        self._executor = None
+        self.state = CLOSED
+        self._outcomes = deque(maxlen=window)  # True for a failed call
+        self._lock = threading.Lock()
+        self._timer = None
+        self.opened_at = None
+        self.last_error = None
+        self.times_opened = 0
+        self.rejected = 0
+        self.probes = 0
+
+    def allow(self):
+        """True if the dependency may be called; counts a rejection otherwise"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            self.rejected += 1
+            return False
+
+    def check(self):
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+    def record(self, duration, error=None):
+        """Record one call's outcome; may open the breaker"""
+        slow = self.slow_call_seconds is not None and duration > self.slow_call_seconds
+        with self._lock:
+            if self.state != CLOSED:
+                return
+            if error is not None or slow:
+                self.last_error = str(error) if error is not None else f"call took {duration:.2f}s"
+            self._outcomes.append(error is not None or slow)
+            failures = sum(self._outcomes)
+            if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.failure_rate:
+                self._open()
+
+    def call(self, fn, *args, **kwargs):
+        self.check()
+        start = time.monotonic()
+        try:
+            result = self._invoke(fn, *args, **kwargs)
+        except Exception as e:
+            self.record(time.monotonic() - start, e)
+            raise
+        self.record(time.monotonic() - start)
+        return result
+
+    def _invoke(self, fn, *args, **kwargs):
+        if self.call_timeout is None:
+            return fn(*args, **kwargs)
+        return self._call_with_timeout(fn, *args, **kwargs)
+
+    def _call_with_timeout(self, fn, *args, **kwargs):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=CALL_WORKERS, thread_name_prefix=self.name)
+            executor = self._executor
+        future = executor.submit(fn, *args, **kwargs)
+        try:
+            return future.result(timeout=self.call_timeout)
+        except TimeoutError:
+            if future.done():
+                raise  # fn itself raised TimeoutError
+            raise TimeoutError(f"call timed out after {self.call_timeout}s") from None
+
+    def _open(self):
+        # Called with the lock held
+        self.state = OPEN
+        self.opened_at = datetime.now().isoformat()
+        self.times_opened += 1
+        self._outcomes.clear()
+        logger.warning("%s circuit opened: %s", self.name, self.last_error)
+        self._schedule_probe()
+
+    def _schedule_probe(self):
+        self._timer = threading.Timer(self.open_seconds, self._run_probe)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _run_probe(self):
+        with self._lock:
+            if self.state != OPEN:
+                return
+            self.state = HALF_OPEN
+            self.probes += 1
+        try:
+            # Bounded like any call, so a hung probe cannot leave the breaker half-open for good
+            self._invoke(self.probe)
+        except Exception as e:
+            with self._lock:
+                if self.state != HALF_OPEN:
+                    return  # reset meanwhile
+                self.last_error = f"probe failed: {e}"
+                self.state = OPEN
+                self._schedule_probe()
+            return
+        with self._lock:
+            if self.state != HALF_OPEN:
+                return
+            self.state = CLOSED
+            self.opened_at = None
+            self._timer = None
+        logger.info("%s circuit closed after a successful probe", self.name)
+
+    def reset(self):
+        """Close the breaker and forget recorded calls"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self.state = CLOSED
+            self.opened_at = None
+            self._outcomes.clear()
+
+    def status(self):
+        with self._lock:
+            calls = len(self._outcomes)
+            return {
+                "state": self.state,
+                "failure_rate": round(sum(self._outcomes) / calls, 3) if calls else 0.0,
+                "recent_calls": calls,
+                "opened_at": self.opened_at,
+                "times_opened": self.times_opened,
+                "rejected": self.rejected,
+                "probes": self.probes,
+                "last_error": self.last_error,
+            }
@@ -1,16 +1,187 @@
 import sqlite3
-from datetime import datetime
+import threading
+import queue
+import atexit
+import time
+from concurrent.futures import Future
+from datetime import datetime, timedelta
 import json
+import logging
+import os
+import archive
 
 DB_PATH = "cardiosense.db"
+# Day files of archived readings; None puts them in "<DB_PATH>-archive" next to the database
+ARCHIVE_DIR = None
+# Free pages returned to the filesystem per writer transaction while vacuuming
+VACUUM_STEP_PAGES = 256
+
+# Write-behind tuning: the writer thread groups queued writes into one
+# transaction, lingering up to WRITE_FLUSH_INTERVAL for more to arrive
+WRITE_FLUSH_INTERVAL = 0.01  # seconds
+WRITE_BATCH_SIZE = 256
+WRITE_QUEUE_DEPTH = 1024  # save_reading blocks when this many writes are pending
+
+PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",  # WAL + NORMAL: durable at checkpoints, no fsync per commit
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-8000",  # 8 MB page cache
+    "PRAGMA temp_store=MEMORY",
+]
+
+_initialized_path = None
+_init_lock = threading.Lock()
+
+def ensure_db():
+    """Create the schema once per process (and per DB_PATH)"""
+    global _initialized_path
+    if _initialized_path != DB_PATH:
+        with _init_lock:
+            if _initialized_path != DB_PATH:
+                init_db()
+                _initialized_path = DB_PATH
+
+def _open(path):
+    conn = sqlite3.connect(path, isolation_level=None)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+# Reader connections, one per thread, reused across requests
+_local = threading.local()
+
+def _connect():
+    ensure_db()
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.path != DB_PATH:
+        if conn is not None:
+            conn.close()
+        conn = _open(DB_PATH)
+        _local.conn = conn
+        _local.path = DB_PATH
+    return conn
+
+# Single writer thread with a bounded queue of (fn, future) requests
+_STOP = object()
+_write_queue = queue.Queue(maxsize=WRITE_QUEUE_DEPTH)
+_writer_thread = None
+_writer_lock = threading.Lock()
+
+def _run_batch(conn, batch):
+    conn.execute("BEGIN IMMEDIATE")
+    results = []
+    for fn, future in batch:
+        # A savepoint per write so one failure does not discard the others
+        conn.execute("SAVEPOINT write")
+        try:
+            results.append((future, fn(conn), None))
+            conn.execute("RELEASE write")
+        except Exception as e:
+            conn.execute("ROLLBACK TO write")
+            conn.execute("RELEASE write")
+            results.append((future, None, e))
+    conn.execute("COMMIT")
+    # Only report results once they are committed and visible to readers
+    for future, result, error in results:
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+
+def _writer_loop():
+    conn = None
+    path = None
+    stopping = False
+    while not stopping:
+        item = _write_queue.get()
+        if item is _STOP:
+            break
+        batch = [item]
+        deadline = time.monotonic() + WRITE_FLUSH_INTERVAL
+        while len(batch) < WRITE_BATCH_SIZE:
+            try:
+                item = _write_queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if item is _STOP:
+                stopping = True
+                break
+            batch.append(item)
+        try:
+            if conn is None or path != DB_PATH:
+                if conn is not None:
+                    conn.close()
+                ensure_db()
+                conn, path = _open(DB_PATH), DB_PATH
+            _run_batch(conn, batch)
+        except Exception as e:
+            if conn is not None and conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+    if conn is not None:
+        conn.close()
+
+def _start_writer():
+    global _writer_thread
+    with _writer_lock:
+        if _writer_thread is None or not _writer_thread.is_alive():
+            _writer_thread = threading.Thread(target=_writer_loop, name="db-writer", daemon=True)
+            _writer_thread.start()
+
+def submit_write(fn):
+    """Queue fn(conn) to run inside the writer thread's next transaction.
+
+    Returns a Future that resolves to fn's result once it is committed.
+    """
+    _start_writer()
+    future = Future()
+    _write_queue.put((fn, future))
+    return future
+
+def flush():
+    """Wait until every write queued so far is committed"""
+    submit_write(lambda conn: None).result()
+
+def close_db():
+    """Flush pending writes and stop the writer thread"""
+    global _writer_thread
+    with _writer_lock:
+        thread, _writer_thread = _writer_thread, None
+    if thread is not None and thread.is_alive():
+        _write_queue.put(_STOP)
+        thread.join()
+
+atexit.register(close_db)
+
+logger = logging.getLogger(__name__)
+
+# Readings saved without a patient_id belong to this patient
+DEFAULT_PATIENT = "default"
+
+# Bumped whenever the schema changes; init_db migrates older files (PRAGMA user_version)
+SCHEMA_VERSION = 1
+
+# Tables derived from readings; safe to drop and rebuild during a migration
+DERIVED_TABLES = ["reading_stats", "risk_level_counts", "reading_rollups"]
 
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(DB_PATH, isolation_level=None)
+    if conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0] == 0:
+        # Only possible before the first table (and before WAL); lets retention shrink the file in steps
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
     cursor = conn.cursor()
-    cursor.execute("""
+    cursor.execute("BEGIN IMMEDIATE")
+    version = cursor.execute("PRAGMA user_version").fetchone()[0]
+    cursor.execute(f"""
         CREATE TABLE IF NOT EXISTS readings (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             timestamp TEXT NOT NULL,
+            patient_id TEXT NOT NULL DEFAULT '{DEFAULT_PATIENT}',
             heart_rate INTEGER,
             blood_pressure_systolic INTEGER,
             blood_pressure_diastolic INTEGER,
@@ -21,19 +192,292 @@ def init_db():
             explanation TEXT
         )
     """)
-    conn.commit()
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(readings)")]
+    if "patient_id" not in columns:
+        # Single-patient database from before patient_id existed
+        cursor.execute(f"ALTER TABLE readings ADD COLUMN patient_id TEXT NOT NULL DEFAULT '{DEFAULT_PATIENT}'")
+    
+    # Keyset pagination walks the id primary key; these back the filters.
+    # Per-patient queries use the (patient_id, ...) indexes so their cost
+    # does not grow with the number of other patients on the ward.
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_readings_timestamp ON readings(timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_readings_risk_level ON readings(risk_level, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_readings_patient_id ON readings(patient_id, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_readings_patient_timestamp ON readings(patient_id, timestamp)")
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS patients (
+            patient_id TEXT PRIMARY KEY,
+            name TEXT,
+            age INTEGER
+        )
+    """)
+    
+    if version < SCHEMA_VERSION:
+        for table in DERIVED_TABLES:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+    
+    # Running aggregates per patient for /report, updated in the same transaction as each insert
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS reading_stats (
+            patient_id TEXT PRIMARY KEY,
+            total_readings INTEGER NOT NULL DEFAULT 0,
+            sum_heart_rate REAL NOT NULL DEFAULT 0,
+            sum_blood_pressure_systolic REAL NOT NULL DEFAULT 0,
+            sum_blood_pressure_diastolic REAL NOT NULL DEFAULT 0,
+            sum_oxygen_saturation REAL NOT NULL DEFAULT 0,
+            sum_temperature REAL NOT NULL DEFAULT 0,
+            sum_risk_score REAL NOT NULL DEFAULT 0,
+            max_risk_score INTEGER,
+            max_risk_timestamp TEXT
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS risk_level_counts (
+            patient_id TEXT NOT NULL,
+            risk_level TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (patient_id, risk_level)
+        )
+    """)
+    
+    # Time-bucketed rollups per patient for /trends, also maintained on insert
+    rollup_columns = ",\n            ".join(f"{column} REAL" for column in _ROLLUP_COLUMNS)
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS reading_rollups (
+            patient_id TEXT NOT NULL,
+            resolution TEXT NOT NULL,
+            bucket_start TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            {rollup_columns},
+            {", ".join(f"{column} INTEGER NOT NULL DEFAULT 0" for column in _LEVEL_COLUMNS)},
+            PRIMARY KEY (patient_id, resolution, bucket_start)
+        )
+    """)
+    # Ward-wide trends merge every patient's bucket
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_rollups_resolution ON reading_rollups(resolution, bucket_start)")
+    
+    # One row per archived day file; the id range lets reads skip files that cannot match
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS archived_days (
+            day TEXT PRIMARY KEY,
+            readings INTEGER NOT NULL,
+            min_id INTEGER NOT NULL,
+            max_id INTEGER NOT NULL,
+            bytes INTEGER NOT NULL,
+            archived_at TEXT NOT NULL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_archived_days_ids ON archived_days(max_id, min_id)")
+    
+    if version < SCHEMA_VERSION:
+        # New or older database: derive the aggregates from the readings
+        _rebuild_aggregates(conn)
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    cursor.execute("COMMIT")
     conn.close()
 
-def save_reading(vitals, risk_score, risk_level, explanation):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO readings 
-        (timestamp, heart_rate, blood_pressure_systolic, blood_pressure_diastolic, 
-         oxygen_saturation, temperature, risk_score, risk_level, explanation)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
-        datetime.now().isoformat(),
+def _patient_scope(patient_id, prefix="WHERE"):
+    """SQL condition limiting a derived-table statement to one patient (or all)"""
+    if patient_id is None:
+        return "", []
+    return f"{prefix} patient_id = ?", [patient_id]
+
+def archive_dir():
+    return ARCHIVE_DIR or f"{os.path.splitext(DB_PATH)[0]}-archive"
+
+def _load_archived_day(conn, day, patient_id=None):
+    """Copy one archived day (one patient's readings, or all) into a temp table for rebuilding aggregates"""
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS archived_readings AS SELECT * FROM readings WHERE 0")
+    conn.execute("DELETE FROM temp.archived_readings")
+    path = archive.day_path(archive_dir(), day)
+    if not os.path.exists(path):
+        return
+    placeholders = ", ".join("?" for _ in READING_COLUMNS)
+    conn.executemany(
+        f"INSERT INTO temp.archived_readings ({', '.join(READING_COLUMNS)}) VALUES ({placeholders})",
+        [[row[column] for column in READING_COLUMNS] for row in archive.day_rows(path)
+         if patient_id is None or row["patient_id"] == patient_id]
+    )
+
+def _rebuild_aggregates(conn, patient_id=None):
+    """Recompute stats and rollups from the readings, archived ones included.
+
+    Archived days are folded in one file at a time, so the temp table
+    never holds more than a day; oldest first, like the readings after
+    them, so ties on the highest risk still go to the earliest reading.
+    """
+    _clear_stats(conn, patient_id)
+    _clear_rollups(conn, patient_id)
+    for (day,) in conn.execute("SELECT day FROM archived_days ORDER BY day").fetchall():
+        _load_archived_day(conn, day, patient_id)
+        _add_stats(conn, patient_id, "temp.archived_readings")
+        _add_rollups(conn, patient_id, "temp.archived_readings")
+        conn.execute("DELETE FROM temp.archived_readings")
+    _add_stats(conn, patient_id)
+    _add_rollups(conn, patient_id)
+
+def _rebuild_stats(conn, patient_id=None):
+    """Recompute the running aggregates from the readings table"""
+    _clear_stats(conn, patient_id)
+    _add_stats(conn, patient_id)
+
+def _clear_stats(conn, patient_id=None):
+    scope, params = _patient_scope(patient_id)
+    conn.execute(f"DELETE FROM reading_stats {scope}", params)
+    conn.execute(f"DELETE FROM risk_level_counts {scope}", params)
+
+def _add_stats(conn, patient_id=None, source="readings"):
+    """Fold a table of readings into the running aggregates, as _apply_stats does one row"""
+    scope, params = _patient_scope(patient_id, "AND")
+    # WHERE true: an upsert's SELECT needs a WHERE clause to parse unambiguously
+    conn.execute(f"""
+        INSERT INTO reading_stats
+        (patient_id, total_readings, sum_heart_rate, sum_blood_pressure_systolic, sum_blood_pressure_diastolic,
+         sum_oxygen_saturation, sum_temperature, sum_risk_score, max_risk_score, max_risk_timestamp)
+        SELECT patient_id, COUNT(*),
+            COALESCE(SUM(heart_rate), 0),
+            COALESCE(SUM(blood_pressure_systolic), 0),
+            COALESCE(SUM(blood_pressure_diastolic), 0),
+            COALESCE(SUM(oxygen_saturation), 0),
+            COALESCE(SUM(temperature), 0),
+            COALESCE(SUM(risk_score), 0),
+            MAX(risk_score),
+            (SELECT timestamp FROM {source} AS m
+             WHERE m.patient_id = r.patient_id AND risk_score IS NOT NULL
+             ORDER BY risk_score DESC, id ASC LIMIT 1)
+        FROM {source} AS r WHERE true {scope}
+        GROUP BY patient_id
+        ON CONFLICT(patient_id) DO UPDATE SET
+            total_readings = total_readings + excluded.total_readings,
+            sum_heart_rate = sum_heart_rate + excluded.sum_heart_rate,
+            sum_blood_pressure_systolic = sum_blood_pressure_systolic + excluded.sum_blood_pressure_systolic,
+            sum_blood_pressure_diastolic = sum_blood_pressure_diastolic + excluded.sum_blood_pressure_diastolic,
+            sum_oxygen_saturation = sum_oxygen_saturation + excluded.sum_oxygen_saturation,
+            sum_temperature = sum_temperature + excluded.sum_temperature,
+            sum_risk_score = sum_risk_score + excluded.sum_risk_score,
+            max_risk_timestamp = CASE WHEN max_risk_score IS NULL OR excluded.max_risk_score > max_risk_score
+                                      THEN excluded.max_risk_timestamp ELSE max_risk_timestamp END,
+            max_risk_score = CASE WHEN max_risk_score IS NULL OR excluded.max_risk_score > max_risk_score
+                                  THEN excluded.max_risk_score ELSE max_risk_score END
+    """, params)
+    conn.execute(f"""
+        INSERT INTO risk_level_counts (patient_id, risk_level, count)
+        SELECT patient_id, risk_level, COUNT(*) FROM {source} WHERE true {scope} GROUP BY patient_id, risk_level
+        ON CONFLICT(patient_id, risk_level) DO UPDATE SET count = count + excluded.count
+    """, params)
+
+def _apply_stats(conn, row):
+    """Fold one inserted reading row into its patient's running aggregates"""
+    timestamp, patient_id, heart_rate, systolic, diastolic, spo2, temperature, risk_score, risk_level, _ = row
+    conn.execute("""
+        INSERT INTO reading_stats
+        (patient_id, total_readings, sum_heart_rate, sum_blood_pressure_systolic, sum_blood_pressure_diastolic,
+         sum_oxygen_saturation, sum_temperature, sum_risk_score, max_risk_score, max_risk_timestamp)
+        VALUES (?, 1, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(patient_id) DO UPDATE SET
+            total_readings = total_readings + 1,
+            sum_heart_rate = sum_heart_rate + excluded.sum_heart_rate,
+            sum_blood_pressure_systolic = sum_blood_pressure_systolic + excluded.sum_blood_pressure_systolic,
+            sum_blood_pressure_diastolic = sum_blood_pressure_diastolic + excluded.sum_blood_pressure_diastolic,
+            sum_oxygen_saturation = sum_oxygen_saturation + excluded.sum_oxygen_saturation,
+            sum_temperature = sum_temperature + excluded.sum_temperature,
+            sum_risk_score = sum_risk_score + excluded.sum_risk_score,
+            max_risk_timestamp = CASE WHEN max_risk_score IS NULL OR excluded.max_risk_score > max_risk_score
+                                      THEN excluded.max_risk_timestamp ELSE max_risk_timestamp END,
+            max_risk_score = CASE WHEN max_risk_score IS NULL OR excluded.max_risk_score > max_risk_score
+                                  THEN excluded.max_risk_score ELSE max_risk_score END
+    """, (patient_id, heart_rate or 0, systolic or 0, diastolic or 0, spo2 or 0, temperature or 0, risk_score or 0,
+          risk_score, timestamp if risk_score is not None else None))
+    conn.execute("""
+        INSERT INTO risk_level_counts (patient_id, risk_level, count) VALUES (?, ?, 1)
+        ON CONFLICT(patient_id, risk_level) DO UPDATE SET count = count + 1
+    """, (patient_id, risk_level))
+
+# Rolled-up vitals and the timestamp prefix that identifies each bucket
+ROLLUP_FIELDS = [
+    "heart_rate",
+    "blood_pressure_systolic",
+    "blood_pressure_diastolic",
+    "oxygen_saturation",
+    "temperature",
+    "risk_score",
+]
+ROLLUP_RESOLUTIONS = {
+    "minute": (16, ":00"),  # 2024-01-01T08:30 -> 2024-01-01T08:30:00
+    "hour": (13, ":00:00"),
+    "day": (10, "T00:00:00"),
+}
+RISK_LEVELS = ["LOW", "MODERATE", "HIGH", "CRITICAL"]
+_ROLLUP_COLUMNS = [f"{field}_{stat}" for field in ROLLUP_FIELDS for stat in ("min", "max", "sum")]
+_LEVEL_COLUMNS = [f"{level.lower()}_count" for level in RISK_LEVELS]
+
+def _bucket_start(timestamp, resolution):
+    length, suffix = ROLLUP_RESOLUTIONS[resolution]
+    return timestamp[:length] + suffix
+
+def _rebuild_rollups(conn, patient_id=None):
+    _clear_rollups(conn, patient_id)
+    _add_rollups(conn, patient_id)
+
+def _clear_rollups(conn, patient_id=None):
+    scope, params = _patient_scope(patient_id)
+    conn.execute(f"DELETE FROM reading_rollups {scope}", params)
+
+def _add_rollups(conn, patient_id=None, source="readings"):
+    """Fold a table of readings into the rollups, as _ROLLUP_UPSERT does one row"""
+    scope, params = _patient_scope(patient_id, "AND")
+    columns = ", ".join(_ROLLUP_COLUMNS)
+    aggregates = ", ".join(
+        f"{stat.upper()}({field})" for field in ROLLUP_FIELDS for stat in ("min", "max", "sum")
+    )
+    level_columns = ", ".join(_LEVEL_COLUMNS)
+    level_counts = ", ".join(f"SUM(risk_level = '{level}')" for level in RISK_LEVELS)
+    for resolution, (length, suffix) in ROLLUP_RESOLUTIONS.items():
+        conn.execute(f"""
+            INSERT INTO reading_rollups (patient_id, resolution, bucket_start, count, {columns}, {level_columns})
+            SELECT patient_id, ?, substr(timestamp, 1, {length}) || '{suffix}', COUNT(*), {aggregates}, {level_counts}
+            FROM {source} WHERE true {scope}
+            GROUP BY patient_id, substr(timestamp, 1, {length})
+            {_ROLLUP_CONFLICT}
+        """, [resolution] + params)
+
+# Merges a bucket into the existing one, for both single rows and folded tables
+_ROLLUP_CONFLICT = f"""
+    ON CONFLICT(patient_id, resolution, bucket_start) DO UPDATE SET count = count + excluded.count, {", ".join(
+        [f"{field}_min = MIN({field}_min, excluded.{field}_min)" for field in ROLLUP_FIELDS]
+        + [f"{field}_max = MAX({field}_max, excluded.{field}_max)" for field in ROLLUP_FIELDS]
+        + [f"{field}_sum = {field}_sum + excluded.{field}_sum" for field in ROLLUP_FIELDS]
+        + [f"{column} = {column} + excluded.{column}" for column in _LEVEL_COLUMNS]
+    )}
+"""
+_ROLLUP_UPSERT = f"""
+    INSERT INTO reading_rollups
+    (patient_id, resolution, bucket_start, count, {", ".join(_ROLLUP_COLUMNS + _LEVEL_COLUMNS)})
+    VALUES (?, ?, ?, 1, {", ".join("?" for _ in _ROLLUP_COLUMNS + _LEVEL_COLUMNS)})
+    {_ROLLUP_CONFLICT}
+"""
+
+def _apply_rollups(conn, row):
+    """Fold one inserted reading row into its patient's minute, hour and day buckets"""
+    timestamp, patient_id, heart_rate, systolic, diastolic, spo2, temperature, risk_score, risk_level, _ = row
+    values = [heart_rate, systolic, diastolic, spo2, temperature, risk_score]
+    params = [value for value in values for _ in range(3)]
+    params += [1 if risk_level == level else 0 for level in RISK_LEVELS]
+    for resolution in ROLLUP_RESOLUTIONS:
+        conn.execute(_ROLLUP_UPSERT, [patient_id, resolution, _bucket_start(timestamp, resolution)] + params)
+
+INSERT_READING = """
+    INSERT INTO readings
+    (timestamp, patient_id, heart_rate, blood_pressure_systolic, blood_pressure_diastolic,
+     oxygen_saturation, temperature, risk_score, risk_level, explanation)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+def _reading_row(timestamp, vitals, risk_score, risk_level, explanation):
+    return (
+        timestamp,
+        getattr(vitals, "patient_id", None) or DEFAULT_PATIENT,
         vitals.heart_rate,
         vitals.blood_pressure_systolic,
         vitals.blood_pressure_diastolic,
@@ -42,62 +486,215 @@ def save_reading(vitals, risk_score, risk_level, explanation):
         risk_score,
         risk_level,
         explanation
-    ))
-    conn.commit()
-    conn.close()
+    )
 
-def get_all_readings():
-    conn = sqlite3.connect(DB_PATH)
+def _insert_reading(conn, row):
+    reading_id = conn.execute(INSERT_READING, row).lastrowid
+    _apply_stats(conn, row)
+    _apply_rollups(conn, row)
+    return reading_id
+
+def save_reading(vitals, risk_score, risk_level, explanation, timestamp=None):
+    """Queue the insert for the writer thread and return the committed row id"""
+    row = _reading_row(timestamp or datetime.now().isoformat(), vitals, risk_score, risk_level, explanation)
+    return submit_write(lambda conn: _insert_reading(conn, row)).result()
+
+def update_explanation(reading_id, explanation):
+    submit_write(
+        lambda conn: conn.execute("UPDATE readings SET explanation = ? WHERE id = ?", (explanation, reading_id))
+    ).result()
+
+def get_reading_explanation(reading_id):
+    """Return (found, explanation); explanation is None while still pending"""
+    conn = _connect()
     cursor = conn.cursor()
-    cursor.execute("SELECT * FROM readings ORDER BY timestamp DESC")
-    rows = cursor.fetchall()
-    conn.close()
+    cursor.execute("SELECT explanation FROM readings WHERE id = ?", (reading_id,))
+    row = cursor.fetchone()
+    if row is None:
+        archived = _archived_readings(conn, [], 1, since_id=reading_id - 1, before_id=reading_id + 1)
+        if archived:
+            return True, archived[0]["explanation"]
+        return False, None
+    return True, row[0]
+
+def save_readings(entries, timestamp=None):
+    """Insert many (vitals, risk_score, risk_level, explanation) tuples in one transaction.
+
+    Returns the new row ids in order.
+    """
+    timestamp = timestamp or datetime.now().isoformat()
+    rows = [
+        _reading_row(timestamp, vitals, risk_score, risk_level, explanation)
+        for vitals, risk_score, risk_level, explanation in entries
+    ]
+    return submit_write(lambda conn: [_insert_reading(conn, row) for row in rows]).result()
+
+READING_COLUMNS = [
+    "id",
+    "timestamp",
+    "patient_id",
+    "heart_rate",
+    "blood_pressure_systolic",
+    "blood_pressure_diastolic",
+    "oxygen_saturation",
+    "temperature",
+    "risk_score",
+    "risk_level",
+    "explanation",
+]
+
+def get_readings(limit=None, before_id=None, since_id=None, risk_level=None,
+                 start=None, end=None, include_explanation=True, patient_id=None):
+    """Keyset-paginated readings.
+
+    Newest first, optionally older than before_id. With since_id, only rows
+    newer than since_id are returned, oldest first, so pollers can fetch
+    deltas. start/end bound the ISO-8601 timestamp (inclusive). patient_id
+    limits the rows to one patient.
+    """
+    columns = READING_COLUMNS if include_explanation else READING_COLUMNS[:-1]
+    conditions = []
+    params = []
+    if patient_id is not None:
+        conditions.append("patient_id = ?")
+        params.append(patient_id)
+    if before_id is not None:
+        conditions.append("id < ?")
+        params.append(before_id)
+    if since_id is not None:
+        conditions.append("id > ?")
+        params.append(since_id)
+    if risk_level is not None:
+        conditions.append("risk_level = ?")
+        params.append(risk_level)
+    if start is not None:
+        conditions.append("timestamp >= ?")
+        params.append(start)
+    if end is not None:
+        conditions.append("timestamp <= ?")
+        params.append(end)
     
-    readings = []
-    for row in rows:
-        readings.append({
-            "id": row[0],
-            "timestamp": row[1],
-            "heart_rate": row[2],
-            "blood_pressure_systolic": row[3],
-            "blood_pressure_diastolic": row[4],
-            "oxygen_saturation": row[5],
-            "temperature": row[6],
-            "risk_score": row[7],
-            "risk_level": row[8],
-            "explanation": row[9]
-        })
-    return readings
-
-def get_summary_report():
-    conn = sqlite3.connect(DB_PATH)
+    query = f"SELECT {', '.join(columns)} FROM readings"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY id ASC" if since_id is not None else " ORDER BY id DESC"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+    
+    conn = _connect()
     cursor = conn.cursor()
+    cursor.execute(query, params)
+    rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
     
-    cursor.execute("SELECT COUNT(*) FROM readings")
-    total_readings = cursor.fetchone()[0]
+    # Older readings may have been moved to the archive; merge in any that match
+    archived = _archived_readings(conn, rows, limit, columns, patient_id=patient_id, before_id=before_id,
+                                  since_id=since_id, risk_level=risk_level, start=start, end=end)
+    if archived:
+        descending = since_id is None
+        by_id = {row["id"]: row for row in archived}
+        by_id.update((row["id"], row) for row in rows)
+        rows = [by_id[reading_id] for reading_id in sorted(by_id, reverse=descending)][:limit]
+    return rows
+
+def _archived_readings(conn, rows, limit, columns=READING_COLUMNS, patient_id=None, before_id=None,
+                       since_id=None, risk_level=None, start=None, end=None):
+    """Archived readings that could belong in a get_readings page after `rows`.
+
+    The archived_days catalog narrows the search to day files whose id and
+    date range can still contribute; usually none for recent pages.
+    """
+    descending = since_id is None
+    conditions = []
+    params = []
+    if before_id is not None:
+        conditions.append("min_id < ?")
+        params.append(before_id)
+    if since_id is not None:
+        conditions.append("max_id > ?")
+        params.append(since_id)
+    if start is not None:
+        conditions.append("day >= ?")
+        params.append(start[:10])
+    if end is not None:
+        conditions.append("day <= ?")
+        params.append(end[:10])
+    if limit is not None and len(rows) >= limit:
+        # A full page: only files with ids beyond its last row can change it
+        conditions.append("max_id > ?" if descending else "min_id < ?")
+        params.append(rows[-1]["id"])
+    query = "SELECT day, min_id, max_id FROM archived_days"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY max_id DESC" if descending else " ORDER BY min_id ASC"
+    days = conn.execute(query, params).fetchall()
+    
+    found = []
+    for day, min_id, max_id in days:
+        if limit is not None and len(found) >= limit:
+            # Stop once no remaining file can hold a better row than the limit-th found
+            found.sort(key=lambda row: row["id"], reverse=descending)
+            boundary = found[limit - 1]["id"]
+            if (max_id < boundary) if descending else (min_id > boundary):
+                break
+        path = archive.day_path(archive_dir(), day)
+        if not os.path.exists(path):
+            continue
+        found += archive.select(path, columns, patient_id=patient_id, risk_level=risk_level, start=start, end=end,
+                                before_id=before_id, since_id=since_id, descending=descending, limit=limit)
+    return found
+
+def iter_readings(chunk_size=500, **filters):
+    """Readings oldest first, fetched chunk_size rows at a time.
+
+    Yields lists of rows; each chunk is a keyset query on id, so a long
+    history is never held in memory at once. Takes get_readings' filters.
+    """
+    last_id = 0
+    while True:
+        chunk = get_readings(limit=chunk_size, since_id=last_id, **filters)
+        if not chunk:
+            return
+        yield chunk
+        last_id = chunk[-1]["id"]
+
+def get_all_readings():
+    return get_readings()
+
+def get_summary_report(patient_id=None):
+    """Summary of one patient's readings, or of the whole ward.
+
+    Reads the per-patient running aggregates instead of scanning readings.
+    """
+    scope, params = _patient_scope(patient_id)
+    conn = _connect()
+    cursor = conn.cursor()
+    
+    cursor.execute(f"""
+        SELECT SUM(total_readings), SUM(sum_heart_rate), SUM(sum_blood_pressure_systolic),
+               SUM(sum_blood_pressure_diastolic), SUM(sum_oxygen_saturation), SUM(sum_temperature),
+               SUM(sum_risk_score)
+        FROM reading_stats {scope}
+    """, params)
+    stats = cursor.fetchone()
+    total_readings = stats[0] or 0
     
     if total_readings == 0:
         return {"message": "No readings recorded"}
     
-    cursor.execute("""
-        SELECT 
-            AVG(heart_rate) as avg_hr,
-            AVG(blood_pressure_systolic) as avg_bp_sys,
-            AVG(blood_pressure_diastolic) as avg_bp_dia,
-            AVG(oxygen_saturation) as avg_spo2,
-            AVG(temperature) as avg_temp,
-            AVG(risk_score) as avg_risk
-        FROM readings
-    """)
-    averages = cursor.fetchone()
+    averages = [total / total_readings for total in stats[1:7]]
     
-    cursor.execute("SELECT risk_level, COUNT(*) FROM readings GROUP BY risk_level")
-    risk_distribution = dict(cursor.fetchall())
-    
-    cursor.execute("SELECT MAX(risk_score), timestamp FROM readings")
-    max_risk = cursor.fetchone()
+    cursor.execute(f"""
+        SELECT max_risk_score, max_risk_timestamp FROM reading_stats {scope}
+        ORDER BY max_risk_score DESC, max_risk_timestamp ASC LIMIT 1
+    """, params)
+    max_risk_score, max_risk_timestamp = cursor.fetchone()
     
-    conn.close()
+    cursor.execute(f"""
+        SELECT risk_level, SUM(count) FROM risk_level_counts {scope}
+        GROUP BY risk_level HAVING SUM(count) > 0 ORDER BY risk_level
+    """, params)
+    risk_distribution = dict(cursor.fetchall())
     
     return {
         "total_readings": total_readings,
@@ -110,14 +707,274 @@ def get_summary_report():
         },
         "risk_distribution": risk_distribution,
         "highest_risk": {
-            "score": max_risk[0],
-            "timestamp": max_risk[1]
+            "score": max_risk_score,
+            "timestamp": max_risk_timestamp
         }
     }
 
-def clear_all_readings():
-    conn = sqlite3.connect(DB_PATH)
+# Ward-wide buckets merge each patient's bucket: min of mins, max of maxes, sums of sums
+_ROLLUP_MERGE = ", ".join(
+    [f"{stat.upper()}({field}_{stat})" for field in ROLLUP_FIELDS for stat in ("min", "max", "sum")]
+    + [f"SUM({column})" for column in _LEVEL_COLUMNS]
+)
+
+def get_trends(resolution="hour", start=None, end=None, limit=500, patient_id=None):
+    """Rolled-up vitals per time bucket, oldest first.
+
+    Returns the most recent `limit` buckets between start and end
+    (ISO-8601, inclusive on bucket start), for one patient or the ward.
+    """
+    conditions = ["resolution = ?"]
+    params = [resolution]
+    if patient_id is not None:
+        conditions.append("patient_id = ?")
+        params.append(patient_id)
+    if start is not None:
+        conditions.append("bucket_start >= ?")
+        params.append(_bucket_start(start, resolution) if len(start) >= 10 else start)
+    if end is not None:
+        conditions.append("bucket_start <= ?")
+        params.append(end)
+    params.append(limit)
+    
+    conn = _connect()
     cursor = conn.cursor()
-    cursor.execute("DELETE FROM readings")
-    conn.commit()
+    cursor.execute(f"""
+        SELECT bucket_start, SUM(count), {_ROLLUP_MERGE}
+        FROM reading_rollups
+        WHERE {" AND ".join(conditions)}
+        GROUP BY bucket_start
+        ORDER BY bucket_start DESC
+        LIMIT ?
+    """, params)
+    
+    trends = []
+    for row in reversed(cursor.fetchall()):
+        bucket_start, count = row[0], row[1]
+        bucket = {"bucket_start": bucket_start, "count": count}
+        for i, field in enumerate(ROLLUP_FIELDS):
+            minimum, maximum, total = row[2 + i * 3: 5 + i * 3]
+            bucket[field] = {
+                "min": minimum,
+                "max": maximum,
+                "mean": round(total / count, 2) if total is not None else None
+            }
+        level_counts = row[2 + len(_ROLLUP_COLUMNS):]
+        bucket["risk_levels"] = dict(zip(RISK_LEVELS, level_counts))
+        trends.append(bucket)
+    return trends
+
+def rebuild_summary():
+    """Recompute every patient's aggregates from readings; reports whether they had drifted"""
+    before = get_summary_report()
+    submit_write(_rebuild_aggregates).result()
+    after = get_summary_report()
+    return {"consistent": before == after, "before": before, "after": after}
+
+def _clear(conn, patient_id=None):
+    """Delete the readings (and for the whole ward the archive catalog); returns the archived days"""
+    scope, params = _patient_scope(patient_id)
+    conn.execute(f"DELETE FROM readings {scope}", params)
+    if patient_id is None:
+        conn.execute("DELETE FROM archived_days")
+    _rebuild_stats(conn, patient_id)
+    _rebuild_rollups(conn, patient_id)
+    return archive.list_days(archive_dir())
+
+def _clear_archive(days, patient_id=None):
+    """Delete the day files, or rewrite them without one patient's readings"""
+    results = {}
+    for day in days:
+        path = archive.day_path(archive_dir(), day)
+        if patient_id is None:
+            if os.path.exists(path):
+                os.remove(path)
+        elif os.path.exists(path):
+            results[day] = archive.remove_patient(archive_dir(), day, patient_id)
+    if results:
+        submit_write(lambda conn: _record_cleared_days(conn, results)).result()
+
+def _record_cleared_days(conn, results):
+    for day, result in results.items():
+        if result is None:
+            conn.execute("DELETE FROM archived_days WHERE day = ?", (day,))
+        else:
+            _record_archived_day(conn, day, result)
+
+def clear_all_readings(patient_id=None):
+    """Delete every reading (archived ones too), or only one patient's.
+
+    Day files are only touched once the deletion is committed, so a clear
+    that rolls back leaves the archive as it was. One interrupted after the
+    commit can leave archived readings behind; clearing again removes them.
+    """
+    days = submit_write(lambda conn: _clear(conn, patient_id)).result()
+    _clear_archive(days, patient_id)
+
+def _record_archived_day(conn, day, result):
+    readings, min_id, max_id, size = result
+    conn.execute("""
+        INSERT INTO archived_days (day, readings, min_id, max_id, bytes, archived_at) VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(day) DO UPDATE SET readings = excluded.readings, min_id = excluded.min_id,
+            max_id = excluded.max_id, bytes = excluded.bytes, archived_at = excluded.archived_at
+    """, (day, readings, min_id, max_id, size, datetime.now().isoformat()))
+
+def _archive_day(conn, day, end, max_id, result):
+    conn.execute("DELETE FROM readings WHERE timestamp >= ? AND timestamp < ? AND id <= ?", (day, end, max_id))
+    _record_archived_day(conn, day, result)
+
+def archive_readings(older_than_days=None, before=None):
+    """Move readings older than the cutoff day into per-day archive files.
+
+    The cutoff is midnight older_than_days ago, or the day of `before`
+    (ISO-8601). Aggregates for /report and /trends are left as they are,
+    and get_readings still returns archived rows. Each day's file is
+    written before its rows are deleted, so an interrupted run only leaves
+    rows that the next run merges again. Returns what was moved.
+    """
+    if before is None:
+        before = (datetime.now() - timedelta(days=older_than_days)).date().isoformat()
+    cutoff = before[:10]
+    flush()
+    conn = _connect()
+    days = [row[0] for row in conn.execute(
+        "SELECT DISTINCT substr(timestamp, 1, 10) FROM readings WHERE timestamp < ? ORDER BY 1", (cutoff,)
+    )]
+    
+    # A day file missing from the catalog is left over from an interrupted clear, or from an
+    # interrupted run whose rows are all still in readings: either way it is rewritten, not merged
+    cataloged = {row[0] for row in conn.execute("SELECT day FROM archived_days")}
+    moved = []
+    for day in days:
+        end = min((datetime.fromisoformat(day) + timedelta(days=1)).date().isoformat(), cutoff)
+        cursor = conn.execute(
+            f"SELECT {', '.join(READING_COLUMNS)} FROM readings WHERE timestamp >= ? AND timestamp < ? ORDER BY id",
+            (day, end)
+        )
+        rows = [dict(zip(READING_COLUMNS, row)) for row in cursor.fetchall()]
+        if not rows:
+            continue
+        result = archive.write_day(archive_dir(), day, rows, replace=day not in cataloged)
+        max_id = rows[-1]["id"]
+        submit_write(lambda conn, day=day, end=end, max_id=max_id, result=result:
+                     _archive_day(conn, day, end, max_id, result)).result()
+        moved.append({"day": day, "readings": len(rows), "file_readings": result[0], "bytes": result[3]})
+        logger.info("Archived %d readings from %s", len(rows), day)
+    return {"cutoff": cutoff, "archived": sum(day["readings"] for day in moved), "days": moved}
+
+def _vacuum_step(conn, pages):
+    # Each statement frees one page; looping keeps the step in the writer's transaction
+    for _ in range(pages):
+        conn.execute("PRAGMA incremental_vacuum(1)")
+    return conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+def vacuum(max_pages=None):
+    """Return free pages to the filesystem a few at a time.
+
+    Runs as a series of small writer transactions so inserts are never
+    held up for long, then truncates the WAL. Needs auto_vacuum=INCREMENTAL,
+    which databases created by this version have; older files need
+    vacuum_full() once. Returns page counts and file size before and after.
+    """
+    conn = _connect()
+    size_before = _database_bytes()
+    pages_before = conn.execute("PRAGMA page_count").fetchone()[0]
+    free_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    incremental = conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    freed = 0
+    free = free_before
+    while incremental and free > 0 and (max_pages is None or freed < max_pages):
+        step = VACUUM_STEP_PAGES if max_pages is None else min(VACUUM_STEP_PAGES, max_pages - freed)
+        free = submit_write(lambda conn, step=step: _vacuum_step(conn, step)).result()
+        freed += step
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    return {
+        "incremental": incremental,
+        "pages_before": pages_before,
+        "pages_after": conn.execute("PRAGMA page_count").fetchone()[0],
+        "free_pages_before": free_before,
+        "free_pages_after": conn.execute("PRAGMA freelist_count").fetchone()[0],
+        "bytes_before": size_before,
+        "bytes_after": _database_bytes(),
+    }
+
+def _database_bytes():
+    """Size of the database file plus its write-ahead log"""
+    wal = DB_PATH + "-wal"
+    return os.path.getsize(DB_PATH) + (os.path.getsize(wal) if os.path.exists(wal) else 0)
+
+def vacuum_full():
+    """Rewrite the whole file and switch it to incremental auto-vacuum (offline maintenance)"""
+    flush()
+    conn = _open(DB_PATH)
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conn.execute("VACUUM")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
     conn.close()
+
+def get_archive_status():
+    """Archived days and the size of the live database"""
+    conn = _connect()
+    cursor = conn.execute("SELECT day, readings, min_id, max_id, bytes, archived_at FROM archived_days ORDER BY day")
+    columns = ["day", "readings", "min_id", "max_id", "bytes", "archived_at"]
+    days = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    return {
+        "archive_dir": os.path.abspath(archive_dir()),
+        "archived_readings": sum(day["readings"] for day in days),
+        "archive_bytes": sum(day["bytes"] for day in days),
+        "days": days,
+        "database_bytes": _database_bytes(),
+        "free_pages": conn.execute("PRAGMA freelist_count").fetchone()[0],
+        "incremental_vacuum": conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2,
+    }
+
+def save_patient(patient_id, name=None, age=None):
+    submit_write(lambda conn: conn.execute("""
+        INSERT INTO patients (patient_id, name, age) VALUES (?, ?, ?)
+        ON CONFLICT(patient_id) DO UPDATE SET name = excluded.name, age = excluded.age
+    """, (patient_id, name, age))).result()
+
+def get_patients(patient_id=None):
+    """Registered patients and patients with readings, with their reading counts"""
+    scope, params = _patient_scope(patient_id, "AND")
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT patient_id, name, age, COALESCE(total_readings, 0), max_risk_score
+        FROM patients LEFT JOIN reading_stats USING (patient_id)
+        WHERE 1 {scope}
+        UNION ALL
+        SELECT patient_id, NULL, NULL, total_readings, max_risk_score
+        FROM reading_stats
+        WHERE patient_id NOT IN (SELECT patient_id FROM patients) {scope}
+        ORDER BY patient_id
+    """, params + params)
+    columns = ["patient_id", "name", "age", "total_readings", "highest_risk_score"]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+def get_patient(patient_id):
+    patients = get_patients(patient_id)
+    return patients[0] if patients else None
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="CardioSense database maintenance")
+    parser.add_argument("command", choices=["rebuild-stats", "archive", "vacuum"])
+    parser.add_argument("--days", type=int, default=30, help="archive: move readings older than this many days")
+    parser.add_argument("--full", action="store_true", help="vacuum: rewrite the file (enables incremental vacuum)")
+    args = parser.parse_args()
+    
+    if args.command == "rebuild-stats":
+        result = rebuild_summary()
+        print("Aggregates were consistent" if result["consistent"] else "Aggregates had drifted and were rebuilt")
+        print(json.dumps(result["after"], indent=2))
+    elif args.command == "archive":
+        result = archive_readings(args.days)
+        print(f"Archived {result['archived']} readings older than {result['cutoff']} into {archive_dir()}")
+        print(json.dumps(vacuum(), indent=2))
+    elif args.command == "vacuum":
+        if args.full:
+            vacuum_full()
+        print(json.dumps(vacuum(), indent=2))
+    close_db()
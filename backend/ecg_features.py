@@ -0,0 +1,195 @@
+import numpy as np
+
+DEFAULT_SAMPLE_RATE = 500  # Hz
+DEFAULT_GAIN = 0.001  # mV per int16 count (1 µV resolution, ±32 mV range)
+
+# Beat template window around each R peak, seconds
+TEMPLATE_BEFORE_R = 0.35
+TEMPLATE_AFTER_R = 0.60
+
+class ECGError(ValueError):
+    """Raised when a strip is too short or has too few detectable beats"""
+
+def decode_int16(buffer, gain=DEFAULT_GAIN):
+    """Little-endian int16 samples -> float64 millivolts"""
+    if len(buffer) % 2:
+        raise ECGError("ECG buffer length must be a multiple of 2 bytes (int16 samples)")
+    return np.frombuffer(buffer, dtype="<i2").astype(np.float64) * gain
+
+def encode_int16(samples_mv, gain=DEFAULT_GAIN):
+    """Float millivolts -> little-endian int16 bytes, the /analyze/ecg wire format"""
+    counts = np.clip(np.round(np.asarray(samples_mv) / gain), -32768, 32767)
+    return counts.astype("<i2").tobytes()
+
+def _moving_average(x, width):
+    if width <= 1:
+        return x
+    # Edge-padded so the ends of a window are not pulled towards zero
+    padded = np.pad(x, (width // 2, width - 1 - width // 2), mode="edge")
+    return np.convolve(padded, np.ones(width) / width, mode="valid")
+
+def _half_sine(t, start, duration):
+    """Half-sine bump of unit height over [start, start + duration]"""
+    phase = (t - start) / duration
+    inside = (phase >= 0) & (phase <= 1)
+    return np.where(inside, np.sin(np.pi * np.clip(phase, 0, 1)), 0.0)
+
+def synthetic_ecg(duration=10.0, sample_rate=DEFAULT_SAMPLE_RATE, heart_rate=72,
+                  p_wave_duration=0.08, pr_interval=0.16, qrs_duration=0.09,
+                  qt_interval=0.40, t_wave_amplitude=0.3, st_segment_elevation=0.0,
+                  noise=0.005, baseline_wander=0.05, seed=0):
+    """Synthetic single-lead ECG strip in mV with known interval parameters.
+
+    Used by tests and benchmarks as ground truth for extract_features.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(duration * sample_rate)) / sample_rate
+    x = np.zeros_like(t)
+    rr = 60.0 / heart_rate
+
+    for beat_start in np.arange(0.1, duration, rr):
+        # P wave, then QRS onset one PR interval after the P onset
+        x += 0.15 * _half_sine(t, beat_start, p_wave_duration)
+        qrs_on = beat_start + pr_interval
+
+        # QRS as a piecewise-linear Q dip, R spike and S dip returning to the ST level
+        knots_t = qrs_on + qrs_duration * np.array([0.0, 0.15, 0.45, 0.70, 1.0])
+        knots_v = np.array([0.0, -0.10, 1.20, -0.25, st_segment_elevation])
+        inside = (t >= knots_t[0]) & (t <= knots_t[-1])
+        x[inside] += np.interp(t[inside], knots_t, knots_v)
+
+        # ST segment at the elevation level, ramping back to baseline across the T wave
+        j_point = qrs_on + qrs_duration
+        t_end = qrs_on + qt_interval
+        t_on = j_point + 0.45 * (t_end - j_point)
+        st = (t > j_point) & (t <= t_end)
+        x[st] += st_segment_elevation * np.clip((t_end - t[st]) / (t_end - t_on), 0, 1)
+        x += t_wave_amplitude * _half_sine(t, t_on, t_end - t_on)
+
+    x += baseline_wander * np.sin(2 * np.pi * 0.3 * t)
+    x += rng.normal(0, noise, t.size)
+    return x
+
+def detect_r_peaks(x, sample_rate):
+    """Indices of R peaks using a slope-energy detector (Pan-Tompkins style)"""
+    slope = np.diff(x, prepend=x[0])
+    energy = _moving_average(slope * slope, max(1, int(0.08 * sample_rate)))
+    threshold = 0.3 * np.percentile(energy, 99.5)
+    above = energy > threshold
+
+    edges = np.diff(above.astype(np.int8), prepend=0, append=0)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+
+    # R peak: the maximum of each high-energy region, widened for the filter lag
+    pad = int(0.05 * sample_rate)
+    refractory = int(0.25 * sample_rate)
+    peaks = []
+    for start, end in zip(starts, ends):
+        lo, hi = max(0, start - pad), min(x.size, end + pad)
+        peak = lo + int(np.argmax(x[lo:hi]))
+        if peaks and peak - peaks[-1] < refractory:
+            if x[peak] > x[peaks[-1]]:
+                peaks[-1] = peak
+            continue
+        peaks.append(peak)
+    return np.array(peaks, dtype=np.int64)
+
+def _knot_baseline(x, peaks, sample_rate):
+    """Baseline wander estimate interpolated through the PR segment of every beat"""
+    lo, hi = int(0.07 * sample_rate), int(0.05 * sample_rate)
+    knots = peaks[peaks - lo >= 0]
+    window = knots[:, None] + np.arange(-lo, -hi)[None, :]
+    levels = np.median(x[window], axis=1)
+    return np.interp(np.arange(x.size), knots, levels)
+
+def _quiet_run(slope_below, start, step, min_run, limit):
+    """First index from start (walking by step) that begins a run of quiet samples"""
+    run = 0
+    i = start
+    while 0 <= i < limit:
+        run = run + 1 if slope_below[i] else 0
+        if run >= min_run:
+            return i - step * (min_run - 1)
+        i += step
+    return None
+
+def _edge(wave, peak, step, threshold, limit):
+    """Walk from a wave peak until it falls under threshold of its amplitude"""
+    i = peak
+    while 0 < i < limit - 1 and abs(wave[i]) >= threshold:
+        i += step
+    return i
+
+def extract_features(samples, sample_rate=DEFAULT_SAMPLE_RATE):
+    """Detect beats and measure P/PR/QRS/QT/T/ST on the median beat.
+
+    samples are millivolts. Returns a dict with heart_rate plus the ECG
+    fields of VitalSigns (durations in seconds, amplitudes in mV).
+    """
+    x = np.asarray(samples, dtype=np.float64)
+    if x.size < 2 * sample_rate:
+        raise ECGError("ECG strip must be at least 2 seconds long")
+
+    peaks = detect_r_peaks(x, sample_rate)
+    if peaks.size < 3:
+        raise ECGError("Fewer than 3 beats detected in ECG strip")
+    rr = np.diff(peaks) / sample_rate
+    heart_rate = 60.0 / float(np.median(rr))
+    x = x - _knot_baseline(x, peaks, sample_rate)
+
+    # Median beat template from every complete window (vectorized gather);
+    # the window is sized from the RR interval so it never spans two beats
+    median_rr = float(np.median(rr))
+    before = int(min(TEMPLATE_BEFORE_R, 0.45 * median_rr) * sample_rate)
+    after = int(min(TEMPLATE_AFTER_R, 0.98 * median_rr - before / sample_rate) * sample_rate)
+    usable = peaks[(peaks - before >= 0) & (peaks + after < x.size)]
+    if usable.size < 2:
+        raise ECGError("Not enough complete beats in ECG strip")
+    offsets = np.arange(-before, after)
+    beats = x[usable[:, None] + offsets[None, :]]
+    template = _moving_average(np.median(beats, axis=0), max(1, int(0.01 * sample_rate)))
+    r = before
+    n = template.size
+
+    # QRS onset/offset: where the slope settles below a fraction of the R upstroke
+    slope = np.abs(np.gradient(template)) * sample_rate
+    max_slope = slope[max(0, r - int(0.06 * sample_rate)): r + int(0.06 * sample_rate)].max()
+    quiet = slope < 0.08 * max_slope
+    min_run = max(2, int(0.008 * sample_rate))
+    qrs_on = _quiet_run(quiet, r, -1, min_run, n)
+    j_point = _quiet_run(quiet, r, 1, min_run, n)
+    if qrs_on is None or j_point is None:
+        raise ECGError("Could not delineate the QRS complex")
+
+    # Isoelectric baseline from the PR segment just before the QRS
+    baseline = float(np.median(template[max(0, qrs_on - int(0.016 * sample_rate)): qrs_on - 1]))
+    wave = template - baseline
+
+    # P wave: largest deflection in the 300 ms before the QRS
+    p_lo = max(0, qrs_on - int(0.30 * sample_rate))
+    p_hi = max(p_lo + 1, qrs_on - int(0.02 * sample_rate))
+    p_peak = p_lo + int(np.argmax(wave[p_lo:p_hi]))
+    p_threshold = 0.05 * wave[p_peak]
+    p_on = _edge(wave, p_peak, -1, p_threshold, n)
+    p_off = _edge(wave, p_peak, 1, p_threshold, n)
+
+    # ST level 40 ms after the J point
+    st_index = min(n - 1, j_point + int(0.04 * sample_rate))
+    st_elevation = float(wave[st_index])
+
+    # T wave: largest deflection (either sign) after the ST measurement point
+    t_peak = st_index + int(np.argmax(np.abs(wave[st_index:])))
+    t_amplitude = float(wave[t_peak])
+    t_end = _edge(wave, t_peak, 1, 0.05 * abs(t_amplitude), n)
+
+    return {
+        "heart_rate": round(heart_rate, 1),
+        "p_wave_duration": round((p_off - p_on) / sample_rate, 3),
+        "pr_interval": round((qrs_on - p_on) / sample_rate, 3),
+        "qrs_duration": round((j_point - qrs_on) / sample_rate, 3),
+        "qt_interval": round((t_end - qrs_on) / sample_rate, 3),
+        "t_wave_amplitude": round(t_amplitude, 3),
+        "st_segment_elevation": round(st_elevation, 3),
+        "beats_detected": int(peaks.size),
+    }
@@ -0,0 +1,142 @@
+from collections import OrderedDict
+import sqlite3
+import threading
+import time
+
+# Quantization bands; readings in the same bands share one explanation
+HEART_RATE_BAND = 5  # bpm
+BLOOD_PRESSURE_BAND = 5  # mmHg
+OXYGEN_BAND = 1  # %
+TEMPERATURE_BAND = 0.5  # °C
+
+def cache_key(vitals, risk_score, risk_level, rules=()):
+    """Key on risk level, score, the fired rules and vitals quantized into clinical bands"""
+    # The rules pick the RAG context, and ECG findings are not in the vital bands
+    return "|".join([
+        risk_level,
+        str(risk_score),
+        "+".join(sorted(rules)) or "none",
+        f"hr{int(vitals.heart_rate // HEART_RATE_BAND)}",
+        f"bp{int(vitals.blood_pressure_systolic // BLOOD_PRESSURE_BAND)}/{int(vitals.blood_pressure_diastolic // BLOOD_PRESSURE_BAND)}",
+        f"spo2{int(vitals.oxygen_saturation // OXYGEN_BAND)}",
+        f"t{int(vitals.temperature // TEMPERATURE_BAND)}",
+    ])
+
+class ExplanationCache:
+    """LRU cache of LLM explanations with a TTL and optional SQLite persistence"""
+
+    def __init__(self, max_size=512, ttl_seconds=600, db_path=None, clock=time.time):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (created_at, explanation)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if db_path:
+            self._init_table()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path)
+
+    def _init_table(self):
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS explanation_cache (
+                key TEXT PRIMARY KEY,
+                explanation TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        conn.commit()
+        conn.close()
+
+    def _expired(self, created_at, now):
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def _load(self, key, now):
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT explanation, created_at FROM explanation_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is not None and self._expired(row[1], now):
+            conn.execute("DELETE FROM explanation_cache WHERE key = ?", (key,))
+            conn.commit()
+            row = None
+        conn.close()
+        return row
+
+    def get(self, key):
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry[0], now):
+                del self._entries[key]
+                entry = None
+            if entry is None and self.db_path:
+                row = self._load(key, now)
+                if row is not None:
+                    entry = (row[1], row[0])
+                    self._insert(key, entry)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def _insert(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def put(self, key, explanation):
+        now = self._clock()
+        with self._lock:
+            self._insert(key, (now, explanation))
+            if self.db_path:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO explanation_cache (key, explanation, created_at) VALUES (?, ?, ?)",
+                    (key, explanation, now)
+                )
+                # Keep the persisted copy within the same TTL and size limits
+                if self.ttl_seconds is not None:
+                    conn.execute(
+                        "DELETE FROM explanation_cache WHERE created_at < ?",
+                        (now - self.ttl_seconds,)
+                    )
+                conn.execute("""
+                    DELETE FROM explanation_cache WHERE key NOT IN (
+                        SELECT key FROM explanation_cache ORDER BY created_at DESC LIMIT ?
+                    )
+                """, (self.max_size,))
+                conn.commit()
+                conn.close()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self.db_path:
+                conn = self._connect()
+                conn.execute("DELETE FROM explanation_cache")
+                conn.commit()
+                conn.close()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "persistent": bool(self.db_path)
+            }
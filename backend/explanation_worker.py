@@ -0,0 +1,146 @@
+from concurrent.futures import Future, ThreadPoolExecutor, wait as wait_for_futures
+import threading
+from llm_service import explain, rule_based_explanation
+from database import update_explanation, get_reading_explanation
+from stream_hub import BroadcastHub, hub
+
+# Threads building prompts (RAG lookup); the generations themselves are
+# queued by risk level on llm_service.scheduler
+EXPLANATION_WORKERS = 2
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Explanation tokens as they are generated. Event ids are the character
+# offset at the end of each token, so a subscriber can resume mid-text;
+# subscribers match on one reading id so they only queue its tokens.
+token_hub = BroadcastHub()
+_partial = {}  # reading id -> text generated so far
+_partial_lock = threading.Lock()
+_pending = set()  # Futures of explanations not yet stored
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=EXPLANATION_WORKERS,
+                thread_name_prefix="explanation"
+            )
+        return _executor
+
+def _start(reading_id, vitals, risk_score, risk_level, rules, future):
+    fallback = rule_based_explanation(vitals, risk_score, risk_level, rules)
+    try:
+        generation = explain(vitals, risk_score, risk_level, rules)
+    except Exception:
+        generation = None
+    _follow(reading_id, vitals, generation, fallback, future)
+
+def _follow(reading_id, vitals, generation, fallback, future):
+    with _partial_lock:
+        _partial[reading_id] = ""
+    if generation is None:
+        _finish(reading_id, vitals, fallback, future)
+        return
+    # Tokens arrive on the scheduler's thread; this worker is free for the next prompt
+    generation.add_listener(
+        lambda token: _on_token(reading_id, token),
+        lambda done: _finish(reading_id, vitals, fallback, future, done.error)
+    )
+
+def _on_token(reading_id, token):
+    with _partial_lock:
+        _partial[reading_id] += token
+        offset = len(_partial[reading_id])
+    token_hub.publish("token", offset, {"id": reading_id, "text": token})
+
+def _finish(reading_id, vitals, fallback, future, error=None):
+    # Text cut short by a failed generation is never stored as the explanation
+    with _partial_lock:
+        explanation = (_partial.get(reading_id) if error is None else None) or fallback
+    # Persist before dropping the partial text so token streams always find one of them
+    try:
+        update_explanation(reading_id, explanation)
+    except Exception as e:
+        future.set_exception(e)
+        return
+    finally:
+        with _partial_lock:
+            _partial.pop(reading_id, None)
+    event = {
+        "id": reading_id,
+        "patient_id": getattr(vitals, "patient_id", None),
+        "explanation": explanation
+    }
+    token_hub.publish("explanation", len(explanation), event)
+    # No event id: resuming /stream after it must not replay the readings since reading_id
+    hub.publish("explanation", None, event)
+    future.set_result(explanation)
+
+def token_backfill(reading_id, offset):
+    """Token events for reading_id after character offset: the text so far,
+    plus the final explanation event once it has been stored"""
+    with _partial_lock:
+        text = _partial.get(reading_id)
+    if text is not None:
+        return [{"id": len(text), "event": "token", "data": {"id": reading_id, "text": text[offset:]}}] if len(text) > offset else []
+    found, explanation = get_reading_explanation(reading_id)
+    if not found or explanation is None:
+        return []
+    events = []
+    if len(explanation) > offset:
+        events.append({"id": len(explanation), "event": "token", "data": {"id": reading_id, "text": explanation[offset:]}})
+    events.append({"id": len(explanation), "event": "explanation", "data": {"id": reading_id, "explanation": explanation}})
+    return events
+
+def submit_explanation(reading_id, vitals, risk_score, risk_level, rules=None):
+    """Generate the explanation for a saved reading in the background.
+
+    The result is written into the reading's row; the returned Future
+    resolves to the explanation text.
+    """
+    future = _pending_future()
+    _get_executor().submit(_start, reading_id, vitals, risk_score, risk_level, rules, future)
+    return future
+
+def follow_generation(reading_id, vitals, pending, fallback):
+    """Store a generation that is being prepared or run on a saved reading.
+
+    Used when /analyze answered with the rule-based explanation because the
+    LLM overran its budget. pending is a Future of the Generation (see
+    llm_service.explain_within); the LLM text replaces the fallback once it
+    arrives (fallback is kept if the prompt or the generation fails, even
+    part way). Returns a Future like submit_explanation.
+    """
+    future = _pending_future()
+    with _partial_lock:
+        # Token streams opened before the prompt is ready wait for it rather than end on the fallback
+        _partial[reading_id] = ""
+    def follow(done):
+        generation = None if done.cancelled() or done.exception() is not None else done.result()
+        _follow(reading_id, vitals, generation, fallback, future)
+    pending.add_done_callback(follow)
+    return future
+
+def _pending_future():
+    future = Future()
+    with _partial_lock:
+        _pending.add(future)
+    future.add_done_callback(_discard_pending)
+    return future
+
+def _discard_pending(future):
+    with _partial_lock:
+        _pending.discard(future)
+
+def shutdown(wait=True):
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
+    if wait:
+        with _partial_lock:
+            pending = list(_pending)
+        wait_for_futures(pending)
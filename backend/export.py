@@ -0,0 +1,71 @@
+import csv
+import io
+import json
+import database
+
+# Readings fetched per query while exporting; memory stays at about one chunk
+EXPORT_CHUNK_SIZE = 1000
+
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+def arrow_available():
+    try:
+        import pyarrow
+    except ImportError:
+        return False
+    return True
+
+def _chunks(filters, include_explanation, chunk_size):
+    # Readings stored after the export started are left out, so the file is a consistent snapshot
+    latest = database.get_readings(limit=1, include_explanation=False, **filters)
+    if not latest:
+        return
+    yield from database.iter_readings(
+        chunk_size, before_id=latest[0]["id"] + 1, include_explanation=include_explanation, **filters
+    )
+
+def _csv(chunks, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for chunk in chunks:
+        writer.writerows([row[column] for column in columns] for row in chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()  # header only: no readings matched
+
+def _ndjson(chunks, columns):
+    for chunk in chunks:
+        yield "".join(json.dumps(row) + "\n" for row in chunk)
+
+def _arrow(chunks, columns):
+    import pyarrow as pa
+    types = {"timestamp": pa.string(), "patient_id": pa.string(), "risk_level": pa.string(),
+             "explanation": pa.string(), "temperature": pa.float64()}
+    schema = pa.schema([(column, types.get(column, pa.int64())) for column in columns])
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for chunk in chunks:
+            writer.write_batch(pa.RecordBatch.from_pylist(chunk, schema=schema))
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    yield sink.getvalue()  # end-of-stream marker (and the schema if nothing matched)
+
+_WRITERS = {"csv": _csv, "ndjson": _ndjson, "arrow": _arrow}
+
+def stream_readings(fmt, include_explanation=True, chunk_size=EXPORT_CHUNK_SIZE, **filters):
+    """Readings matching get_readings' filters, oldest first, encoded chunk by chunk.
+
+    Each chunk is its own keyset query, so no read transaction is held
+    open for the length of the download and archived readings are
+    included. Yields str (csv, ndjson) or bytes (arrow).
+    """
+    columns = database.READING_COLUMNS if include_explanation else database.READING_COLUMNS[:-1]
+    return _WRITERS[fmt](_chunks(filters, include_explanation, chunk_size), columns)
@@ -0,0 +1,271 @@
+from collections import deque
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+# Queue order: most severe readings are generated first
+PRIORITIES = ["CRITICAL", "HIGH", "MODERATE", "LOW"]
+# Recent queue waits kept for the percentile metrics
+WAIT_SAMPLES = 1024
+
+logger = logging.getLogger("cardiosense.llm_scheduler")
+
+class QueueFullError(RuntimeError):
+    """A generation was not run because the scheduler's queue was full"""
+
+class Generation:
+    """One LLM completion, shared by every caller that asked for the same prompt"""
+
+    def __init__(self, prompt, priority):
+        self.prompt = prompt
+        self.priority = priority  # index into PRIORITIES; lower runs first
+        self.submitted = time.monotonic()
+        self.started = None
+        self.tokens = []
+        self.done = False
+        self.error = None
+        self.dropped = False  # shed from a full queue before it started
+        self._cond = threading.Condition()
+        self._listeners = []
+
+    @classmethod
+    def completed(cls, text):
+        generation = cls(None, None)
+        generation.tokens.append(text)
+        generation.done = True
+        return generation
+
+    @property
+    def text(self):
+        return "".join(self.tokens)
+
+    def add_listener(self, on_token=None, on_done=None):
+        """Call on_token(token) for every token, replaying those already
+        produced, then on_done(generation) once it has finished"""
+        with self._cond:
+            if on_token is not None:
+                for token in self.tokens:
+                    _call(on_token, token)
+            if not self.done:
+                self._listeners.append((on_token, on_done))
+                return
+        if on_done is not None:
+            _call(on_done, self)
+
+    def result(self, timeout=None):
+        """Full text, waiting for the generation; re-raises its error"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.done, timeout):
+                raise TimeoutError("LLM generation still running")
+        if self.error is not None:
+            raise self.error
+        return self.text
+
+    def _emit(self, token):
+        with self._cond:
+            self.tokens.append(token)
+            for on_token, _ in self._listeners:
+                if on_token is not None:
+                    _call(on_token, token)
+
+    def _finish(self, error=None):
+        with self._cond:
+            self.done = True
+            self.error = error
+            listeners, self._listeners = self._listeners, []
+            self._cond.notify_all()
+        for _, on_done in listeners:
+            if on_done is not None:
+                _call(on_done, self)
+
+def _call(callback, arg):
+    # A failing listener must not break the generation for everyone sharing it
+    try:
+        callback(arg)
+    except Exception:
+        logger.exception("LLM generation listener failed")
+
+class LLMScheduler:
+    """Runs at most max_concurrent generations at once, most severe first.
+
+    generate(prompt) yields the completion's tokens. Submitting a prompt
+    that is already queued or running returns the existing Generation
+    (raising its priority if needed) instead of starting another.
+
+    At most max_queued generations wait at once. When the queue is full a
+    new prompt displaces the newest queued one of a less severe level,
+    which finishes with QueueFullError; if there is none, submit raises
+    QueueFullError itself. Low-risk work is shed rather than left to wait
+    behind critical readings without bound.
+    """
+
+    def __init__(self, generate, max_concurrent=1, max_queued=None):
+        self.generate = generate
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self._heap = []  # (priority, seq, generation); stale after a promotion
+        self._seq = itertools.count()
+        self._in_flight = {}  # prompt -> queued or running Generation
+        self._cond = threading.Condition()
+        self._workers = []
+        self._stopping = False
+        self._waits = deque(maxlen=WAIT_SAMPLES)  # (priority, seconds queued)
+        self.running = 0
+        self.submitted = 0
+        self.coalesced = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0  # submits refused with QueueFullError
+        self.dropped = 0  # queued generations displaced by more severe ones
+        self.cancelled = 0  # queued generations given up by their caller
+
+    def submit(self, prompt, risk_level):
+        priority = PRIORITIES.index(risk_level) if risk_level in PRIORITIES else len(PRIORITIES) - 1
+        with self._cond:
+            self._start_workers()
+            self.submitted += 1
+            generation = self._in_flight.get(prompt)
+            if generation is not None:
+                self.coalesced += 1
+                if generation.started is None and priority < generation.priority:
+                    generation.priority = priority
+                    heapq.heappush(self._heap, (priority, next(self._seq), generation))
+                    self._cond.notify()
+                return generation
+            displaced = None
+            if self.max_queued is not None:
+                queued = [g for g in self._in_flight.values() if g.started is None]
+                if len(queued) >= self.max_queued:
+                    # Newest of the least severe queued generations, if less severe than this one
+                    worst = max(queued, key=lambda g: (g.priority, g.submitted))
+                    if worst.priority <= priority:
+                        self.rejected += 1
+                        raise QueueFullError(f"LLM queue full ({self.max_queued} waiting)")
+                    displaced = worst
+                    self._unqueue(displaced)
+                    self.dropped += 1
+            generation = Generation(prompt, priority)
+            self._in_flight[prompt] = generation
+            heapq.heappush(self._heap, (priority, next(self._seq), generation))
+            self._cond.notify()
+        if displaced is not None:
+            displaced._finish(QueueFullError("Dropped from a full LLM queue for a more severe reading"))
+        return generation
+
+    def cancel(self, generation):
+        """Drop a generation that has not started yet; True if it was dropped.
+
+        Every caller sharing it gets QueueFullError, as if it had been shed.
+        """
+        with self._cond:
+            if generation.started is not None or self._in_flight.get(generation.prompt) is not generation:
+                return False
+            self._unqueue(generation)
+            self.cancelled += 1
+        generation._finish(QueueFullError("Cancelled while waiting in the LLM queue"))
+        return True
+
+    def queued(self):
+        """Generations waiting for a slot"""
+        with self._cond:
+            return sum(g.started is None for g in self._in_flight.values())
+
+    def _unqueue(self, generation):
+        # Its heap entry is skipped by _next; the caller finishes it outside the lock
+        generation.dropped = True
+        del self._in_flight[generation.prompt]
+
+    def _start_workers(self):
+        self._stopping = False
+        self._workers = [worker for worker in self._workers if worker.is_alive()]
+        while len(self._workers) < self.max_concurrent:
+            worker = threading.Thread(target=self._run, name=f"llm-{len(self._workers)}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def _next(self):
+        with self._cond:
+            while True:
+                while not self._heap:
+                    if self._stopping:
+                        return None
+                    self._cond.wait()
+                priority, _, generation = heapq.heappop(self._heap)
+                if generation.started is None and not generation.dropped and priority == generation.priority:
+                    generation.started = time.monotonic()
+                    self._waits.append((priority, generation.started - generation.submitted))
+                    self.running += 1
+                    return generation
+
+    def _run(self):
+        while True:
+            generation = self._next()
+            if generation is None:
+                return
+            error = None
+            try:
+                for token in self.generate(generation.prompt):
+                    if token:
+                        generation._emit(token)
+            except Exception as e:
+                error = e
+            with self._cond:
+                self.running -= 1
+                if error is None:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                if self._in_flight.get(generation.prompt) is generation:
+                    del self._in_flight[generation.prompt]
+            generation._finish(error)
+
+    def stats(self):
+        with self._cond:
+            queued = [g for g in self._in_flight.values() if g.started is None]
+            waits = list(self._waits)
+            stats = {
+                "max_concurrent": self.max_concurrent,
+                "running": self.running,
+                "queue_depth": len(queued),
+                "queued_by_level": {level: sum(g.priority == i for g in queued) for i, level in enumerate(PRIORITIES)},
+                "submitted": self.submitted,
+                "coalesced": self.coalesced,
+                "completed": self.completed,
+                "failed": self.failed,
+                "max_queued": self.max_queued,
+                "rejected": self.rejected,
+                "dropped": self.dropped,
+                "cancelled": self.cancelled,
+            }
+        stats["wait_seconds"] = _wait_summary([wait for _, wait in waits])
+        stats["wait_seconds_by_level"] = {
+            level: _wait_summary([wait for priority, wait in waits if priority == i])
+            for i, level in enumerate(PRIORITIES)
+        }
+        return stats
+
+    def shutdown(self, wait=True):
+        """Stop the workers once the queue has drained"""
+        with self._cond:
+            self._stopping = True
+            workers, self._workers = self._workers, []
+            self._cond.notify_all()
+        if wait:
+            for worker in workers:
+                worker.join()
+
+def _wait_summary(waits):
+    """Mean, p50, p95 and max of recent queue waits"""
+    if not waits:
+        return {"samples": 0, "mean": None, "p50": None, "p95": None, "max": None}
+    waits = sorted(waits)
+    percentile = lambda p: round(waits[min(len(waits) - 1, int(p * len(waits)))], 4)
+    return {
+        "samples": len(waits),
+        "mean": round(sum(waits) / len(waits), 4),
+        "p50": percentile(0.50),
+        "p95": percentile(0.95),
+        "max": round(waits[-1], 4),
+    }
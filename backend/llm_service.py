@@ -1,14 +1,82 @@
-import ollama
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import contextvars
 import sys
+import threading
+import time
 sys.path.append('../rag_pipeline')
-from rag_query import query_medical_knowledge
+from rag_query import RULE_FINDINGS, load_collection, query_medical_knowledge, rule_context
+from explanation_cache import ExplanationCache, cache_key
+from risk_engine import assess_risk
+from llm_scheduler import Generation, LLMScheduler
+from circuit_breaker import CircuitBreaker
+from metrics import observe_stage, timed
 
-def get_explanation(vitals, risk_score, risk_level):
-    # Get relevant medical context from RAG
-    context = query_medical_knowledge(vitals, risk_level)
+# Explanation cache; set EXPLANATION_CACHE_DB to a SQLite path to persist it
+EXPLANATION_CACHE_SIZE = 512
+EXPLANATION_CACHE_TTL = 600  # seconds
+EXPLANATION_CACHE_DB = None
+
+explanation_cache = ExplanationCache(
+    max_size=EXPLANATION_CACHE_SIZE,
+    ttl_seconds=EXPLANATION_CACHE_TTL,
+    db_path=EXPLANATION_CACHE_DB
+)
+
+LLM_MODEL = 'llama3.2:3b'
+# Generations sent to Ollama at once; a Pi handles ~1-2 well
+LLM_CONCURRENCY = 2
+# Generations allowed to wait for Ollama; beyond this the least severe are shed
+LLM_MAX_QUEUED = 16
+# Queued generations past which non-critical readings stop waiting on the LLM:
+# new ones get the rule-based explanation and overrun ones are cancelled
+LLM_SHED_BACKLOG = 4
+# Seconds /analyze spends on RAG + Ollama before answering with the rule-based explanation
+EXPLANATION_BUDGET_SECONDS = 2.0
+# Longest wait for Ollama to answer or send the next token, or for a breaker probe
+OLLAMA_TIMEOUT_SECONDS = 30
+# Knowledge-base searches slower than this count as failures for the Chroma breaker
+CHROMA_SLOW_CALL_SECONDS = 2.0
+# Longest wait for a knowledge-base search; the prompt then uses the generic context
+CHROMA_TIMEOUT_SECONDS = 3.0
+# Threads building prompts (RAG lookup) for budgeted explanations
+PROMPT_WORKERS = 4
+
+_ollama_client = None
+
+def _ollama():
+    global _ollama_client
+    if _ollama_client is None:
+        import ollama
+        _ollama_client = ollama.Client(timeout=OLLAMA_TIMEOUT_SECONDS)
+    return _ollama_client
+
+# While a breaker is open its dependency is skipped: explanations fall back to
+# the rule-based text and RAG to the generic context, until a probe succeeds
+ollama_breaker = CircuitBreaker(
+    "ollama",
+    probe=lambda: _ollama().list(),
+    call_timeout=OLLAMA_TIMEOUT_SECONDS
+)
+chroma_breaker = CircuitBreaker(
+    "chromadb",
+    probe=lambda: load_collection().count(),
+    slow_call_seconds=CHROMA_SLOW_CALL_SECONDS,
+    call_timeout=CHROMA_TIMEOUT_SECONDS
+)
+
+def load_llm():
+    """Import the Ollama client and ask the server to load the model into memory"""
+    _ollama().generate(model=LLM_MODEL, prompt="")
+
+def build_prompt(vitals, risk_score, risk_level, rules=None):
+    # Get relevant medical context from RAG; fired rules skip the embedding search
+    if rules is None:
+        rules = assess_risk(vitals)[2]
+    with timed("rag_query"):
+        context = query_medical_knowledge(vitals, risk_level, rules, breaker=chroma_breaker)
     
     # Build prompt for Llama
-    prompt = f"""You are a medical AI assistant. Analyze these vital signs and provide a brief explanation.
+    return f"""You are a medical AI assistant. Analyze these vital signs and provide a brief explanation.
 
 Vital Signs:
 - Heart Rate: {vitals.heart_rate} bpm
@@ -23,8 +91,135 @@ Medical Context:
 
 Provide a concise 2-3 sentence explanation of the cardiac risk and any immediate concerns."""
 
+def rule_based_explanation(vitals, risk_score, risk_level, rules=None):
+    """Deterministic explanation from the rules that fired and their knowledge-base text"""
+    if rules is None:
+        rules = assess_risk(vitals)[2]
+    summary = (
+        f"Risk level: {risk_level} (Score: {risk_score}). "
+        f"Heart rate {vitals.heart_rate} bpm, blood pressure {vitals.blood_pressure_systolic}/"
+        f"{vitals.blood_pressure_diastolic} mmHg, SpO2 {vitals.oxygen_saturation}%, "
+        f"temperature {vitals.temperature}°C."
+    )
+    if not rules:
+        return summary + " All monitored values are within normal ranges."
+    findings = ", ".join(RULE_FINDINGS.get(rule, rule.replace("_", " ")) for rule in rules)
+    context = rule_context(rules)
+    return f"{summary} Findings: {findings}." + (f" {context}" if context else "")
+
+def _ollama_tokens(prompt):
+    # Checked again here: the breaker may have opened while the prompt was queued
+    ollama_breaker.check()
+    start = time.monotonic()
+    first_token = True
     try:
-        response = ollama.generate(model='llama3.2:3b', prompt=prompt)
-        return response['response']
+        for chunk in _ollama().generate(model=LLM_MODEL, prompt=prompt, stream=True):
+            if first_token:
+                observe_stage("llm_first_token", time.monotonic() - start)
+                first_token = False
+            yield chunk['response']
     except Exception as e:
-        return f"Risk level: {risk_level}. Unable to generate detailed explanation."
+        ollama_breaker.record(time.monotonic() - start, e)
+        raise
+    observe_stage("llm_generation", time.monotonic() - start)
+    ollama_breaker.record(time.monotonic() - start)
+
+scheduler = LLMScheduler(_ollama_tokens, LLM_CONCURRENCY, max_queued=LLM_MAX_QUEUED)
+
+def explain(vitals, risk_score, risk_level, rules=None):
+    """Generation producing the explanation for a reading.
+
+    Served from the cache when possible; otherwise queued on the LLM
+    scheduler by risk level, sharing any identical prompt already in flight.
+    Raises CircuitOpenError while the Ollama breaker is open.
+    """
+    if rules is None:
+        rules = assess_risk(vitals)[2]
+    # Stable patients repeat the same quantized state; skip RAG and Ollama
+    key = cache_key(vitals, risk_score, risk_level, rules)
+    cached = explanation_cache.get(key)
+    if cached is not None:
+        return Generation.completed(cached)
+    
+    ollama_breaker.check()
+    generation = scheduler.submit(build_prompt(vitals, risk_score, risk_level, rules), risk_level)
+    def cache_result(done):
+        if done.error is None and done.text:
+            explanation_cache.put(key, done.text)
+    generation.add_listener(on_done=cache_result)
+    return generation
+
+_prompt_executor = None
+_prompt_executor_lock = threading.Lock()
+
+def _get_prompt_executor():
+    global _prompt_executor
+    with _prompt_executor_lock:
+        if _prompt_executor is None:
+            _prompt_executor = ThreadPoolExecutor(max_workers=PROMPT_WORKERS, thread_name_prefix="prompt")
+        return _prompt_executor
+
+def explain_within(vitals, risk_score, risk_level, rules=None, budget=None):
+    """(explanation, pending) for a reading, spending at most budget seconds.
+
+    The prompt (with its RAG lookup) is built on a worker thread, so the
+    budget bounds the whole explanation, not just the wait on Ollama. If
+    the LLM finishes in time its text is returned with pending None.
+    Otherwise the rule-based explanation is returned together with a
+    Future of the Generation still being prepared or run, whose text can
+    replace it later.
+
+    When the LLM queue is backed up (LLM_SHED_BACKLOG) a non-critical
+    reading does not add to it: it gets the cached or rule-based
+    explanation at once, and a generation that overruns the budget is
+    cancelled instead of returned as pending.
+    """
+    budget = EXPLANATION_BUDGET_SECONDS if budget is None else budget
+    deadline = time.monotonic() + budget
+    if rules is None:
+        rules = assess_risk(vitals)[2]
+    if _saturated(risk_level):
+        cached = explanation_cache.get(cache_key(vitals, risk_score, risk_level, rules))
+        if cached is not None:
+            return cached, None
+        return rule_based_explanation(vitals, risk_score, risk_level, rules), None
+    pending = None
+    try:
+        # Run in this request's context so the RAG stage still shows in its Server-Timing
+        context = contextvars.copy_context()
+        pending = _get_prompt_executor().submit(context.run, explain, vitals, risk_score, risk_level, rules)
+        with timed("llm_wait"):
+            generation = pending.result(timeout=max(0.0, deadline - time.monotonic()))
+            text = generation.result(timeout=max(0.0, deadline - time.monotonic()))
+        return text, None
+    except (FutureTimeoutError, TimeoutError):
+        # concurrent.futures.TimeoutError is only the builtin from Python 3.11
+        explanation = rule_based_explanation(vitals, risk_score, risk_level, rules)
+        if _saturated(risk_level) and _cancel_pending(pending):
+            return explanation, None
+        return explanation, pending
+    except Exception:
+        return rule_based_explanation(vitals, risk_score, risk_level, rules), None
+
+def _saturated(risk_level):
+    return risk_level != "CRITICAL" and scheduler.queued() >= LLM_SHED_BACKLOG
+
+def _cancel_pending(pending):
+    """Cancel an overrun explanation unless Ollama is already generating it"""
+    if pending.cancel():
+        return True
+    if not pending.done():
+        # Still building its prompt: cancel the generation once it is queued
+        def cancel(done):
+            if done.exception() is None:
+                scheduler.cancel(done.result())
+        pending.add_done_callback(cancel)
+        return True
+    return pending.exception() is None and scheduler.cancel(pending.result())
+
+def get_explanation(vitals, risk_score, risk_level, rules=None):
+    """LLM explanation, waiting as long as it takes (rule-based if the LLM fails)"""
+    try:
+        return explain(vitals, risk_score, risk_level, rules).result()
+    except Exception:
+        return rule_based_explanation(vitals, risk_score, risk_level, rules)
@@ -1,17 +1,49 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, HTTPException, Query, Request, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
-from pydantic import BaseModel
+from fastapi.responses import FileResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
 from datetime import datetime
-from risk_engine import calculate_risk
-from llm_service import get_explanation
-from database import init_db, save_reading, get_all_readings, get_summary_report, clear_all_readings
-from pdf_generator import generate_pdf_report
+from contextlib import asynccontextmanager
+from typing import List, Literal, Optional
+import logging
+from risk_engine import assess_risk, calculate_risk_batch
+from ecg_features import DEFAULT_GAIN, DEFAULT_SAMPLE_RATE, ECGError, decode_int16, extract_features
+from llm_service import explain_within, explanation_cache, load_llm, scheduler as llm_scheduler, ollama_breaker, chroma_breaker
+from rag_query import load_collection
+from database import DEFAULT_PATIENT, get_archive_status, ensure_db, close_db, save_reading, save_readings, get_readings, get_summary_report, get_trends, rebuild_summary, clear_all_readings, get_reading_explanation, save_patient, get_patients, get_patient
+import explanation_worker
+import export
+import metrics
+import report_jobs
+import report_renderer
+import retention
+import startup
+from metrics import timed
+from stream_hub import hub, format_sse
+from ws_ingest import IngestSession
 
-app = FastAPI()
+logging.basicConfig(level=logging.INFO)
 
-# Initialize database on startup
-init_db()
+@asynccontextmanager
+async def lifespan(app):
+    # Scoring only needs the database; the RAG and LLM models load in the background
+    startup.load_component("database", ensure_db)
+    startup.start_warm_up([
+        ("knowledge_base", load_collection),
+        ("llm", load_llm),
+    ])
+    retention.start()
+    yield
+    retention.stop()
+    # Let queued explanations finish writing to the database
+    explanation_worker.shutdown(wait=True)
+    llm_scheduler.shutdown(wait=False)
+    report_renderer.shutdown(wait=False)
+    report_jobs.shutdown(wait=False)
+    close_db()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -19,9 +51,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+# Added last so it wraps CORS too and times the whole request
+app.add_middleware(metrics.MetricsMiddleware)
 
 class VitalSigns(BaseModel):
+    patient_id: str = Field(DEFAULT_PATIENT, min_length=1, max_length=64)
     heart_rate: int
     blood_pressure_systolic: int
     blood_pressure_diastolic: int
@@ -34,58 +70,575 @@ class VitalSigns(BaseModel):
     t_wave_amplitude: float = 0.3  # Normal: 0.1-0.5 mV
     st_segment_elevation: float = 0.0  # Normal: -0.05 to 0.1 mV
 
+class Patient(BaseModel):
+    name: Optional[str] = None
+    age: Optional[int] = Field(None, ge=0, le=150)
+
+class ReportRequest(BaseModel):
+    patient_id: Optional[str] = None
+    patient_name: Optional[str] = None
+    patient_age: Optional[int] = Field(None, ge=0, le=150)
+    start: Optional[str] = None  # ISO-8601, bounds the history, critical events and trends
+    end: Optional[str] = None
+
+EMERGENCY_ALERT = {
+    "call_911": True,
+    "reason": "Critical cardiac event detected",
+    "priority": "IMMEDIATE"
+}
+
+def emergency_alert_for(reading_id, patient_id=DEFAULT_PATIENT):
+    return {"reading_id": reading_id, "patient_id": patient_id, **EMERGENCY_ALERT}
+
+def publish_reading(reading_id, timestamp, vitals, risk_score, risk_level, explanation):
+    """Push a stored reading, and its emergency alert if critical, to /stream subscribers"""
+    hub.publish("reading", reading_id, {
+        "id": reading_id,
+        "timestamp": timestamp,
+        "patient_id": vitals.patient_id,
+        "heart_rate": vitals.heart_rate,
+        "blood_pressure_systolic": vitals.blood_pressure_systolic,
+        "blood_pressure_diastolic": vitals.blood_pressure_diastolic,
+        "oxygen_saturation": vitals.oxygen_saturation,
+        "temperature": vitals.temperature,
+        "risk_score": risk_score,
+        "risk_level": risk_level,
+        "explanation": explanation
+    })
+    if risk_level == "CRITICAL":
+        hub.publish("alert", reading_id, emergency_alert_for(reading_id, vitals.patient_id))
+
 @app.get("/")
 def root():
     return {"status": "CardioSense API running"}
 
+@app.get("/ready")
+def ready():
+    components = startup.component_status()
+    return {
+        "risk_scoring": components.get("database", {}).get("status") != "failed",
+        "explanations": startup.is_ready("knowledge_base", "llm"),
+        "components": components
+    }
+
+# Longest explanation budget a client may ask for, seconds
+MAX_EXPLANATION_BUDGET = 60
+
 @app.post("/analyze")
-def analyze_vitals(vitals: VitalSigns):
-    risk_score, risk_level = calculate_risk(vitals)
-    explanation = get_explanation(vitals, risk_score, risk_level)
+def analyze_vitals(
+    vitals: VitalSigns,
+    async_explanation: bool = False,
+    explanation_budget: Optional[float] = Query(None, ge=0, le=MAX_EXPLANATION_BUDGET)
+):
+    with timed("risk_scoring"):
+        risk_score, risk_level, rules = assess_risk(vitals)
     
-    # Check if 911 should be called
-    emergency_alert = None
-    if risk_level == "CRITICAL":
-        emergency_alert = {
-            "call_911": True,
-            "reason": "Critical cardiac event detected",
-            "priority": "IMMEDIATE"
-        }
+    timestamp = datetime.now().isoformat()
+    pending = None
+    if async_explanation:
+        # Return the score right away; the explanation is filled in by a worker
+        explanation = None
+        with timed("save_reading"):
+            reading_id = save_reading(vitals, risk_score, risk_level, None, timestamp)
+        publish_reading(reading_id, timestamp, vitals, risk_score, risk_level, None)
+        explanation_worker.submit_explanation(reading_id, vitals, risk_score, risk_level, rules)
+    else:
+        # The LLM text if it is ready within the budget, else the rule-based explanation
+        explanation, pending = explain_within(vitals, risk_score, risk_level, rules, explanation_budget)
+        with timed("save_reading"):
+            reading_id = save_reading(vitals, risk_score, risk_level, explanation, timestamp)
+        publish_reading(reading_id, timestamp, vitals, risk_score, risk_level, explanation)
+        if pending is not None:
+            # The LLM text replaces it on the reading (and /stream) when it arrives
+            explanation_worker.follow_generation(reading_id, vitals, pending, explanation)
     
-    # Save to database
-    save_reading(vitals, risk_score, risk_level, explanation)
+    explanation_status = "pending" if explanation is None else "fallback" if pending is not None else "ready"
+    metrics.readings_total.inc(risk_level)
+    metrics.explanations_total.inc(explanation_status)
     
     response = {
         "risk_score": risk_score,
         "risk_level": risk_level,
+        "rules_fired": rules,
         "explanation": explanation,
+        "explanation_id": reading_id,
+        "explanation_status": explanation_status,
         "vitals": vitals.model_dump()
     }
     
-    if emergency_alert:
-        response["emergency_alert"] = emergency_alert
+    # Check if 911 should be called
+    if risk_level == "CRITICAL":
+        response["emergency_alert"] = emergency_alert_for(reading_id, vitals.patient_id)
+    
+    return response
+
+@app.post("/analyze/batch")
+def analyze_vitals_batch(
+    readings: List[VitalSigns],
+    explanation_budget: Optional[float] = Query(None, ge=0, le=MAX_EXPLANATION_BUDGET)
+):
+    with timed("risk_scoring"):
+        results = calculate_risk_batch(readings)
+    if not results:
+        return {"count": 0, "results": []}
+    
+    # One LLM explanation per batch, for its most severe reading
+    worst = max(range(len(results)), key=lambda i: results[i][0])
+    worst_score, worst_level = results[worst]
+    explanation, pending = explain_within(readings[worst], worst_score, worst_level, budget=explanation_budget)
+    
+    entries = []
+    for i, (vitals, (risk_score, risk_level)) in enumerate(zip(readings, results)):
+        reading_explanation = explanation if i == worst else f"Risk level: {risk_level} (Score: {risk_score}). Batch reading."
+        entries.append((vitals, risk_score, risk_level, reading_explanation))
+    timestamp = datetime.now().isoformat()
+    with timed("save_reading"):
+        reading_ids = save_readings(entries, timestamp)
+    for reading_id, entry in zip(reading_ids, entries):
+        publish_reading(reading_id, timestamp, *entry)
+        metrics.readings_total.inc(entry[2])
+    metrics.explanations_total.inc("fallback" if pending is not None else "ready")
+    if pending is not None:
+        explanation_worker.follow_generation(reading_ids[worst], readings[worst], pending, explanation)
+    
+    response = {
+        "count": len(results),
+        "results": [
+            {"risk_score": risk_score, "risk_level": risk_level}
+            for risk_score, risk_level in results
+        ],
+        "explanation": explanation,
+        "explanation_id": reading_ids[worst],
+        "explanation_status": "fallback" if pending is not None else "ready"
+    }
+    
+    critical = [i for i, (_, risk_level) in enumerate(results) if risk_level == "CRITICAL"]
+    if critical:
+        # Batches may mix patients: every critical reading keeps its own patient
+        response["emergency_alert"] = {
+            **EMERGENCY_ALERT,
+            "readings": critical,
+            "reading_ids": [reading_ids[i] for i in critical],
+            "patient_ids": [readings[i].patient_id for i in critical]
+        }
+    
+    return response
+
+# Longest raw strip accepted by /analyze/ecg
+MAX_ECG_SECONDS = 60
+
+ECG_FEATURE_FIELDS = ("p_wave_duration", "pr_interval", "qrs_duration", "qt_interval", "t_wave_amplitude", "st_segment_elevation")
+
+@app.post("/analyze/ecg")
+async def analyze_ecg(
+    request: Request,
+    blood_pressure_systolic: int,
+    blood_pressure_diastolic: int,
+    oxygen_saturation: int,
+    temperature: float,
+    heart_rate: Optional[int] = None,
+    patient_id: str = Query(DEFAULT_PATIENT, min_length=1, max_length=64),
+    async_explanation: bool = False,
+    explanation_budget: Optional[float] = Query(None, ge=0, le=MAX_EXPLANATION_BUDGET),
+    x_sample_rate: int = Header(DEFAULT_SAMPLE_RATE, ge=100, le=2000),
+    x_ecg_gain: float = Header(DEFAULT_GAIN, gt=0)
+):
+    """Analyze a raw single-lead ECG strip.
+
+    The body is little-endian int16 samples (application/octet-stream) at
+    X-Sample-Rate Hz, scaled to mV by X-ECG-Gain. ECG features are extracted
+    from the strip; heart rate is derived from the beats unless given.
+    """
+    body = await request.body()
+    if len(body) > MAX_ECG_SECONDS * x_sample_rate * 2:
+        raise HTTPException(status_code=413, detail=f"ECG strip longer than {MAX_ECG_SECONDS} seconds")
+    try:
+        with timed("ecg_features"):
+            features = extract_features(decode_int16(body, x_ecg_gain), x_sample_rate)
+    except ECGError as e:
+        raise HTTPException(status_code=422, detail=str(e))
     
+    vitals = VitalSigns(
+        patient_id=patient_id,
+        heart_rate=heart_rate if heart_rate is not None else round(features["heart_rate"]),
+        blood_pressure_systolic=blood_pressure_systolic,
+        blood_pressure_diastolic=blood_pressure_diastolic,
+        oxygen_saturation=oxygen_saturation,
+        temperature=temperature,
+        **{field: features[field] for field in ECG_FEATURE_FIELDS}
+    )
+    response = await run_in_threadpool(analyze_vitals, vitals, async_explanation, explanation_budget)
+    response["ecg_features"] = features
     return response
 
+def ingest_readings(readings, explain):
+    """Score and store readings streamed by one device in a single commit.
+
+    If explain is set, the most severe reading gets a background LLM
+    explanation and (reading_id, Future) is returned alongside the results.
+    """
+    with timed("risk_scoring"):
+        results = calculate_risk_batch(readings)
+    worst = max(range(len(results)), key=lambda i: results[i][0]) if explain else None
+    
+    entries = []
+    for i, (vitals, (risk_score, risk_level)) in enumerate(zip(readings, results)):
+        reading_explanation = None if i == worst else f"Risk level: {risk_level} (Score: {risk_score}). Streamed reading."
+        entries.append((vitals, risk_score, risk_level, reading_explanation))
+    timestamp = datetime.now().isoformat()
+    with timed("save_reading"):
+        reading_ids = save_readings(entries, timestamp)
+    for reading_id, entry in zip(reading_ids, entries):
+        publish_reading(reading_id, timestamp, *entry)
+        metrics.readings_total.inc(entry[2])
+    
+    pending = None
+    if worst is not None:
+        vitals, risk_score, risk_level, _ = entries[worst]
+        future = explanation_worker.submit_explanation(reading_ids[worst], vitals, risk_score, risk_level)
+        pending = (reading_ids[worst], future)
+    
+    response = []
+    for i, (reading_id, (risk_score, risk_level)) in enumerate(zip(reading_ids, results)):
+        result = {
+            "reading_id": reading_id,
+            "timestamp": timestamp,
+            "risk_score": risk_score,
+            "risk_level": risk_level,
+            "explanation_status": "pending" if i == worst else "summary"
+        }
+        if risk_level == "CRITICAL":
+            result["emergency_alert"] = emergency_alert_for(reading_id, readings[i].patient_id)
+        response.append(result)
+    return response, pending
+
+@app.websocket("/ws/ingest")
+async def ws_ingest(websocket: WebSocket):
+    """Long-lived device telemetry channel with credit-based flow control (see ws_ingest.py)"""
+    session = IngestSession(websocket, VitalSigns.model_validate, ingest_readings)
+    await session.run()
+
+@app.get("/explanations/{explanation_id}")
+def get_explanation_status(explanation_id: int):
+    found, explanation = get_reading_explanation(explanation_id)
+    if not found:
+        raise HTTPException(status_code=404, detail="Reading not found")
+    return {
+        "explanation_id": explanation_id,
+        "status": "pending" if explanation is None else "ready",
+        "explanation": explanation
+    }
+
+@app.get("/explanations/{explanation_id}/stream")
+async def stream_explanation_tokens(request: Request, explanation_id: int, last_id: int = 0):
+    """Server-sent explanation tokens as the LLM produces them.
+
+    Each `token` event carries the next piece of text; the stream ends with
+    one `explanation` event holding the stored text. Event ids are character
+    offsets, so a reconnecting EventSource resumes where it left off.
+    """
+    found, _ = await run_in_threadpool(get_reading_explanation, explanation_id)
+    if not found:
+        raise HTTPException(status_code=404, detail="Reading not found")
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id and last_event_id.isdigit():
+        last_id = int(last_event_id)
+    
+    async def event_source():
+        backfill = lambda offset: explanation_worker.token_backfill(explanation_id, offset)
+        # Offsets are per reading, so only this reading's tokens may reach the subscriber
+        match = lambda event: event["data"]["id"] == explanation_id
+        async for event in explanation_worker.token_hub.events(last_id, backfill, match=match):
+            if await request.is_disconnected():
+                break
+            yield format_sse(event)
+            if event is not None and event["event"] == "explanation":
+                break
+    
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/status/breakers")
+def get_breaker_status():
+    """Circuit breaker state for each external dependency"""
+    return {
+        "ollama": ollama_breaker.status(),
+        "chromadb": chroma_breaker.status()
+    }
+
+@app.get("/llm/stats")
+def get_llm_stats():
+    """LLM scheduler queue depth, queue waits, coalesced requests and shed work"""
+    return llm_scheduler.stats()
+
+BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+metrics.register(metrics.Collector(
+    "cardiosense_llm_queue_depth", "LLM generations waiting for a slot",
+    lambda: {(): llm_scheduler.stats()["queue_depth"]}
+))
+metrics.register(metrics.Collector(
+    "cardiosense_llm_running", "LLM generations in progress",
+    lambda: {(): llm_scheduler.stats()["running"]}
+))
+metrics.register(metrics.Collector(
+    "cardiosense_llm_shed_total", "LLM generations shed from a full queue: rejected on submit or dropped while queued",
+    lambda: {(reason,): llm_scheduler.stats()[reason] for reason in ("rejected", "dropped")},
+    ["reason"], kind="counter"
+))
+metrics.register(metrics.Collector(
+    "cardiosense_circuit_breaker_state", "Breaker state: 0 closed, 1 half-open, 2 open",
+    lambda: {(name,): BREAKER_STATES[breaker.status()["state"]]
+             for name, breaker in (("ollama", ollama_breaker), ("chromadb", chroma_breaker))},
+    ["dependency"]
+))
+metrics.register(metrics.Collector(
+    "cardiosense_explanation_cache_lookups_total", "Explanation cache lookups, by result",
+    lambda: {(result,): explanation_cache.stats()[key] for result, key in (("hit", "hits"), ("miss", "misses"))},
+    ["result"], kind="counter"
+))
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Stage latency histograms, request latency and counters in Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/cache/stats")
+def get_cache_stats():
+    stats = explanation_cache.stats()
+    stats["pdf_reports"] = report_renderer.cache_stats()
+    return stats
+
+MAX_HISTORY_LIMIT = 1000
+
 @app.get("/history")
-def get_history():
-    return get_all_readings()
+def get_history(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_HISTORY_LIMIT),
+    before_id: Optional[int] = None,
+    since_id: Optional[int] = None,
+    risk_level: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    include_explanation: bool = True,
+    patient_id: Optional[str] = None
+):
+    # Without parameters this still returns the full history, newest first
+    with timed("history_query"):
+        return get_readings(
+            patient_id=patient_id,
+            limit=limit,
+            before_id=before_id,
+            since_id=since_id,
+            risk_level=risk_level,
+            start=start,
+            end=end,
+            include_explanation=include_explanation
+        )
 
-@app.get("/report")
-def get_report():
-    return get_summary_report()
+@app.get("/export")
+def export_readings(
+    format: Literal["csv", "ndjson", "arrow"] = "csv",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    risk_level: Optional[str] = None,
+    patient_id: Optional[str] = None,
+    include_explanation: bool = True
+):
+    """Stream the reading history, oldest first, as CSV, NDJSON or Arrow IPC"""
+    if format == "arrow" and not export.arrow_available():
+        raise HTTPException(status_code=501, detail="Arrow export requires pyarrow")
+    rows = export.stream_readings(
+        format,
+        include_explanation=include_explanation,
+        start=start,
+        end=end,
+        risk_level=risk_level,
+        patient_id=patient_id
+    )
+    filename = f"cardiosense_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{format}"
+    return StreamingResponse(
+        rows,
+        media_type=export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
 
-@app.get("/report/pdf")
-def get_pdf_report(patient_name: str = "John Doe", patient_age: int = 45):
-    report = get_summary_report()
-    pdf_buffer = generate_pdf_report(report, patient_name, patient_age)
+STREAM_BACKFILL_LIMIT = 1000
+
+def stream_backfill(last_id, patient_id=None):
+    """Stored readings (and alerts) after last_id, for resuming a stream.
+
+    If more than STREAM_BACKFILL_LIMIT readings were missed, a single
+    "reset" event at the newest reading is sent instead; the client
+    reloads /history and the stream carries on from there.
+    """
+    rows = get_readings(since_id=last_id, limit=STREAM_BACKFILL_LIMIT + 1, patient_id=patient_id)
+    if len(rows) > STREAM_BACKFILL_LIMIT:
+        latest = get_readings(limit=1, include_explanation=False, patient_id=patient_id)[0]["id"]
+        return [{"id": latest, "event": "reset", "data": {"last_id": latest, "patient_id": patient_id}}]
+    events = []
+    for row in rows:
+        events.append({"id": row["id"], "event": "reading", "data": row})
+        if row["risk_level"] == "CRITICAL":
+            events.append({"id": row["id"], "event": "alert", "data": emergency_alert_for(row["id"], row["patient_id"])})
+    return events
+
+@app.get("/stream")
+async def stream(request: Request, last_id: Optional[int] = None, patient_id: Optional[str] = None):
+    # EventSource sends Last-Event-ID when it reconnects; it is newer than the URL's last_id
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id and last_event_id.isdigit():
+        last_id = int(last_event_id)
+    
+    async def event_source():
+        backfill = lambda last_id: stream_backfill(last_id, patient_id)
+        match = None if patient_id is None else lambda event: event["data"].get("patient_id") == patient_id
+        async for event in hub.events(last_id, backfill, match=match):
+            if await request.is_disconnected():
+                break
+            yield format_sse(event)
+    
     return StreamingResponse(
-        pdf_buffer,
-        media_type="application/pdf",
-        headers={"Content-Disposition": f"attachment; filename=cardiosense_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"}
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
+@app.get("/report")
+def get_report(patient_id: Optional[str] = None):
+    # Without patient_id the report covers every patient
+    with timed("report_query"):
+        return get_summary_report(patient_id)
+
+MAX_TREND_BUCKETS = 2000
+
+@app.get("/trends")
+def trends(
+    resolution: Literal["minute", "hour", "day"] = "hour",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=MAX_TREND_BUCKETS),
+    patient_id: Optional[str] = None
+):
+    with timed("report_query"):
+        return get_trends(resolution, start=start, end=end, limit=limit, patient_id=patient_id)
+
+@app.post("/report/rebuild")
+def rebuild_report():
+    return rebuild_summary()
+
+@app.get("/archive")
+def get_archive():
+    """Archived days, live database size and the retention policy"""
+    status = get_archive_status()
+    status["retention"] = retention.status()
+    return status
+
+@app.post("/archive")
+def run_archive(older_than_days: Optional[int] = Query(None, ge=0)):
+    """Archive readings older than older_than_days (default: the retention policy) and vacuum"""
+    if older_than_days is None and retention.RETENTION_DAYS is None:
+        raise HTTPException(status_code=400, detail="older_than_days is required when no retention policy is set")
+    return retention.run_once(older_than_days)
+
+def pdf_report_inputs(patient_id, patient_name, patient_age):
+    """Report data and patient details for a PDF (database reads only)"""
+    with timed("report_query"):
+        # Name and age come from the patient record unless given explicitly
+        try:
+            patient_name, patient_age = report_jobs.patient_details(patient_id, patient_name, patient_age)
+        except LookupError:
+            raise HTTPException(status_code=404, detail="Patient not found")
+        report = get_summary_report(patient_id)
+        if "total_readings" not in report:
+            raise HTTPException(status_code=404, detail=report["message"])
+        trends = get_trends("hour", limit=48, patient_id=patient_id)
+        return report, patient_name, patient_age, trends, patient_id
+
+@app.get("/report/pdf")
+async def get_pdf_report(
+    request: Request,
+    patient_id: Optional[str] = None,
+    patient_name: Optional[str] = None,
+    patient_age: Optional[int] = None
+):
+    inputs = await run_in_threadpool(pdf_report_inputs, patient_id, patient_name, patient_age)
+    # The ETag is a hash of the inputs, so a repeat download is answered before rendering
+    etag = report_renderer.report_etag(*inputs)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if report_renderer.etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    
+    # Rendered in a worker process (or served from the PDF cache), off the event loop.
+    # A cached PDF keeps the "Generated" time of its first render: the report
+    # content is the same, only the download filename uses the current time.
+    with timed("pdf_render"):
+        pdf = await report_renderer.render_async(etag, *inputs)
+    headers["Content-Disposition"] = f"attachment; filename=cardiosense_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+    return Response(pdf, media_type="application/pdf", headers=headers)
+
+def with_report_links(job):
+    return {
+        **job,
+        "status_url": f"/reports/{job['id']}",
+        "download_url": f"/reports/{job['id']}/download"
+    }
+
+@app.post("/reports", status_code=202)
+def create_report_job(request: ReportRequest):
+    """Queue a multi-page report with the full reading history"""
+    # Only cheap checks here; the job reads the report data itself
+    if request.patient_id is not None and get_patient(request.patient_id) is None:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    if not get_readings(limit=1, include_explanation=False, patient_id=request.patient_id):
+        raise HTTPException(status_code=404, detail="No readings recorded")
+    job = report_jobs.submit({
+        "patient_id": request.patient_id,
+        "patient_name": request.patient_name,
+        "patient_age": request.patient_age,
+        "start": request.start,
+        "end": request.end
+    })
+    return with_report_links(job)
+
+@app.get("/reports/{job_id}")
+def get_report_job(job_id: str):
+    job = report_jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    return with_report_links(job)
+
+@app.get("/reports/{job_id}/download")
+def download_report(job_id: str):
+    job = report_jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    path = report_jobs.job_path(job_id)
+    if path is None:
+        raise HTTPException(status_code=409, detail=f"Report is {job['status']}")
+    return FileResponse(path, media_type="application/pdf", filename=f"cardiosense_full_report_{job_id[:8]}.pdf")
+
 @app.delete("/clear")
-def clear_history():
-    clear_all_readings()
+def clear_history(patient_id: Optional[str] = None):
+    clear_all_readings(patient_id)
+    if patient_id is not None:
+        return {"message": f"Readings cleared for patient {patient_id}"}
     return {"message": "All readings cleared"}
+
+@app.get("/patients")
+def list_patients():
+    return get_patients()
+
+@app.get("/patients/{patient_id}")
+def get_patient_record(patient_id: str):
+    patient = get_patient(patient_id)
+    if patient is None:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    return patient
+
+@app.put("/patients/{patient_id}")
+def update_patient(patient_id: str, patient: Patient):
+    save_patient(patient_id, patient.name, patient.age)
+    return get_patient(patient_id)
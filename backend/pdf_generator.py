@@ -3,83 +3,129 @@ from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image, PageBreak
 from reportlab.lib.units import inch
-from reportlab.graphics.shapes import Drawing, Line, Circle, Rect
+from reportlab.graphics.shapes import Drawing, Line, Circle, Rect, String, Path, PolyLine
 from reportlab.graphics.charts.linecharts import HorizontalLineChart
 from reportlab.graphics.charts.barcharts import VerticalBarChart
 from reportlab.graphics import renderPDF
 from datetime import datetime
+from functools import lru_cache
 import io
 import os
+import numpy as np
+from ecg_features import synthetic_ecg
 
-def create_ecg_waveform(width=500, height=180, st_elevation=0.0, t_wave=0.3):
-    """Generate ECG waveform drawing with dynamic values"""
+LOGO_PATH = os.path.join(os.path.dirname(__file__), 'logo.png')
+
+@lru_cache(maxsize=None)
+def get_styles():
+    """Style sheet and custom styles, built once per process"""
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=24,
+        textColor=colors.HexColor('#3b82f6'),
+        spaceAfter=30,
+        alignment=1  # Center
+    )
+    logo_style = ParagraphStyle('Logo', parent=styles['Title'], fontSize=28, textColor=colors.HexColor('#ef4444'), alignment=1)
+    footer_style = ParagraphStyle('Footer', parent=styles['Normal'], fontSize=9, textColor=colors.grey, alignment=1)
+    return styles, title_style, logo_style, footer_style
+
+@lru_cache(maxsize=None)
+def get_logo():
+    """logo.png contents read once per process (None if missing)"""
+    if not os.path.exists(LOGO_PATH):
+        return None
+    with open(LOGO_PATH, 'rb') as f:
+        return f.read()
+
+def warm_up():
+    """Load the cached assets; run as a report worker process initializer"""
+    get_styles()
+    get_logo()
+
+# ECG strip drawing: one grid path and one trace polyline
+ECG_BACKGROUND_COLOR = '#1e293b'
+ECG_GRID_COLOR = '#374151'
+ECG_TRACE_COLOR = '#10b981'
+ECG_ALERT_COLOR = '#ef4444'  # trace colour when the ST segment is elevated
+ECG_GRID_STEP = 20  # points per grid box
+ECG_MV_SCALE = 50  # points per mV
+ECG_MARGIN = 10
+PATH_MOVETO, PATH_LINETO = 0, 1  # reportlab Path operator codes
+
+def _grid_path(width, height, step):
+    """Every grid line as one Path (moveTo/lineTo pairs)"""
+    xs = np.arange(0, width, step, dtype=float)
+    ys = np.arange(0, height, step, dtype=float)
+    segments = np.concatenate([
+        np.column_stack([xs, np.zeros_like(xs), xs, np.full_like(xs, height)]),
+        np.column_stack([np.zeros_like(ys), ys, np.full_like(ys, width), ys]),
+    ])
+    return Path(
+        points=segments.ravel().tolist(),
+        operators=[PATH_MOVETO, PATH_LINETO] * len(segments),
+        strokeColor=colors.HexColor(ECG_GRID_COLOR),
+        strokeWidth=0.5,
+        fillColor=None
+    )
+
+def _trace_points(samples, width, height):
+    """Flat x, y point list for a mV trace, min/max-decimated to one pair per column"""
+    samples = np.asarray(samples, dtype=float)
+    columns = int(width - 2 * ECG_MARGIN)
+    if samples.size > 2 * columns:
+        # Keep each column's extremes in time order so narrow QRS spikes survive
+        per_column = samples.size // columns
+        blocks = samples[:per_column * columns].reshape(columns, per_column)
+        low, high = blocks.min(axis=1), blocks.max(axis=1)
+        low_first = blocks.argmin(axis=1) < blocks.argmax(axis=1)
+        y = np.column_stack([np.where(low_first, low, high), np.where(low_first, high, low)]).ravel()
+        x = np.repeat(np.linspace(ECG_MARGIN, width - ECG_MARGIN, columns), 2)
+    else:
+        y = samples
+        x = np.linspace(ECG_MARGIN, width - ECG_MARGIN, samples.size)
+    x = np.round(x, 1)
+    y = np.round(np.clip(height * 0.4 + y * ECG_MV_SCALE, 0, height), 1)
+    
+    # Drop points that lie on the line through their neighbours (flat and straight runs)
+    cross = (x[1:-1] - x[:-2]) * (y[2:] - y[1:-1]) - (y[1:-1] - y[:-2]) * (x[2:] - x[1:-1])
+    keep = np.concatenate([[True], np.abs(cross) > 1e-9, [True]])
+    return np.column_stack([x[keep], y[keep]]).ravel().tolist()
+
+def create_ecg_waveform(width=500, height=180, st_elevation=0.0, t_wave=0.3,
+                        features=None, samples=None, sample_rate=250, beats=3):
+    """Generate ECG waveform drawing with dynamic values.
+
+    Draws raw samples (mV) across the full width when given; otherwise a
+    strip of `beats` beats synthesized at sample_rate from ECG features
+    (heart_rate and the ECG fields of VitalSigns), with st_elevation and
+    t_wave as shorthands.
+    """
     drawing = Drawing(width, height)
+    drawing.add(Rect(0, 0, width, height, fillColor=colors.HexColor(ECG_BACKGROUND_COLOR), strokeColor=None))
+    drawing.add(_grid_path(width, height, ECG_GRID_STEP))
     
-    # Background
-    drawing.add(Rect(0, 0, width, height, fillColor=colors.HexColor('#1e293b'), strokeColor=None))
-    
-    # Grid background
-    for i in range(0, int(width), 20):
-        drawing.add(Line(i, 0, i, height, strokeColor=colors.HexColor('#374151'), strokeWidth=0.5))
-    for i in range(0, int(height), 20):
-        drawing.add(Line(0, i, width, i, strokeColor=colors.HexColor('#374151'), strokeWidth=0.5))
-    
-    # ECG waveform - draw multiple heartbeats
-    baseline = height / 2
-    beat_width = 120
-    
-    for beat in range(3):
-        x_offset = 20 + (beat * beat_width)
-        
-        # P wave
-        p_points = []
-        for i in range(15):
-            x = x_offset + i
-            y = baseline - 15 * (i/15) * ((15-i)/15) * 4
-            p_points.append((x, y))
-        for i in range(len(p_points)-1):
-            drawing.add(Line(p_points[i][0], p_points[i][1], p_points[i+1][0], p_points[i+1][1], 
-                           strokeColor=colors.HexColor('#10b981'), strokeWidth=2.5))
-        
-        x = x_offset + 20
-        
-        # PR segment
-        drawing.add(Line(x, baseline, x+15, baseline, strokeColor=colors.HexColor('#10b981'), strokeWidth=2.5))
-        x += 15
-        
-        # QRS complex
-        # Q wave
-        drawing.add(Line(x, baseline, x+3, baseline+8, strokeColor=colors.HexColor('#10b981'), strokeWidth=2.5))
-        x += 3
-        # R wave (tall spike)
-        drawing.add(Line(x, baseline+8, x+5, baseline-55, strokeColor=colors.HexColor('#10b981'), strokeWidth=2.5))
-        x += 5
-        # S wave
-        drawing.add(Line(x, baseline-55, x+3, baseline+10, strokeColor=colors.HexColor('#10b981'), strokeWidth=2.5))
-        x += 3
-        drawing.add(Line(x, baseline+10, x+3, baseline, strokeColor=colors.HexColor('#10b981'), strokeWidth=2.5))
-        x += 3
-        
-        # ST segment (shows elevation for heart attack)
-        st_y = baseline + (st_elevation * 100)
-        drawing.add(Line(x, baseline, x+25, st_y, strokeColor=colors.HexColor('#ef4444' if st_elevation > 0.1 else '#10b981'), strokeWidth=2.5))
-        x += 25
-        
-        # T wave
-        t_points = []
-        for i in range(25):
-            tx = x + i
-            ty = st_y - (t_wave * 60) * (i/25) * ((25-i)/25) * 4
-            t_points.append((tx, ty))
-        for i in range(len(t_points)-1):
-            drawing.add(Line(t_points[i][0], t_points[i][1], t_points[i+1][0], t_points[i+1][1], 
-                           strokeColor=colors.HexColor('#10b981'), strokeWidth=2.5))
-        
-        x += 25
-        
-        # Return to baseline
-        drawing.add(Line(x, t_points[-1][1], x+10, baseline, strokeColor=colors.HexColor('#10b981'), strokeWidth=2.5))
+    if samples is None:
+        features = dict(features or {})
+        features.setdefault('st_segment_elevation', st_elevation)
+        features.setdefault('t_wave_amplitude', t_wave)
+        heart_rate = features.pop('heart_rate', None) or 75
+        duration = beats * 60.0 / heart_rate
+        samples = synthetic_ecg(
+            duration=duration, sample_rate=sample_rate, heart_rate=heart_rate,
+            noise=0.0, baseline_wander=0.0, **features
+        )
+        st_elevation = features['st_segment_elevation']
     
+    trace_color = ECG_ALERT_COLOR if st_elevation > 0.1 else ECG_TRACE_COLOR
+    drawing.add(PolyLine(
+        _trace_points(samples, width, height),
+        strokeColor=colors.HexColor(trace_color),
+        strokeWidth=1.5,
+        strokeLineJoin=1
+    ))
     return drawing
 
 def create_vitals_chart(report_data):
@@ -107,39 +153,64 @@ def create_vitals_chart(report_data):
     drawing.add(chart)
     return drawing
 
-def generate_pdf_report(report_data, patient_name="John Doe", patient_age=45):
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter, topMargin=0.5*inch)
-    elements = []
-    styles = getSampleStyleSheet()
+def create_trend_chart(trends):
+    """Generate hourly mean vitals line chart from rollup buckets"""
+    drawing = Drawing(500, 220)
+    chart = HorizontalLineChart()
+    chart.x = 50
+    chart.y = 50
+    chart.height = 140
+    chart.width = 420
     
-    # Custom styles
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        textColor=colors.HexColor('#3b82f6'),
-        spaceAfter=30,
-        alignment=1  # Center
-    )
+    chart.data = [
+        [bucket['heart_rate']['mean'] for bucket in trends],
+        [bucket['blood_pressure_systolic']['mean'] for bucket in trends],
+        [bucket['oxygen_saturation']['mean'] for bucket in trends]
+    ]
+    
+    # Label roughly every sixth bucket to keep the axis readable
+    step = max(1, len(trends) // 6)
+    chart.categoryAxis.categoryNames = [
+        bucket['bucket_start'][5:16].replace('T', ' ') if i % step == 0 else ''
+        for i, bucket in enumerate(trends)
+    ]
+    chart.categoryAxis.labels.fontSize = 7
+    chart.lines[0].strokeColor = colors.HexColor('#3b82f6')
+    chart.lines[1].strokeColor = colors.HexColor('#ef4444')
+    chart.lines[2].strokeColor = colors.HexColor('#10b981')
+    chart.valueAxis.valueMin = 0
+    chart.valueAxis.valueMax = 200
+    
+    drawing.add(chart)
+    legend_items = [('Heart Rate', '#3b82f6'), ('BP Systolic', '#ef4444'), ('SpO2', '#10b981')]
+    for i, (label, color) in enumerate(legend_items):
+        x = 60 + i * 130
+        drawing.add(Line(x, 15, x + 20, 15, strokeColor=colors.HexColor(color), strokeWidth=2))
+        drawing.add(String(x + 25, 12, label, fontSize=8))
+    return drawing
+
+def render_pdf_report(report_data, patient_name="John Doe", patient_age=45, trends=None, patient_id=None):
+    """Build the report and return the PDF bytes (picklable, for worker processes)"""
+    return generate_pdf_report(report_data, patient_name, patient_age, trends, patient_id).getvalue()
+
+def _report_header(elements, title, patient_name, patient_age, patient_id):
+    """Logo, title, generation time and the patient table"""
+    styles, title_style, logo_style, _ = get_styles()
     
     # Logo
-    logo_path = os.path.join(os.path.dirname(__file__), 'logo.png')
-    if os.path.exists(logo_path):
-        logo = Image(logo_path, width=2.5*inch, height=1*inch)
+    logo_bytes = get_logo()
+    if logo_bytes is not None:
+        logo = Image(io.BytesIO(logo_bytes), width=2.5*inch, height=1*inch)
         logo.hAlign = 'CENTER'
         elements.append(logo)
         elements.append(Spacer(1, 0.2*inch))
     else:
-        logo_text = Paragraph(
-            "<b>❤️ CardioSense AI</b>",
-            ParagraphStyle('Logo', parent=styles['Title'], fontSize=28, textColor=colors.HexColor('#ef4444'), alignment=1)
-        )
+        logo_text = Paragraph("<b>❤️ CardioSense AI</b>", logo_style)
         elements.append(logo_text)
         elements.append(Spacer(1, 0.2*inch))
     
     # Title
-    title = Paragraph("<b>Cardiac Monitoring Report</b>", title_style)
+    title = Paragraph(f"<b>{title}</b>", title_style)
     elements.append(title)
     elements.append(Spacer(1, 0.1*inch))
     
@@ -158,9 +229,11 @@ def generate_pdf_report(report_data, patient_name="John Doe", patient_age=45):
     
     patient_data = [
         ['Patient Name:', patient_name],
-        ['Age:', f'{patient_age} years'],
+        ['Age:', f'{patient_age} years' if patient_age is not None else 'Not recorded'],
         ['Report ID:', f'CS-{datetime.now().strftime("%Y%m%d-%H%M%S")}']
     ]
+    if patient_id is not None:
+        patient_data.insert(0, ['Patient ID:', patient_id])
     
     patient_table = Table(patient_data, colWidths=[2*inch, 4*inch])
     patient_table.setStyle(TableStyle([
@@ -176,6 +249,10 @@ def generate_pdf_report(report_data, patient_name="John Doe", patient_age=45):
     ]))
     elements.append(patient_table)
     elements.append(Spacer(1, 0.3*inch))
+
+def _summary_sections(elements, report_data, trends):
+    """Summary table, charts, risk distribution and highest risk event"""
+    styles = get_styles()[0]
     
     # Monitoring Summary
     summary_title = Paragraph("<b>Monitoring Summary</b>", styles['Heading2'])
@@ -216,6 +293,14 @@ def generate_pdf_report(report_data, patient_name="John Doe", patient_age=45):
     elements.append(vitals_chart)
     elements.append(Spacer(1, 0.3*inch))
     
+    # Hourly trends from the rollup tables
+    if trends and len(trends) > 1:
+        trend_title = Paragraph("<b>Hourly Vital Sign Trends</b>", styles['Heading2'])
+        elements.append(trend_title)
+        elements.append(Spacer(1, 0.1*inch))
+        elements.append(create_trend_chart(trends))
+        elements.append(Spacer(1, 0.3*inch))
+    
     # Risk Distribution
     risk_title = Paragraph("<b>Risk Assessment Distribution</b>", styles['Heading2'])
     elements.append(risk_title)
@@ -267,16 +352,152 @@ def generate_pdf_report(report_data, patient_name="John Doe", patient_age=45):
     ]))
     elements.append(highest_table)
     elements.append(Spacer(1, 0.3*inch))
+
+def _report_footer(elements):
+    footer_style = get_styles()[3]
     
     # Footer
     footer = Paragraph(
         "<i>This report is generated by CardioSense AI for monitoring purposes only. "
         "Consult a healthcare professional for medical advice.</i>",
-        ParagraphStyle('Footer', parent=styles['Normal'], fontSize=9, textColor=colors.grey, alignment=1)
+        footer_style
     )
     elements.append(Spacer(1, 0.5*inch))
     elements.append(footer)
+
+def generate_pdf_report(report_data, patient_name="John Doe", patient_age=45, trends=None, patient_id=None):
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter, topMargin=0.5*inch)
+    elements = []
+    _report_header(elements, "Cardiac Monitoring Report", patient_name, patient_age, patient_id)
+    _summary_sections(elements, report_data, trends)
+    _report_footer(elements)
     
     doc.build(elements)
     buffer.seek(0)
     return buffer
+
+HISTORY_COLUMNS = ['Time', 'HR', 'BP', 'SpO2', 'Temp', 'Score', 'Level']
+LEVEL_ROW_COLORS = {'CRITICAL': '#fee2e2', 'HIGH': '#fef3c7'}
+
+def _history_table(chunk, with_patient):
+    """One chunk of readings as a compact table (header repeated on every page)"""
+    header = HISTORY_COLUMNS + (['Patient'] if with_patient else [])
+    rows = [header]
+    style = [
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3b82f6')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 7),
+        ('ALIGN', (1, 0), (-1, -1), 'CENTER'),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
+        ('TOPPADDING', (0, 0), (-1, -1), 2),
+        ('GRID', (0, 0), (-1, -1), 0.25, colors.grey)
+    ]
+    for i, reading in enumerate(chunk, start=1):
+        row = [
+            reading['timestamp'][:19].replace('T', ' '),
+            str(reading['heart_rate']),
+            f"{reading['blood_pressure_systolic']}/{reading['blood_pressure_diastolic']}",
+            str(reading['oxygen_saturation']),
+            str(reading['temperature']),
+            str(reading['risk_score']),
+            reading['risk_level']
+        ]
+        if with_patient:
+            row.append(reading['patient_id'])
+        rows.append(row)
+        if reading['risk_level'] in LEVEL_ROW_COLORS:
+            style.append(('BACKGROUND', (0, i), (-1, i), colors.HexColor(LEVEL_ROW_COLORS[reading['risk_level']])))
+    table = Table(rows, repeatRows=1)
+    table.setStyle(TableStyle(style))
+    return table
+
+class _LazyStory(list):
+    """Flowable list for doc.build that refills itself from an iterable of batches.
+
+    The build only takes flowables off the front while len() is non-zero,
+    so the next batch is created just as the last one has been laid out.
+    That is how BaseDocTemplate.build consumes its list, not a documented
+    API, so requirements.txt pins the reportlab versions it was checked on.
+    """
+
+    def __init__(self, batches):
+        super().__init__()
+        self._batches = iter(batches)
+
+    def __len__(self):
+        while not super().__len__():
+            batch = next(self._batches, None)
+            if batch is None:
+                return 0
+            self.extend(batch)
+        return super().__len__()
+
+def _full_report_story(report_data, patient_name, patient_age, patient_id,
+                       hourly_trends, daily_trends, critical_chunks, reading_chunks):
+    """Flowables of the long-form report, one batch per section or chunk"""
+    styles = get_styles()[0]
+    elements = []
+    _report_header(elements, "Full Cardiac Monitoring Report", patient_name, patient_age, patient_id)
+    _summary_sections(elements, report_data, hourly_trends)
+    
+    if daily_trends and len(daily_trends) > 1:
+        elements.append(Paragraph("<b>Daily Vital Sign Trends</b>", styles['Heading2']))
+        elements.append(Spacer(1, 0.1*inch))
+        elements.append(create_trend_chart(daily_trends))
+        elements.append(Spacer(1, 0.3*inch))
+    
+    # Every CRITICAL event with the explanation stored for it
+    elements.append(PageBreak())
+    elements.append(Paragraph("<b>Critical Events</b>", styles['Heading2']))
+    elements.append(Spacer(1, 0.1*inch))
+    yield elements
+    critical_count = 0
+    for chunk in critical_chunks:
+        elements = []
+        for reading in chunk:
+            critical_count += 1
+            patient = f" &mdash; patient {reading['patient_id']}" if patient_id is None else ""
+            elements.append(Paragraph(
+                f"<b>{reading['timestamp'][:19].replace('T', ' ')}</b>{patient} &mdash; "
+                f"HR {reading['heart_rate']} bpm, BP {reading['blood_pressure_systolic']}/"
+                f"{reading['blood_pressure_diastolic']}, SpO2 {reading['oxygen_saturation']}%, "
+                f"score {reading['risk_score']}",
+                styles['Normal']
+            ))
+            explanation = (reading['explanation'] or 'No explanation recorded').replace('&', '&amp;').replace('<', '&lt;')
+            elements.append(Paragraph(explanation.replace('\n', '<br/>'), styles['BodyText']))
+            elements.append(Spacer(1, 0.15*inch))
+        yield elements
+    
+    elements = []
+    if critical_count == 0:
+        elements.append(Paragraph("No CRITICAL readings recorded.", styles['Normal']))
+    
+    # Full reading history
+    elements.append(PageBreak())
+    elements.append(Paragraph("<b>Reading History</b>", styles['Heading2']))
+    elements.append(Spacer(1, 0.1*inch))
+    yield elements
+    for chunk in reading_chunks:
+        yield [_history_table(chunk, patient_id is None)]
+    
+    elements = []
+    _report_footer(elements)
+    yield elements
+
+def build_full_report(out_path, report_data, patient_name, patient_age, patient_id,
+                      hourly_trends, daily_trends, critical_chunks, reading_chunks):
+    """Long-form report written straight to out_path.
+
+    critical_chunks and reading_chunks are iterables of reading lists (see
+    database.iter_readings). Each chunk is turned into flowables only when
+    the layout reaches it and dropped once its pages are drawn, so memory
+    holds one chunk plus the compressed pages already written.
+    """
+    doc = SimpleDocTemplate(out_path, pagesize=letter, topMargin=0.5*inch, pageCompression=1)
+    doc.build(_LazyStory(_full_report_story(
+        report_data, patient_name, patient_age, patient_id,
+        hourly_trends, daily_trends, critical_chunks, reading_chunks
+    )))
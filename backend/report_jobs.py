@@ -0,0 +1,171 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+import database
+from metrics import observe_stage
+
+# Long-form reports are built one at a time so they never starve the /report/pdf workers
+REPORT_JOB_WORKERS = 1
+REPORTS_DIR = "reports"
+# Readings fetched per query while building the history and critical event sections
+REPORT_CHUNK_SIZE = 500
+# Finished jobs (and their files) are forgotten after this many seconds
+REPORT_JOB_TTL = 3600
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+_jobs = {}  # job id -> job record
+_jobs_lock = threading.Lock()
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            from pdf_generator import warm_up
+            # spawn, not fork: the server process runs the DB writer and other threads
+            _executor = ProcessPoolExecutor(
+                max_workers=REPORT_JOB_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=warm_up
+            )
+        return _executor
+
+def patient_details(patient_id, patient_name=None, patient_age=None):
+    """(name, age) for a report: given values, else the patient record.
+
+    Raises LookupError for an unknown patient_id.
+    """
+    if patient_id is not None:
+        patient = database.get_patient(patient_id)
+        if patient is None:
+            raise LookupError(f"Patient {patient_id} not found")
+        patient_name = patient_name or patient["name"] or patient_id
+        if patient_age is None:
+            patient_age = patient["age"]
+    return patient_name or "All patients", patient_age
+
+def build_report(db_path, out_path, options):
+    """Worker process entry point: read the database in chunks and write the PDF.
+
+    Returns the size of the finished file. Readings added after the job
+    started are left out so the history matches its summary.
+    """
+    from pdf_generator import build_full_report
+    database.DB_PATH = db_path
+    patient_id = options.get("patient_id")
+    filters = {"patient_id": patient_id, "start": options.get("start"), "end": options.get("end")}
+
+    patient_name, patient_age = patient_details(patient_id, options.get("patient_name"), options.get("patient_age"))
+    latest = database.get_readings(limit=1, include_explanation=False, patient_id=patient_id)
+    before_id = latest[0]["id"] + 1 if latest else 1
+
+    tmp_path = out_path + ".tmp"
+    try:
+        build_full_report(
+            tmp_path,
+            database.get_summary_report(patient_id),
+            patient_name,
+            patient_age,
+            patient_id,
+            database.get_trends("hour", limit=168, **filters),
+            database.get_trends("day", limit=366, **filters),
+            database.iter_readings(REPORT_CHUNK_SIZE, before_id=before_id, risk_level="CRITICAL", **filters),
+            database.iter_readings(REPORT_CHUNK_SIZE, before_id=before_id, include_explanation=False, **filters)
+        )
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    # Only a complete file is ever visible under the download path
+    os.replace(tmp_path, out_path)
+    return os.path.getsize(out_path)
+
+def _public(job):
+    record = {key: value for key, value in job.items() if key not in ("future", "path", "submitted", "finished")}
+    if record["status"] == "queued" and job["future"].running():
+        record["status"] = "running"
+    return record
+
+def _finish(job_id, future):
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return
+        job["finished_at"] = datetime.now().isoformat()
+        job["finished"] = time.monotonic()
+        observe_stage("report_job", job["finished"] - job["submitted"])
+        error = future.exception()
+        if error is None:
+            job["status"] = "done"
+            job["size_bytes"] = future.result()
+        else:
+            logger.error("Report job %s failed: %s", job_id, error)
+            job["status"] = "failed"
+            job["error"] = str(error)
+
+def _purge_expired():
+    now = time.monotonic()
+    with _jobs_lock:
+        expired = [job_id for job_id, job in _jobs.items()
+                   if job.get("finished") is not None and now - job["finished"] > REPORT_JOB_TTL]
+        paths = [_jobs.pop(job_id)["path"] for job_id in expired]
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+def submit(options):
+    """Queue a long-form report; returns the job record"""
+    _purge_expired()
+    os.makedirs(REPORTS_DIR, exist_ok=True)
+    # Readings still in the write-behind queue belong in the report
+    database.flush()
+
+    job_id = uuid.uuid4().hex
+    job = {
+        "id": job_id,
+        "status": "queued",
+        "options": options,
+        "created_at": datetime.now().isoformat(),
+        "submitted": time.monotonic(),
+        "finished_at": None,
+        "finished": None,
+        "size_bytes": None,
+        "error": None,
+        "path": os.path.abspath(os.path.join(REPORTS_DIR, f"{job_id}.pdf")),
+    }
+    with _jobs_lock:
+        _jobs[job_id] = job
+        job["future"] = _get_executor().submit(
+            build_report, os.path.abspath(database.DB_PATH), job["path"], options
+        )
+    job["future"].add_done_callback(lambda done: _finish(job_id, done))
+    return get_job(job_id)
+
+def get_job(job_id):
+    _purge_expired()
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        return _public(job)
+
+def job_path(job_id):
+    """Path of a finished report, or None"""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        return job["path"] if job is not None and job["status"] == "done" else None
+
+def shutdown(wait=True):
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,106 @@
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import threading
+import time
+from metrics import observe_stage
+
+# Worker processes rendering PDFs; reportlab is CPU-bound and holds the GIL
+PDF_RENDER_WORKERS = 2
+# Finished PDFs kept in memory, keyed by a hash of everything they show
+PDF_CACHE_SIZE = 32
+
+_executor = None
+_executor_lock = threading.Lock()
+
+_cache = OrderedDict()  # etag -> PDF bytes
+_in_flight = {}  # etag -> Future, so identical concurrent requests render once
+_cache_lock = threading.Lock()
+hits = 0
+misses = 0
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            from pdf_generator import warm_up
+            # spawn, not fork: the server process runs the DB writer and other threads
+            _executor = ProcessPoolExecutor(
+                max_workers=PDF_RENDER_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=warm_up
+            )
+        return _executor
+
+def report_etag(report, patient_name, patient_age, trends, patient_id):
+    """Strong ETag over the report data and patient parameters"""
+    payload = json.dumps(
+        [report, patient_name, patient_age, trends, patient_id],
+        sort_keys=True, separators=(",", ":"), default=str
+    )
+    return '"' + hashlib.sha256(payload.encode()).hexdigest()[:32] + '"'
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match check: "*" or any listed entity tag equal to etag (W/ ignored, as in weak comparison)"""
+    tags = [tag.strip() for tag in (if_none_match or "").split(",")]
+    return "*" in tags or any(tag.removeprefix("W/") == etag.removeprefix("W/") for tag in tags if tag)
+
+def _store(etag, future, submitted):
+    observe_stage("pdf_build", time.monotonic() - submitted)
+    with _cache_lock:
+        _in_flight.pop(etag, None)
+        if future.exception() is None:
+            _cache[etag] = future.result()
+            _cache.move_to_end(etag)
+            while len(_cache) > PDF_CACHE_SIZE:
+                _cache.popitem(last=False)
+
+def render(etag, report, patient_name, patient_age, trends, patient_id):
+    """Future resolving to the PDF bytes, from the cache or a worker process"""
+    global hits, misses
+    with _cache_lock:
+        if etag in _cache:
+            hits += 1
+            _cache.move_to_end(etag)
+            future = Future()
+            future.set_result(_cache[etag])
+            return future
+        if etag in _in_flight:
+            hits += 1
+            return _in_flight[etag]
+        misses += 1
+        from pdf_generator import render_pdf_report
+        future = _get_executor().submit(
+            render_pdf_report, report, patient_name, patient_age, trends, patient_id
+        )
+        _in_flight[etag] = future
+    submitted = time.monotonic()
+    future.add_done_callback(lambda done: _store(etag, done, submitted))
+    return future
+
+async def render_async(etag, report, patient_name, patient_age, trends, patient_id):
+    return await asyncio.wrap_future(render(etag, report, patient_name, patient_age, trends, patient_id))
+
+def cache_stats():
+    with _cache_lock:
+        return {
+            "hits": hits,
+            "misses": misses,
+            "size": len(_cache),
+            "max_size": PDF_CACHE_SIZE,
+            "bytes": sum(len(pdf) for pdf in _cache.values())
+        }
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+
+def shutdown(wait=True):
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
@@ -0,0 +1,55 @@
+from datetime import datetime
+import logging
+import threading
+import database
+
+# Readings older than this many days move to the archive; None keeps everything in SQLite
+RETENTION_DAYS = None
+# Seconds between retention runs
+RETENTION_INTERVAL = 6 * 3600
+
+logger = logging.getLogger("cardiosense.retention")
+
+_stop = threading.Event()
+_thread = None
+last_run = None  # result of the most recent run
+
+def run_once(older_than_days=None):
+    """Archive readings past retention, then vacuum the freed pages in small steps"""
+    global last_run
+    result = database.archive_readings(older_than_days if older_than_days is not None else RETENTION_DAYS)
+    result["vacuum"] = database.vacuum()
+    result["finished_at"] = datetime.now().isoformat()
+    last_run = result
+    return result
+
+def _loop():
+    while not _stop.wait(RETENTION_INTERVAL):
+        try:
+            run_once()
+        except Exception:
+            logger.exception("Retention run failed")
+
+def start():
+    """Run the retention policy every RETENTION_INTERVAL seconds, if RETENTION_DAYS is set"""
+    global _thread
+    if RETENTION_DAYS is None or (_thread is not None and _thread.is_alive()):
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=_loop, name="retention", daemon=True)
+    _thread.start()
+
+def stop():
+    global _thread
+    _stop.set()
+    thread, _thread = _thread, None
+    if thread is not None:
+        thread.join()
+
+def status():
+    return {
+        "retention_days": RETENTION_DAYS,
+        "interval_seconds": RETENTION_INTERVAL,
+        "running": _thread is not None and _thread.is_alive(),
+        "last_run": last_run,
+    }
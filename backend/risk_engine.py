@@ -1,78 +1,111 @@
+import numpy as np
+
 def calculate_risk(vitals):
+    score, risk_level, _ = assess_risk(vitals)
+    return score, risk_level
+
+def assess_risk(vitals):
+    """Score vitals and report the IDs of the rules that fired.
+
+    Returns (score, risk_level, rules); rule IDs index the medical
+    knowledge base in rag_query.
+    """
     score = 0
     cardiac_emergency = False
+    rules = []
     
     # Heart rate scoring
     if vitals.heart_rate < 60 or vitals.heart_rate > 100:
         score += 2
+        rules.append("bradycardia" if vitals.heart_rate < 60 else "tachycardia")
     if vitals.heart_rate > 120:
         score += 3
+        rules.append("severe_tachycardia")
     if vitals.heart_rate > 150:
         score += 5
         cardiac_emergency = True
+        rules.append("extreme_tachycardia")
     
     # Blood pressure scoring
     if vitals.blood_pressure_systolic > 140 or vitals.blood_pressure_diastolic > 90:
         score += 3
+        rules.append("hypertension")
     if vitals.blood_pressure_systolic > 180 or vitals.blood_pressure_diastolic > 120:
         score += 5
         cardiac_emergency = True
+        rules.append("stage2_hypertension")
     
     # Oxygen saturation scoring
     if vitals.oxygen_saturation < 95:
         score += 2
+        rules.append("low_oxygen")
     if vitals.oxygen_saturation < 90:
         score += 4
+        rules.append("hypoxemia")
     if vitals.oxygen_saturation < 85:
         score += 6
         cardiac_emergency = True
+        rules.append("severe_hypoxemia")
     
     # Temperature scoring
     if vitals.temperature > 38.0 or vitals.temperature < 36.0:
         score += 2
+        rules.append("fever" if vitals.temperature > 38.0 else "hypothermia")
     
     # ECG Analysis - P Wave
     if vitals.p_wave_duration > 0.12:  # Prolonged P wave (atrial enlargement)
         score += 3
+        rules.append("prolonged_p_wave")
     if vitals.p_wave_duration < 0.06:  # Shortened P wave
         score += 2
+        rules.append("short_p_wave")
     
     # PR Interval (AV conduction)
     if vitals.pr_interval > 0.20:  # First-degree AV block
         score += 4
         cardiac_emergency = True
+        rules.append("first_degree_av_block")
     if vitals.pr_interval < 0.12:  # Pre-excitation syndrome
         score += 3
+        rules.append("pre_excitation")
     
     # QRS Duration (ventricular conduction)
     if vitals.qrs_duration > 0.12:  # Bundle branch block
         score += 5
         cardiac_emergency = True
+        rules.append("bundle_branch_block")
     
     # QT Interval (repolarization)
     if vitals.qt_interval > 0.50:  # Long QT syndrome - risk of sudden death
         score += 6
         cardiac_emergency = True
+        rules.append("long_qt")
     if vitals.qt_interval < 0.30:  # Short QT syndrome
         score += 4
+        rules.append("short_qt")
     
     # T Wave Analysis (ischemia indicator)
     if vitals.t_wave_amplitude < 0.1:  # Flattened T wave (ischemia)
         score += 4
+        rules.append("flattened_t_wave")
     if vitals.t_wave_amplitude < 0:  # Inverted T wave (severe ischemia)
         score += 7
         cardiac_emergency = True
+        rules.append("inverted_t_wave")
     if vitals.t_wave_amplitude > 0.6:  # Peaked T wave (hyperkalemia)
         score += 5
         cardiac_emergency = True
+        rules.append("peaked_t_wave")
     
     # ST Segment (heart attack indicator)
     if vitals.st_segment_elevation > 0.1:  # ST elevation - STEMI (heart attack)
         score += 10
         cardiac_emergency = True
+        rules.append("stemi")
     if vitals.st_segment_elevation < -0.1:  # ST depression (ischemia)
         score += 6
         cardiac_emergency = True
+        rules.append("st_depression")
     
     # Determine risk level
     if cardiac_emergency or score >= 15:
@@ -84,4 +117,96 @@ def calculate_risk(vitals):
     else:
         risk_level = "LOW"
     
-    return score, risk_level
+    return score, risk_level, rules
+
+# Fields scored by calculate_risk, in VitalSigns order
+VITAL_FIELDS = [
+    "heart_rate",
+    "blood_pressure_systolic",
+    "blood_pressure_diastolic",
+    "oxygen_saturation",
+    "temperature",
+    "p_wave_duration",
+    "pr_interval",
+    "qrs_duration",
+    "qt_interval",
+    "t_wave_amplitude",
+    "st_segment_elevation",
+]
+
+RISK_LEVELS = np.array(["LOW", "MODERATE", "HIGH", "CRITICAL"])
+
+def vitals_to_columns(vitals_list):
+    """Convert a list of vitals objects into one NumPy array per field"""
+    return {
+        field: np.array([getattr(v, field) for v in vitals_list], dtype=np.float64)
+        for field in VITAL_FIELDS
+    }
+
+def score_columns(columns):
+    """Vectorized calculate_risk over columnar vitals.
+
+    Mirrors every rule in calculate_risk so both paths return identical
+    scores and levels. Returns (scores, levels) arrays.
+    """
+    hr = columns["heart_rate"]
+    sys_bp = columns["blood_pressure_systolic"]
+    dia_bp = columns["blood_pressure_diastolic"]
+    spo2 = columns["oxygen_saturation"]
+    temp = columns["temperature"]
+    p_wave = columns["p_wave_duration"]
+    pr = columns["pr_interval"]
+    qrs = columns["qrs_duration"]
+    qt = columns["qt_interval"]
+    t_wave = columns["t_wave_amplitude"]
+    st = columns["st_segment_elevation"]
+
+    # (condition, points, cardiac emergency) in the same order as calculate_risk
+    rules = [
+        ((hr < 60) | (hr > 100), 2, False),
+        (hr > 120, 3, False),
+        (hr > 150, 5, True),
+        ((sys_bp > 140) | (dia_bp > 90), 3, False),
+        ((sys_bp > 180) | (dia_bp > 120), 5, True),
+        (spo2 < 95, 2, False),
+        (spo2 < 90, 4, False),
+        (spo2 < 85, 6, True),
+        ((temp > 38.0) | (temp < 36.0), 2, False),
+        (p_wave > 0.12, 3, False),
+        (p_wave < 0.06, 2, False),
+        (pr > 0.20, 4, True),
+        (pr < 0.12, 3, False),
+        (qrs > 0.12, 5, True),
+        (qt > 0.50, 6, True),
+        (qt < 0.30, 4, False),
+        (t_wave < 0.1, 4, False),
+        (t_wave < 0, 7, True),
+        (t_wave > 0.6, 5, True),
+        (st > 0.1, 10, True),
+        (st < -0.1, 6, True),
+    ]
+
+    n = len(hr)
+    scores = np.zeros(n, dtype=np.int64)
+    cardiac_emergency = np.zeros(n, dtype=bool)
+    for condition, points, emergency in rules:
+        scores += condition * points
+        if emergency:
+            cardiac_emergency |= condition
+
+    level_index = np.select(
+        [cardiac_emergency | (scores >= 15), scores >= 8, scores >= 3],
+        [3, 2, 1],
+        default=0,
+    )
+    return scores, RISK_LEVELS[level_index]
+
+def calculate_risk_batch(vitals_list):
+    """Score many readings in a single NumPy pass.
+
+    Returns a list of (score, risk_level) tuples, one per reading.
+    """
+    if not vitals_list:
+        return []
+    scores, levels = score_columns(vitals_to_columns(vitals_list))
+    return [(int(score), str(level)) for score, level in zip(scores, levels)]
@@ -0,0 +1,53 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger("cardiosense.startup")
+
+# name -> {"status": pending|loading|ready|failed, "load_seconds": float, "error": str}
+_components = {}
+_components_lock = threading.Lock()
+
+def _set(name, **fields):
+    with _components_lock:
+        _components.setdefault(name, {"status": "pending"}).update(fields)
+
+def register(*names):
+    for name in names:
+        _set(name)
+
+def load_component(name, loader):
+    """Run loader(), recording its status and load time"""
+    _set(name, status="loading")
+    start = time.perf_counter()
+    try:
+        loader()
+    except Exception as e:
+        elapsed = time.perf_counter() - start
+        _set(name, status="failed", load_seconds=round(elapsed, 3), error=str(e))
+        logger.warning("Failed to load %s after %.2fs: %s", name, elapsed, e)
+        return False
+    elapsed = time.perf_counter() - start
+    _set(name, status="ready", load_seconds=round(elapsed, 3), error=None)
+    logger.info("Loaded %s in %.2fs", name, elapsed)
+    return True
+
+def start_warm_up(loaders):
+    """Load (name, loader) pairs one after another on a background thread"""
+    register(*(name for name, _ in loaders))
+
+    def run():
+        for name, loader in loaders:
+            load_component(name, loader)
+
+    thread = threading.Thread(target=run, name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+def is_ready(*names):
+    with _components_lock:
+        return all(_components.get(name, {}).get("status") == "ready" for name in names)
+
+def component_status():
+    with _components_lock:
+        return {name: dict(state) for name, state in _components.items()}
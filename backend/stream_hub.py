@@ -0,0 +1,117 @@
+import asyncio
+import json
+import threading
+
+# Events buffered per subscriber before it is considered too slow and dropped
+SUBSCRIBER_BUFFER = 256
+KEEPALIVE_SECONDS = 15
+
+_DROPPED = object()
+
+class Subscriber:
+    def __init__(self, loop, buffer_size, match=None):
+        self.loop = loop
+        self.match = match  # event -> bool; events it rejects are never queued
+        self.queue = asyncio.Queue(maxsize=buffer_size)
+        self.dropped = False
+
+    def offer(self, event):
+        # Runs on the subscriber's event loop
+        if self.dropped:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Never block ingestion on a slow client: drop it instead
+            self.dropped = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(_DROPPED)
+
+class BroadcastHub:
+    """Per-process fan-out of reading and alert events to stream subscribers.
+
+    publish() may be called from any thread and never blocks. Each event is
+    a dict with an "id" (the reading id), an "event" type and a "data" payload.
+    Events that are not a position in the reading sequence (explanation
+    updates) have id None, so they never become a client's Last-Event-ID.
+    """
+
+    def __init__(self, buffer_size=SUBSCRIBER_BUFFER):
+        self.buffer_size = buffer_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, match=None):
+        subscriber = Subscriber(asyncio.get_running_loop(), self.buffer_size, match)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, event_type, event_id, data):
+        event = {"id": event_id, "event": event_type, "data": data}
+        with self._lock:
+            self.published += 1
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            # Filtered on the publishing thread, so other streams' events never fill this buffer
+            if subscriber.match is not None and not subscriber.match(event):
+                continue
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.offer, event)
+            except RuntimeError:
+                # Subscriber's loop has closed
+                self.unsubscribe(subscriber)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    async def events(self, last_id=None, backfill=None, keepalive=KEEPALIVE_SECONDS, match=None):
+        """Yield events for one subscriber, resuming after last_id.
+
+        Only live events for which match(event) is true are delivered
+        (all of them without match); backfill should apply the same filter.
+
+        backfill(last_id) returns the events already stored since last_id
+        (it runs in a worker thread); live events it already covered are
+        skipped so every reading and alert is delivered once. Yields None
+        as a keep-alive when idle.
+        """
+        subscriber = self.subscribe(match)
+        try:
+            # Subscribe before backfilling so nothing published meanwhile is missed
+            backfilled = last_id
+            if last_id is not None and backfill is not None:
+                for event in await asyncio.to_thread(backfill, last_id):
+                    yield event
+                    backfilled = max(backfilled, event["id"])
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if event is _DROPPED:
+                    with self._lock:
+                        self.dropped += 1
+                    return
+                if backfilled is not None and event["id"] is not None and event["id"] <= backfilled:
+                    continue
+                yield event
+        finally:
+            self.unsubscribe(subscriber)
+
+def format_sse(event):
+    if event is None:
+        return ": keep-alive\n\n"
+    id_line = f"id: {event['id']}\n" if event["id"] is not None else ""
+    return f"{id_line}event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+hub = BroadcastHub()
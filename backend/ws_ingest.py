@@ -0,0 +1,161 @@
+import asyncio
+import json
+import logging
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+
+# Readings a device may have in flight before it must wait for more credit
+INGEST_WINDOW = 32
+# LLM explanations a device may have queued at once; further readings get a short summary
+MAX_PENDING_EXPLANATIONS = 1
+
+# WebSocket close code for a device that ignores flow control (policy violation)
+CREDIT_EXCEEDED_CLOSE_CODE = 1008
+
+logger = logging.getLogger("cardiosense.ingest")
+
+_CLOSE = object()
+
+class IngestSession:
+    """One device's /ws/ingest connection.
+
+    Protocol (JSON text frames):
+      server -> {"type": "credit", "credit": n}   n more readings may be sent
+      device -> {"seq": 1, "vitals": {...}}        spends one credit
+      server -> {"type": "result", "seq": 1, "reading_id": ..., "risk_score": ..., ...}
+      server -> {"type": "explanation", "reading_id": ..., "explanation": ...}
+      server -> {"type": "error", "seq": 1, "detail": ...}
+      server -> {"type": "error", "seq": null, "reading_id": ..., "detail": ...}   explanation failed
+
+    Credit is returned once a reading has been scored and committed, or
+    answered with an error if that failed, so one device never has more
+    than the window queued in the server and never waits on lost credit.
+    Readings that arrive together are scored and stored as one batch.
+    """
+
+    def __init__(self, websocket, parse, process, window=None, max_pending_explanations=None):
+        self.websocket = websocket
+        self.parse = parse  # frame vitals -> VitalSigns, raising ValidationError
+        self.process = process  # (readings, explain) -> (results, (reading_id, Future) or None)
+        self.window = window or INGEST_WINDOW
+        self.max_pending_explanations = (
+            MAX_PENDING_EXPLANATIONS if max_pending_explanations is None else max_pending_explanations
+        )
+        self.credit = 0  # credit the device still holds
+        self.pending_explanations = 0
+        self.inbox = asyncio.Queue()
+        self.outbox = asyncio.Queue()
+
+    async def run(self):
+        await self.websocket.accept()
+        sender = asyncio.create_task(self._send())
+        processor = asyncio.create_task(self._process())
+        try:
+            self._grant(self.window)
+            if await self._receive() is _CLOSE:
+                # Let the error frame and close go out before tearing down
+                await sender
+        finally:
+            processor.cancel()
+            sender.cancel()
+
+    def _grant(self, credit):
+        self.credit += credit
+        self.outbox.put_nowait({"type": "credit", "credit": credit})
+
+    async def _receive(self):
+        while True:
+            message = await self.websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if self.credit <= 0:
+                # The device ignored flow control; close rather than buffer without bound
+                self.outbox.put_nowait({"type": "error", "seq": None, "detail": "Credit exhausted"})
+                self.outbox.put_nowait(_CLOSE)
+                return _CLOSE
+            self.credit -= 1
+            self.inbox.put_nowait(message.get("text"))
+
+    async def _send(self):
+        while True:
+            message = await self.outbox.get()
+            if message is _CLOSE:
+                await self.websocket.close(code=CREDIT_EXCEEDED_CLOSE_CODE)
+                return
+            await self.websocket.send_json(message)
+
+    def _decode(self, text):
+        """Frame text -> (seq, vitals, error detail)"""
+        if text is None:
+            return None, None, "Readings must be sent as JSON text frames"
+        try:
+            frame = json.loads(text)
+        except ValueError:
+            return None, None, "Invalid JSON"
+        if not isinstance(frame, dict):
+            return None, None, "Frame must be a JSON object"
+        seq = frame.get("seq")
+        try:
+            return seq, self.parse(frame.get("vitals", {})), None
+        except ValidationError as e:
+            return seq, None, e.errors(include_url=False, include_context=False)
+
+    async def _process(self):
+        while True:
+            # Everything already queued goes into one scoring pass and one commit
+            frames = [await self.inbox.get()]
+            while not self.inbox.empty():
+                frames.append(self.inbox.get_nowait())
+
+            try:
+                await self._process_batch(frames)
+            except Exception:
+                logger.exception("Failed to process %d streamed frames", len(frames))
+                self.outbox.put_nowait({"type": "error", "seq": None, "detail": "Readings could not be processed"})
+            finally:
+                self._grant(len(frames))
+
+    async def _process_batch(self, frames):
+        seqs, readings = [], []
+        for seq, vitals, error in map(self._decode, frames):
+            if error is not None:
+                self.outbox.put_nowait({"type": "error", "seq": seq, "detail": error})
+            else:
+                seqs.append(seq)
+                readings.append(vitals)
+        if not readings:
+            return
+
+        explain = self.pending_explanations < self.max_pending_explanations
+        try:
+            results, pending = await run_in_threadpool(self.process, readings, explain)
+        except Exception:
+            logger.exception("Failed to store %d streamed readings", len(readings))
+            for seq in seqs:
+                self.outbox.put_nowait({"type": "error", "seq": seq, "detail": "Reading could not be stored"})
+            return
+        for seq, result in zip(seqs, results):
+            self.outbox.put_nowait({"type": "result", "seq": seq, **result})
+        if pending is not None:
+            self.pending_explanations += 1
+            asyncio.create_task(self._forward_explanation(*pending))
+
+    async def _forward_explanation(self, reading_id, future):
+        try:
+            explanation = await asyncio.wrap_future(future)
+        except Exception:
+            logger.exception("Explanation for reading %s failed", reading_id)
+            self.outbox.put_nowait({
+                "type": "error",
+                "seq": None,
+                "reading_id": reading_id,
+                "detail": "Explanation could not be stored"
+            })
+            return
+        finally:
+            self.pending_explanations -= 1
+        self.outbox.put_nowait({
+            "type": "explanation",
+            "reading_id": reading_id,
+            "explanation": explanation
+        })
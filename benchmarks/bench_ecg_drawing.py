@@ -0,0 +1,110 @@
+"""Compare the ECG drawing in pdf_generator with the original Line-per-segment version.
+
+Usage (from the benchmarks directory):
+    python bench_ecg_drawing.py [--runs 50]
+"""
+import argparse
+import time
+import sys
+sys.path.append('../backend')
+from reportlab.lib import colors
+from reportlab.graphics.shapes import Drawing, Line, Rect
+from reportlab.graphics import renderPDF
+from ecg_features import synthetic_ecg
+from pdf_generator import create_ecg_waveform
+
+def legacy_ecg_waveform(width=500, height=180, st_elevation=0.0, t_wave=0.3):
+    """The original drawing: one Line shape per grid line and curve segment"""
+    drawing = Drawing(width, height)
+    
+    # Background
+    drawing.add(Rect(0, 0, width, height, fillColor=colors.HexColor('#1e293b'), strokeColor=None))
+    
+    # Grid background
+    for i in range(0, int(width), 20):
+        drawing.add(Line(i, 0, i, height, strokeColor=colors.HexColor('#374151'), strokeWidth=0.5))
+    for i in range(0, int(height), 20):
+        drawing.add(Line(0, i, width, i, strokeColor=colors.HexColor('#374151'), strokeWidth=0.5))
+    
+    # ECG waveform - draw multiple heartbeats
+    baseline = height / 2
+    beat_width = 120
+    
+    for beat in range(3):
+        x_offset = 20 + (beat * beat_width)
+        
+        # P wave
+        p_points = []
+        for i in range(15):
+            x = x_offset + i
+            y = baseline - 15 * (i/15) * ((15-i)/15) * 4
+            p_points.append((x, y))
+        for i in range(len(p_points)-1):
+            drawing.add(Line(p_points[i][0], p_points[i][1], p_points[i+1][0], p_points[i+1][1], 
+                           strokeColor=colors.HexColor('#10b981'), strokeWidth=2.5))
+        
+        x = x_offset + 20
+        
+        # PR segment
+        drawing.add(Line(x, baseline, x+15, baseline, strokeColor=colors.HexColor('#10b981'), strokeWidth=2.5))
+        x += 15
+        
+        # QRS complex
+        # Q wave
+        drawing.add(Line(x, baseline, x+3, baseline+8, strokeColor=colors.HexColor('#10b981'), strokeWidth=2.5))
+        x += 3
+        # R wave (tall spike)
+        drawing.add(Line(x, baseline+8, x+5, baseline-55, strokeColor=colors.HexColor('#10b981'), strokeWidth=2.5))
+        x += 5
+        # S wave
+        drawing.add(Line(x, baseline-55, x+3, baseline+10, strokeColor=colors.HexColor('#10b981'), strokeWidth=2.5))
+        x += 3
+        drawing.add(Line(x, baseline+10, x+3, baseline, strokeColor=colors.HexColor('#10b981'), strokeWidth=2.5))
+        x += 3
+        
+        # ST segment (shows elevation for heart attack)
+        st_y = baseline + (st_elevation * 100)
+        drawing.add(Line(x, baseline, x+25, st_y, strokeColor=colors.HexColor('#ef4444' if st_elevation > 0.1 else '#10b981'), strokeWidth=2.5))
+        x += 25
+        
+        # T wave
+        t_points = []
+        for i in range(25):
+            tx = x + i
+            ty = st_y - (t_wave * 60) * (i/25) * ((25-i)/25) * 4
+            t_points.append((tx, ty))
+        for i in range(len(t_points)-1):
+            drawing.add(Line(t_points[i][0], t_points[i][1], t_points[i+1][0], t_points[i+1][1], 
+                           strokeColor=colors.HexColor('#10b981'), strokeWidth=2.5))
+        
+        x += 25
+        
+        # Return to baseline
+        drawing.add(Line(x, t_points[-1][1], x+10, baseline, strokeColor=colors.HexColor('#10b981'), strokeWidth=2.5))
+    
+    return drawing
+
+
+def measure(name, build, runs):
+    """Mean build + render time and the size of the rendered PDF"""
+    start = time.perf_counter()
+    for _ in range(runs):
+        drawing = build()
+        pdf = renderPDF.drawToString(drawing)
+    elapsed = (time.perf_counter() - start) / runs * 1000
+    print(f"{name:<32} {elapsed:8.2f} ms {len(pdf):10,d} bytes {len(drawing.contents):6d} shapes")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+    
+    strip = synthetic_ecg(duration=10, noise=0.01)
+    print(f"{'drawing':<32} {'time':>11} {'PDF size':>16} {'shapes':>13}")
+    measure("legacy, 3 beats", lambda: legacy_ecg_waveform(st_elevation=0.2), args.runs)
+    measure("polyline, 3 beats from features", lambda: create_ecg_waveform(st_elevation=0.2), args.runs)
+    measure("polyline, 12 beats from features", lambda: create_ecg_waveform(st_elevation=0.2, beats=12), args.runs)
+    measure("polyline, 10 s raw at 500 Hz", lambda: create_ecg_waveform(samples=strip), args.runs)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""Benchmark ECG feature extraction on synthetic strips.
+
+Usage (from the benchmarks directory):
+    python bench_ecg_features.py [--seconds 10] [--sample-rate 500] [--runs 200]
+"""
+import argparse
+import statistics
+import time
+import sys
+sys.path.append('../backend')
+from ecg_features import decode_int16, encode_int16, extract_features, synthetic_ecg
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--sample-rate", type=int, default=500)
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+    
+    strip = encode_int16(synthetic_ecg(duration=args.seconds, sample_rate=args.sample_rate, noise=0.01))
+    print(f"{args.seconds:g} s strip at {args.sample_rate} Hz: {len(strip)} bytes as int16")
+    
+    # Warm up once, then time decode + extraction as /analyze/ecg does
+    extract_features(decode_int16(strip), args.sample_rate)
+    timings = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        features = extract_features(decode_int16(strip), args.sample_rate)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    
+    print(f"runs: {args.runs}")
+    print(f"mean: {statistics.mean(timings):.2f} ms")
+    print(f"p50:  {timings[len(timings) // 2]:.2f} ms")
+    print(f"p95:  {timings[int(len(timings) * 0.95) - 1]:.2f} ms")
+    print(f"features: {features}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""Concurrent load test of /analyze, /history, /report and /report/pdf.
+
+By default starts the API with stub Ollama and knowledge-base backends
+(stub_backends.py) so it runs offline; --url targets a running server,
+which is only written to (seed readings, analyze requests) with --allow-writes.
+Closed loop with --concurrency workers, or open loop with Poisson
+arrivals at --rate requests/s (--concurrency then caps requests in flight).
+Reports throughput and p50/p95/p99 latency per endpoint; baselines are
+saved to and compared against baselines/<name>.json.
+
+Usage (from the benchmarks directory):
+    python bench_load.py [--duration 30] [--concurrency 16] [--rate 50]
+                         [--mix analyze=70,history=20,report=8,report_pdf=2]
+                         [--save-baseline pi5] [--compare pi5 --tolerance 0.15]
+                         [--url http://pi.local:8000 --mix history=80,report=20]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import time
+import httpx
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+DEFAULT_MIX = "analyze=70,history=20,report=8,report_pdf=2"
+PATIENTS = 8
+
+def random_vitals(rng):
+    # Mostly normal readings with an occasional deteriorating patient
+    sick = rng.random() < 0.1
+    return {
+        "patient_id": f"bench-{rng.randrange(PATIENTS)}",
+        "heart_rate": rng.randint(110, 160) if sick else rng.randint(55, 105),
+        "blood_pressure_systolic": rng.randint(150, 200) if sick else rng.randint(105, 145),
+        "blood_pressure_diastolic": rng.randint(95, 125) if sick else rng.randint(65, 92),
+        "oxygen_saturation": rng.randint(82, 93) if sick else rng.randint(94, 100),
+        "temperature": round(rng.uniform(36.0, 38.8), 1),
+    }
+
+def build_request(endpoint, rng):
+    """(method, path, params, json body) for one request to endpoint"""
+    patient = f"bench-{rng.randrange(PATIENTS)}"
+    if endpoint == "analyze":
+        return "POST", "/analyze", {}, random_vitals(rng)
+    if endpoint == "history":
+        return "GET", "/history", {"limit": 50, "patient_id": patient}, None
+    if endpoint == "report":
+        return "GET", "/report", {"patient_id": patient}, None
+    if endpoint == "report_pdf":
+        return "GET", "/report/pdf", {"patient_id": patient}, None
+    raise ValueError(f"Unknown endpoint {endpoint}")
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        build_request(name.strip(), random.Random())  # validates the name
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))]
+
+def summarize(latencies, errors, elapsed):
+    """Per-endpoint throughput and latency percentiles (milliseconds)"""
+    results = {}
+    for endpoint in sorted(set(latencies) | set(errors)):
+        values = sorted(latencies.get(endpoint, []))
+        results[endpoint] = {
+            "requests": len(values) + errors.get(endpoint, 0),
+            "errors": errors.get(endpoint, 0),
+            "throughput_rps": round(len(values) / elapsed, 2),
+            "mean_ms": round(sum(values) / len(values), 2) if values else None,
+            "p50_ms": round(percentile(values, 0.50), 2) if values else None,
+            "p95_ms": round(percentile(values, 0.95), 2) if values else None,
+            "p99_ms": round(percentile(values, 0.99), 2) if values else None,
+            "max_ms": round(values[-1], 2) if values else None,
+        }
+    return results
+
+async def run_load(url, weights, duration, concurrency, rate, seed):
+    rng = random.Random(seed)
+    endpoints, endpoint_weights = list(weights), list(weights.values())
+    latencies, errors = {}, {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=url, timeout=60, limits=limits) as client:
+        async def issue():
+            endpoint = rng.choices(endpoints, endpoint_weights)[0]
+            method, path, params, body = build_request(endpoint, rng)
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, params=params, json=body)
+                ok = response.status_code < 400 or (endpoint == "report_pdf" and response.status_code == 404)
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.setdefault(endpoint, []).append((time.perf_counter() - start) * 1000)
+            else:
+                errors[endpoint] = errors.get(endpoint, 0) + 1
+
+        started = time.perf_counter()
+        deadline = started + duration
+        if rate is None:
+            # Closed loop: each worker sends its next request when the last one returns
+            async def worker():
+                while time.perf_counter() < deadline:
+                    await issue()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+        else:
+            # Open loop: Poisson arrivals, independent of how fast the server answers
+            in_flight = asyncio.Semaphore(concurrency)
+            tasks = []
+            async def limited():
+                async with in_flight:
+                    await issue()
+            next_arrival = started
+            while next_arrival < deadline:
+                await asyncio.sleep(max(0.0, next_arrival - time.perf_counter()))
+                tasks.append(asyncio.create_task(limited()))
+                next_arrival += rng.expovariate(rate)
+            await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+    return summarize(latencies, errors, elapsed), elapsed
+
+def seed_readings(url, count, seed):
+    """Store count readings, plus one for every patient so the report endpoints have data"""
+    if count <= 0:
+        return
+    rng = random.Random(seed)
+    readings = [random_vitals(rng) for _ in range(count)]
+    for i in range(PATIENTS):
+        readings.append(dict(random_vitals(rng), patient_id=f"bench-{i}"))
+    httpx.post(f"{url}/analyze/batch", json=readings, timeout=60).raise_for_status()
+
+def start_server(port, args):
+    command = [
+        sys.executable, "stub_backends.py", "--port", str(port),
+        "--llm-first-token-ms", str(args.llm_first_token_ms),
+        "--llm-tokens", str(args.llm_tokens),
+        "--llm-token-ms", str(args.llm_token_ms),
+    ]
+    server = subprocess.Popen(command, cwd=os.path.dirname(os.path.abspath(__file__)))
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("Stub server exited during startup")
+        try:
+            if httpx.get(f"{url}/", timeout=1).status_code == 200:
+                return server, url
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("Stub server did not start")
+
+def print_results(results, elapsed, baseline=None, tolerance=0.1):
+    """Print the table; returns the endpoints that regressed against baseline"""
+    regressions = []
+    print(f"\n{'endpoint':<12}{'reqs':>7}{'errs':>6}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}  vs baseline")
+    for endpoint, stats in results.items():
+        fmt = lambda value: f"{value:.1f}" if value is not None else "-"
+        line = (f"{endpoint:<12}{stats['requests']:>7}{stats['errors']:>6}{stats['throughput_rps']:>9.1f}"
+                f"{fmt(stats['p50_ms']):>10}{fmt(stats['p95_ms']):>10}{fmt(stats['p99_ms']):>10}")
+        before = (baseline or {}).get(endpoint)
+        if before and before["p95_ms"] and stats["p95_ms"]:
+            p95_change = stats["p95_ms"] / before["p95_ms"] - 1
+            rps_change = stats["throughput_rps"] / before["throughput_rps"] - 1 if before["throughput_rps"] else 0.0
+            line += f"  p95 {p95_change:+.0%}, rps {rps_change:+.0%}"
+            if p95_change > tolerance or rps_change < -tolerance:
+                regressions.append(endpoint)
+                line += "  REGRESSION"
+        print(line)
+    print(f"elapsed: {elapsed:.1f} s")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="Target a running server instead of starting the stub one")
+    parser.add_argument("--allow-writes", action="store_true",
+                        help="Let a --url run store readings (seeding and analyze requests)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rate", type=float, default=None, help="Open-loop arrival rate (requests/s)")
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--seed-readings", type=int, default=200,
+                        help="Readings stored before the run; 0 to skip (default 200)")
+    parser.add_argument("--llm-first-token-ms", type=float, default=300)
+    parser.add_argument("--llm-tokens", type=int, default=40)
+    parser.add_argument("--llm-token-ms", type=float, default=20)
+    parser.add_argument("--save-baseline", metavar="NAME")
+    parser.add_argument("--compare", metavar="NAME")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed p95/throughput change vs baseline")
+    args = parser.parse_args()
+    weights = parse_mix(args.mix)
+    # A real server's readings are patient data; only write to it when asked
+    writes = args.url is None or args.allow_writes
+    if not writes and weights.get("analyze"):
+        parser.error("the analyze endpoint stores readings; drop it from --mix or pass --allow-writes")
+
+    server = None
+    url = args.url
+    if url is None:
+        server, url = start_server(args.port, args)
+    try:
+        if writes:
+            seed_readings(url, args.seed_readings, args.seed)
+        mode = f"open loop at {args.rate:g} req/s" if args.rate else "closed loop"
+        print(f"{url}: {mode}, concurrency {args.concurrency}, {args.duration:g} s, mix {args.mix}")
+        results, elapsed = asyncio.run(run_load(url, weights, args.duration, args.concurrency, args.rate, args.seed))
+    finally:
+        if server is not None:
+            # SIGINT lets uvicorn run the lifespan shutdown (worker pools, DB writer)
+            server.send_signal(signal.SIGINT)
+            try:
+                server.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+    baseline = None
+    if args.compare:
+        with open(os.path.join(BASELINE_DIR, f"{args.compare}.json")) as f:
+            baseline = json.load(f)["results"]
+    regressions = print_results(results, elapsed, baseline, args.tolerance)
+
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        path = os.path.join(BASELINE_DIR, f"{args.save_baseline}.json")
+        with open(path, "w") as f:
+            json.dump({"config": {key: value for key, value in vars(args).items()
+                                  if key not in ("save_baseline", "compare", "url")},
+                       "results": results}, f, indent=2)
+        print(f"baseline saved to {path}")
+    if regressions:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+"""Replay recorded readings through the full /analyze pipeline.
+
+Readings come from a CardioSense SQLite database (opened read-only) or an
+exported CSV / NDJSON file. They are sent in timestamp order at --speed
+times real time (0 = as fast as possible). A database source includes
+the readings moved to its archive day files. The replay reports the
+per-stage timings each response carries in its Server-Timing header, how
+far behind schedule the replay fell, and every reading whose replayed
+risk level differs from the recorded one.
+
+By default the API runs in this process against a fresh temporary
+database, so the source is never written to; --stub-backends swaps
+Ollama and ChromaDB for the stand-ins in stub_backends.py. --url replays
+against a running server instead. ECG interval fields are not stored
+with readings, so unless the source has them they replay at their
+defaults. ECG findings only ever raise the score, so a reading without
+ECG inputs that replays lower than recorded is reported as unverifiable
+rather than divergent.
+
+Usage (from the benchmarks directory):
+    python replay.py ../backend/cardiosense.db [--speed 60] [--concurrency 8]
+                     [--patient-id bed-4] [--start 2024-05-01] [--end 2024-05-02]
+                     [--archive-dir ../backend/cardiosense-archive]
+                     [--stub-backends] [--url http://localhost:8000]
+                     [--json replay.json] [--fail-on-divergence]
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import csv
+from datetime import datetime
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from bench_load import percentile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'backend'))
+sys.path.insert(0, os.path.join(ROOT, 'rag_pipeline'))
+
+VITAL_FIELDS = {
+    "heart_rate": int,
+    "blood_pressure_systolic": int,
+    "blood_pressure_diastolic": int,
+    "oxygen_saturation": int,
+    "temperature": float,
+}
+# VitalSigns fields that /analyze/ecg derives from the strip; exports only carry them if added by hand
+ECG_FIELDS = ("p_wave_duration", "pr_interval", "qrs_duration", "qt_interval", "t_wave_amplitude", "st_segment_elevation")
+LEVELS = ["LOW", "MODERATE", "HIGH", "CRITICAL"]
+
+def _reading(record):
+    """Normalise one source row: vitals as numbers, recorded score/level kept if present"""
+    reading = {
+        "id": record.get("id"),
+        "timestamp": record["timestamp"],
+        "patient_id": record.get("patient_id") or "default",
+        "risk_level": record.get("risk_level") or None,
+        "risk_score": int(record["risk_score"]) if record.get("risk_score") not in (None, "") else None,
+    }
+    for field, convert in VITAL_FIELDS.items():
+        reading[field] = convert(record[field])
+    ecg = {field: float(record[field]) for field in ECG_FIELDS if record.get(field) not in (None, "")}
+    reading["ecg"] = ecg or None
+    return reading
+
+def _in_range(reading, patient_id, start, end):
+    return ((patient_id is None or reading["patient_id"] == patient_id)
+            and (start is None or reading["timestamp"] >= start)
+            and (end is None or reading["timestamp"] <= end))
+
+def _archived_rows(directory, patient_id, start, end):
+    """Readings in a database's archive day files (see database.archive_dir)"""
+    import archive
+    rows = []
+    for day in archive.list_days(directory):
+        # Timestamps are ISO-8601, so a day outside [start, end] holds nothing in range
+        if (start is not None and day < start[:10]) or (end is not None and day > end[:10]):
+            continue
+        rows.extend(row for row in archive.day_rows(archive.day_path(directory, day))
+                    if patient_id is None or row["patient_id"] == patient_id)
+    return rows
+
+def load_readings(source, patient_id=None, start=None, end=None, limit=None, archive_dir=None):
+    """Recorded readings from a .db, .csv or .ndjson/.jsonl file, oldest first.
+
+    A database's archived readings are read from archive_dir, by default
+    the directory the server uses next to it.
+    """
+    extension = os.path.splitext(source)[1].lower()
+    if extension in (".db", ".sqlite", ".sqlite3"):
+        conn = sqlite3.connect(f"file:{os.path.abspath(source)}?mode=ro", uri=True)
+        conn.row_factory = sqlite3.Row
+        query, params = "SELECT * FROM readings WHERE 1 = 1", []
+        for clause, value in (("patient_id = ?", patient_id), ("timestamp >= ?", start), ("timestamp <= ?", end)):
+            if value is not None:
+                query += f" AND {clause}"
+                params.append(value)
+        rows = [dict(row) for row in conn.execute(query + " ORDER BY timestamp, id", params)]
+        conn.close()
+        stored = {row["id"] for row in rows}
+        archive_dir = archive_dir or f"{os.path.splitext(os.path.abspath(source))[0]}-archive"
+        rows += [row for row in _archived_rows(archive_dir, patient_id, start, end) if row["id"] not in stored]
+    elif extension == ".csv":
+        with open(source, newline="") as f:
+            rows = list(csv.DictReader(f))
+    elif extension in (".ndjson", ".jsonl"):
+        with open(source) as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+    else:
+        raise ValueError(f"Unsupported source {source}: expected .db, .csv, .ndjson or .jsonl")
+
+    readings = [reading for reading in map(_reading, rows) if _in_range(reading, patient_id, start, end)]
+    readings.sort(key=lambda reading: reading["timestamp"])
+    return readings[:limit] if limit else readings
+
+def parse_server_timing(header):
+    """{stage: milliseconds} from a Server-Timing header"""
+    stages = {}
+    for entry in (header or "").split(","):
+        name, _, params = entry.strip().partition(";")
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if name and key == "dur":
+                stages[name] = stages.get(name, 0.0) + float(value)
+    return stages
+
+def schedule(readings, speed):
+    """Seconds after the start at which each reading is sent"""
+    if not readings or not speed:
+        return [0.0] * len(readings)
+    first = datetime.fromisoformat(readings[0]["timestamp"])
+    return [(datetime.fromisoformat(r["timestamp"]) - first).total_seconds() / speed for r in readings]
+
+def replay(client, readings, speed, concurrency, params):
+    """Send every reading at its scheduled time; returns one result per reading"""
+    results = [None] * len(readings)
+    started = time.perf_counter()
+
+    def send(i, due):
+        reading = readings[i]
+        sent = time.perf_counter()
+        body = {"patient_id": reading["patient_id"], **{field: reading[field] for field in VITAL_FIELDS}, **(reading["ecg"] or {})}
+        try:
+            response = client.post("/analyze", json=body, params=params)
+            response.raise_for_status()
+            data, error = response.json(), None
+        except Exception as e:
+            data, error = None, str(e)
+        finished = time.perf_counter()
+        results[i] = {
+            "reading": reading,
+            "lag_ms": (sent - started - due) * 1000,
+            "latency_ms": (finished - sent) * 1000,
+            "stages": parse_server_timing(response.headers.get("server-timing")) if data else {},
+            "risk_level": data["risk_level"] if data else None,
+            "risk_score": data["risk_score"] if data else None,
+            "error": error,
+        }
+
+    # Readings are handed to the pool on schedule; a pool that cannot keep up shows as lag
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for i, due in enumerate(schedule(readings, speed)):
+            delay = started + due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, i, due)
+    return results, time.perf_counter() - started
+
+def _summary(values):
+    values = sorted(values)
+    if not values:
+        return None
+    return {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values), 2),
+        "p50_ms": round(percentile(values, 0.50), 2),
+        "p95_ms": round(percentile(values, 0.95), 2),
+        "p99_ms": round(percentile(values, 0.99), 2),
+        "max_ms": round(values[-1], 2),
+    }
+
+def _missing_ecg(result):
+    """Replayed lower than recorded with no ECG inputs to replay: likely ECG findings, not a divergence"""
+    reading = result["reading"]
+    return (reading["ecg"] is None and reading["risk_score"] is not None
+            and result["risk_level"] != reading["risk_level"] and result["risk_score"] < reading["risk_score"])
+
+def analyse(results, elapsed):
+    """Stage timings, schedule lag and risk-level divergence of a replay"""
+    ok = [result for result in results if result["error"] is None]
+    stage_names = sorted({stage for result in ok for stage in result["stages"]}, key=lambda s: (s == "total", s))
+    stages = {stage: _summary([r["stages"][stage] for r in ok if stage in r["stages"]]) for stage in stage_names}
+    stages["client"] = _summary([r["latency_ms"] for r in ok])
+    stages["lag"] = _summary([max(0.0, r["lag_ms"]) for r in results])
+
+    recorded = [r for r in ok if r["reading"]["risk_level"] is not None]
+    unverifiable = [r for r in recorded if _missing_ecg(r)]
+    compared = [r for r in recorded if not _missing_ecg(r)]
+    divergent = [r for r in compared if r["risk_level"] != r["reading"]["risk_level"]]
+    transitions = {}
+    for r in divergent:
+        key = f"{r['reading']['risk_level']} -> {r['risk_level']}"
+        transitions[key] = transitions.get(key, 0) + 1
+    return {
+        "readings": len(results),
+        "errors": len(results) - len(ok),
+        "elapsed_seconds": round(elapsed, 2),
+        "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else None,
+        "stages": stages,
+        "compared": len(compared),
+        "unverifiable": len(unverifiable),
+        "divergent": len(divergent),
+        "escalated": sum(LEVELS.index(r["risk_level"]) > LEVELS.index(r["reading"]["risk_level"]) for r in divergent),
+        "transitions": transitions,
+        "divergent_readings": [{
+            "id": r["reading"]["id"],
+            "timestamp": r["reading"]["timestamp"],
+            "patient_id": r["reading"]["patient_id"],
+            "recorded": [r["reading"]["risk_level"], r["reading"]["risk_score"]],
+            "replayed": [r["risk_level"], r["risk_score"]],
+        } for r in divergent],
+    }
+
+def print_report(report, show=10):
+    print(f"\n{report['readings']} readings in {report['elapsed_seconds']:.1f} s "
+          f"({report['throughput_rps']} readings/s), {report['errors']} errors")
+    print(f"\n{'stage':<18}{'count':>7}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for stage, stats in report["stages"].items():
+        if stats:
+            print(f"{stage:<18}{stats['count']:>7}{stats['mean_ms']:>10.2f}{stats['p50_ms']:>10.2f}"
+                  f"{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}{stats['max_ms']:>10.2f}")
+
+    print(f"\nrisk level: {report['divergent']} of {report['compared']} readings diverge "
+          f"({report['escalated']} escalated)")
+    if report["unverifiable"]:
+        print(f"  {report['unverifiable']} more replay lower than recorded without stored ECG inputs; not compared")
+    for transition, count in sorted(report["transitions"].items(), key=lambda item: -item[1]):
+        print(f"  {transition:<22}{count:>6}")
+    for r in report["divergent_readings"][:show]:
+        print(f"  #{r['id']} {r['timestamp']} {r['patient_id']}: "
+              f"{r['recorded'][0]} ({r['recorded'][1]}) -> {r['replayed'][0]} ({r['replayed'][1]})")
+
+def in_process_client(args):
+    """TestClient for the API on a fresh temporary database (lifespan started)"""
+    if args.stub_backends:
+        from stub_backends import use_stub_backends
+        use_stub_backends()
+    import database
+    workdir = tempfile.mkdtemp(prefix="cardiosense-replay-")
+    database.DB_PATH = os.path.join(workdir, "replay.db")
+    os.chdir(workdir)
+    from fastapi.testclient import TestClient
+    from main import app
+    return TestClient(app)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("source", help="cardiosense.db, or a .csv / .ndjson export")
+    parser.add_argument("--speed", type=float, default=60, help="Multiple of real time; 0 sends as fast as possible")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--patient-id")
+    parser.add_argument("--start", help="ISO-8601 lower bound on the reading timestamp")
+    parser.add_argument("--end", help="ISO-8601 upper bound on the reading timestamp")
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--archive-dir", help="Archive day files of a .db source (default: <db name>-archive next to it)")
+    parser.add_argument("--explanation-budget", type=float, help="Passed to /analyze (seconds)")
+    parser.add_argument("--async-explanation", action="store_true", help="Don't wait for explanations")
+    parser.add_argument("--url", help="Replay against a running server instead of in-process")
+    parser.add_argument("--stub-backends", action="store_true", help="In-process only: stub Ollama and ChromaDB")
+    parser.add_argument("--json", metavar="PATH", help="Also write the full report as JSON")
+    parser.add_argument("--show", type=int, default=10, help="Divergent readings to list")
+    parser.add_argument("--fail-on-divergence", action="store_true", help="Exit 1 if any risk level differs")
+    args = parser.parse_args()
+    source = os.path.abspath(args.source)
+    json_path = os.path.abspath(args.json) if args.json else None
+
+    readings = load_readings(source, args.patient_id, args.start, args.end, args.limit,
+                             os.path.abspath(args.archive_dir) if args.archive_dir else None)
+    if not readings:
+        sys.exit("No readings to replay")
+    params = {}
+    if args.explanation_budget is not None:
+        params["explanation_budget"] = args.explanation_budget
+    if args.async_explanation:
+        params["async_explanation"] = "true"
+
+    if args.url:
+        import httpx
+        client = httpx.Client(base_url=args.url, timeout=120)
+    else:
+        client = in_process_client(args)
+    span = schedule(readings, args.speed)[-1]
+    print(f"Replaying {len(readings)} readings from {args.source} "
+          f"({'as fast as possible' if not args.speed else f'{args.speed:g}x real time, ~{span:.0f} s'})")
+    with client:
+        results, elapsed = replay(client, readings, args.speed, args.concurrency, params)
+        report = analyse(results, elapsed)
+        print_report(report, args.show)
+        if json_path:
+            with open(json_path, "w") as f:
+                json.dump(report, f, indent=2)
+            print(f"\nreport written to {json_path}")
+        if not args.url:
+            print("waiting for background explanations to finish...")
+    if args.fail_on_divergence and report["divergent"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Run the API with local stand-ins for Ollama and the ChromaDB knowledge base.
+
+The stub Ollama is a small HTTP server speaking /api/generate (streamed
+NDJSON) and /api/tags with a configurable first-token delay and token
+rate; the API reaches it through OLLAMA_HOST, so the real client, breaker
+and scheduler are exercised. The knowledge base is replaced by an
+in-memory collection ranking MEDICAL_DOCS by word overlap, so no
+embedding model has to be downloaded.
+
+Usage (from the benchmarks directory; bench_load.py starts it for you):
+    python stub_backends.py [--port 8765] [--db /tmp/bench.db] [--llm-first-token-ms 300]
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'backend'))
+sys.path.insert(0, os.path.join(ROOT, 'rag_pipeline'))
+
+STUB_TEXT = (
+    "The readings show {level} cardiac risk. Heart rate, blood pressure and oxygen "
+    "saturation should be rechecked and trended. Escalate to a clinician if values worsen."
+)
+
+def stub_ollama_handler(first_token_ms, tokens, token_ms):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _json(self, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            self._json({"models": [{"model": "llama3.2:3b"}]})
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if self.path != "/api/generate":
+                return self._json({})
+            level = "elevated" if "CRITICAL" in request.get("prompt", "") else "moderate"
+            words = (STUB_TEXT.format(level=level).split(" ") * tokens)[:tokens]
+            if not request.get("stream"):
+                time.sleep((first_token_ms + token_ms * tokens) / 1000)
+                return self._json({"model": request.get("model"), "response": " ".join(words), "done": True})
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            time.sleep(first_token_ms / 1000)
+            for i, word in enumerate(words):
+                self._chunk({"model": request.get("model"), "response": word + " ", "done": False})
+                time.sleep(token_ms / 1000)
+            self._chunk({"model": request.get("model"), "response": "", "done": True})
+            self.wfile.write(b"0\r\n\r\n")
+
+        def _chunk(self, payload):
+            line = json.dumps(payload).encode() + b"\n"
+            self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+            self.wfile.flush()
+
+    return Handler
+
+def start_stub_ollama(first_token_ms=300, tokens=40, token_ms=20):
+    """Serve the stub on a free local port; returns its base URL"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), stub_ollama_handler(first_token_ms, tokens, token_ms))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-ollama", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+class StubCollection:
+    """Knowledge-base stand-in: MEDICAL_DOCS ranked by word overlap with the query"""
+
+    def __init__(self, docs, latency_ms=5):
+        self.docs = docs
+        self.latency_ms = latency_ms
+        self.words = [set(doc["text"].lower().split()) for doc in docs]
+
+    def count(self):
+        return len(self.docs)
+
+    def query(self, query_texts, n_results=3):
+        time.sleep(self.latency_ms / 1000)
+        results = []
+        for text in query_texts:
+            words = set(text.lower().split())
+            ranked = sorted(range(len(self.docs)), key=lambda i: -len(words & self.words[i]))
+            results.append([self.docs[i]["text"] for i in ranked[:n_results]])
+        return {"documents": results}
+
+def use_stub_backends(first_token_ms=300, tokens=40, token_ms=20, rag_latency_ms=5):
+    """Point this process's API at the stubs; call before main is imported"""
+    os.environ["OLLAMA_HOST"] = start_stub_ollama(first_token_ms, tokens, token_ms)
+    import rag_query
+    from medical_docs import MEDICAL_DOCS
+    rag_query._collection = StubCollection(MEDICAL_DOCS, rag_latency_ms)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--db", default=None, help="SQLite file (default: a new temporary file)")
+    parser.add_argument("--llm-first-token-ms", type=float, default=300)
+    parser.add_argument("--llm-tokens", type=int, default=40)
+    parser.add_argument("--llm-token-ms", type=float, default=20)
+    parser.add_argument("--rag-latency-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="cardiosense-bench-")
+    use_stub_backends(args.llm_first_token_ms, args.llm_tokens, args.llm_token_ms, args.rag_latency_ms)
+
+    import database
+    database.DB_PATH = os.path.abspath(args.db or os.path.join(workdir, "bench.db"))
+
+    # Report jobs and anything else written relative to the working directory stay out of the tree
+    os.chdir(workdir)
+    import uvicorn
+    from main import app
+    logging.getLogger("httpx").setLevel(logging.WARNING)  # one line per stub Ollama call otherwise
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { LineChart, Line, XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer } from 'recharts';
 import './App.css';
 
@@ -25,76 +25,135 @@ function App() {
   const [liveMode, setLiveMode] = useState(false);
   const [patientName, setPatientName] = useState('John Doe');
   const [patientAge, setPatientAge] = useState(45);
+  const explanationSource = useRef(null);
 
-  // Auto-refresh latest reading every 2 seconds in live mode
+  // In live mode, follow new readings pushed over the /stream server-sent events
   useEffect(() => {
     if (!liveMode) return;
     
-    const interval = setInterval(async () => {
+    // Last 20 readings, newest first
+    let recent = [];
+    let source = null;
+    let cancelled = false;
+    
+    const follow = async () => {
       try {
-        const response = await fetch(`${API_URL}/history`);
-        const data = await response.json();
-        
-        if (data.length > 0) {
-          const latest = data[0];
-          
-          // Update vitals with latest reading
-          setVitals({
-            heart_rate: latest.heart_rate,
-            blood_pressure_systolic: latest.blood_pressure_systolic,
-            blood_pressure_diastolic: latest.blood_pressure_diastolic,
-            oxygen_saturation: latest.oxygen_saturation,
-            temperature: latest.temperature,
-            p_wave_duration: 0.08 + (latest.risk_score * 0.01),
-            pr_interval: 0.16 + (latest.risk_score * 0.01),
-            qrs_duration: 0.09 + (latest.risk_score * 0.005),
-            qt_interval: 0.40 + (latest.risk_score * 0.01),
-            t_wave_amplitude: 0.3 - (latest.risk_score * 0.02),
-            st_segment_elevation: (latest.risk_score > 10 ? 0.15 : 0.0)
-          });
-          
-          // Update analysis
-          setAnalysis({
-            risk_score: latest.risk_score,
-            risk_level: latest.risk_level,
-            explanation: latest.explanation,
-            emergency_alert: latest.risk_level === 'CRITICAL' ? {
-              call_911: true,
-              reason: 'Critical cardiac event detected',
-              priority: 'IMMEDIATE'
-            } : null
-          });
-          
-          // Update history for charts
-          const historyData = data.slice(0, 20).reverse().map(r => ({
-            time: new Date(r.timestamp).toLocaleTimeString(),
-            hr: r.heart_rate,
-            bp: r.blood_pressure_systolic,
-            spo2: r.oxygen_saturation,
-            risk: r.risk_score,
-            st: 0,
-            t_wave: 0.3
-          }));
-          setHistory(historyData);
-        }
+        const response = await fetch(`${API_URL}/history?limit=20`);
+        recent = await response.json();
+        if (recent.length > 0) showReadings(recent);
       } catch (error) {
         console.error('Error fetching live data:', error);
       }
-    }, 2000);
+      if (cancelled) return;
+      
+      // Resume after the newest reading we already have
+      const query = recent.length > 0 ? `?last_id=${recent[0].id}` : '';
+      source = new EventSource(`${API_URL}/stream${query}`);
+      source.addEventListener('reading', (event) => {
+        recent = [JSON.parse(event.data), ...recent].slice(0, 20);
+        showReadings(recent);
+      });
+      source.addEventListener('explanation', (event) => {
+        const update = JSON.parse(event.data);
+        recent = recent.map(r => r.id === update.id ? {...r, explanation: update.explanation} : r);
+        showReadings(recent);
+      });
+      // Too many readings were missed to replay them: reload the latest ones
+      source.addEventListener('reset', async () => {
+        try {
+          const response = await fetch(`${API_URL}/history?limit=20`);
+          recent = await response.json();
+          if (recent.length > 0) showReadings(recent);
+        } catch (error) {
+          console.error('Error fetching live data:', error);
+        }
+      });
+      source.onerror = (error) => console.error('Live stream error:', error);
+    };
+    
+    follow();
     
-    return () => clearInterval(interval);
+    return () => {
+      cancelled = true;
+      if (source) source.close();
+    };
   }, [liveMode]);
 
+  const showReadings = (data) => {
+    const latest = data[0];
+    
+    // Update vitals with latest reading
+    setVitals({
+      heart_rate: latest.heart_rate,
+      blood_pressure_systolic: latest.blood_pressure_systolic,
+      blood_pressure_diastolic: latest.blood_pressure_diastolic,
+      oxygen_saturation: latest.oxygen_saturation,
+      temperature: latest.temperature,
+      p_wave_duration: 0.08 + (latest.risk_score * 0.01),
+      pr_interval: 0.16 + (latest.risk_score * 0.01),
+      qrs_duration: 0.09 + (latest.risk_score * 0.005),
+      qt_interval: 0.40 + (latest.risk_score * 0.01),
+      t_wave_amplitude: 0.3 - (latest.risk_score * 0.02),
+      st_segment_elevation: (latest.risk_score > 10 ? 0.15 : 0.0)
+    });
+    
+    // Update analysis
+    setAnalysis({
+      risk_score: latest.risk_score,
+      risk_level: latest.risk_level,
+      explanation: latest.explanation,
+      emergency_alert: latest.risk_level === 'CRITICAL' ? {
+        call_911: true,
+        reason: 'Critical cardiac event detected',
+        priority: 'IMMEDIATE'
+      } : null
+    });
+    
+    // Update history for charts
+    const historyData = data.slice(0, 20).reverse().map(r => ({
+      time: new Date(r.timestamp).toLocaleTimeString(),
+      hr: r.heart_rate,
+      bp: r.blood_pressure_systolic,
+      spo2: r.oxygen_saturation,
+      risk: r.risk_score,
+      st: 0,
+      t_wave: 0.3
+    }));
+    setHistory(historyData);
+  };
+
+  // Render the explanation token by token as the LLM generates it
+  const streamExplanation = (readingId) => {
+    if (explanationSource.current) explanationSource.current.close();
+    const source = new EventSource(`${API_URL}/explanations/${readingId}/stream`);
+    explanationSource.current = source;
+    source.addEventListener('token', (event) => {
+      const { text } = JSON.parse(event.data);
+      setAnalysis(prev => prev && prev.explanation_id === readingId
+        ? {...prev, explanation: (prev.explanation || '') + text}
+        : prev);
+    });
+    source.addEventListener('explanation', (event) => {
+      const { explanation } = JSON.parse(event.data);
+      setAnalysis(prev => prev && prev.explanation_id === readingId ? {...prev, explanation} : prev);
+      source.close();
+    });
+    source.onerror = (error) => console.error('Explanation stream error:', error);
+  };
+
+  useEffect(() => () => explanationSource.current && explanationSource.current.close(), []);
+
   const analyzeVitals = async () => {
     setLoading(true);
     try {
-      const response = await fetch(`${API_URL}/analyze`, {
+      const response = await fetch(`${API_URL}/analyze?async_explanation=true`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify(vitals)
       });
       const data = await response.json();
       setAnalysis(data);
+      if (data.explanation_status === 'pending') streamExplanation(data.explanation_id);
       
       setHistory(prev => [...prev.slice(-19), {
         time: new Date().toLocaleTimeString(),
@@ -288,7 +347,7 @@ function App() {
               </div>
             )}
             <div className="explanation">
-              {analysis.explanation.split('.').filter(s => s.trim()).map((sentence, i) => (
+              {(analysis.explanation || 'Generating explanation...').split('.').filter(s => s.trim()).map((sentence, i) => (
                 <div key={i} className="bullet-point">• {sentence.trim()}.</div>
               ))}
             </div>
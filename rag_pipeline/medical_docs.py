@@ -0,0 +1,43 @@
+# Medical knowledge base
+MEDICAL_DOCS = [
+    {
+        "id": "doc1",
+        "text": "Normal heart rate for adults ranges from 60-100 bpm. Tachycardia (>100 bpm) may indicate stress, fever, or cardiac issues. Bradycardia (<60 bpm) can be normal in athletes but may signal heart block.",
+        "metadata": {"category": "heart_rate"}
+    },
+    {
+        "id": "doc2",
+        "text": "Hypertension is defined as blood pressure ≥140/90 mmHg. Stage 2 hypertension (≥180/120) is a medical emergency requiring immediate attention. High BP increases risk of heart attack and stroke.",
+        "metadata": {"category": "blood_pressure"}
+    },
+    {
+        "id": "doc3",
+        "text": "Normal oxygen saturation is 95-100%. Levels below 90% indicate hypoxemia requiring urgent intervention. Low SpO2 can result from respiratory or cardiac conditions.",
+        "metadata": {"category": "oxygen"}
+    },
+    {
+        "id": "doc4",
+        "text": "Normal body temperature is 36.5-37.5°C. Fever (>38°C) may indicate infection or inflammation. Hypothermia (<36°C) can be life-threatening.",
+        "metadata": {"category": "temperature"}
+    },
+    {
+        "id": "doc5",
+        "text": "Cardiac risk factors include hypertension, tachycardia, hypoxemia, and abnormal temperature. Multiple abnormal vitals significantly increase cardiovascular event risk.",
+        "metadata": {"category": "cardiac_risk"}
+    },
+    {
+        "id": "doc6",
+        "text": "Critical vital signs require immediate medical attention: HR >120 or <50, BP >180/120, SpO2 <90%, or temperature >39°C or <35°C.",
+        "metadata": {"category": "critical_care"}
+    },
+    {
+        "id": "doc7",
+        "text": "ECG conduction intervals: normal PR is 0.12-0.20 s, QRS 0.06-0.10 s and QT 0.36-0.44 s. PR >0.20 s indicates first-degree AV block and PR <0.12 s suggests pre-excitation. QRS >0.12 s indicates bundle branch block. Long QT (>0.50 s) carries a risk of torsades de pointes and sudden death; short QT (<0.30 s) predisposes to arrhythmia. A P wave >0.12 s suggests atrial enlargement.",
+        "metadata": {"category": "ecg_conduction"}
+    },
+    {
+        "id": "doc8",
+        "text": "ST elevation >0.1 mV indicates ST-elevation myocardial infarction (STEMI), a heart attack requiring emergency reperfusion. ST depression or flattened/inverted T waves indicate myocardial ischemia. Peaked T waves (>0.6 mV) suggest hyperkalemia, which can cause fatal arrhythmias.",
+        "metadata": {"category": "ecg_ischemia"}
+    }
+]
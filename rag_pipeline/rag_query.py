@@ -1,30 +1,214 @@
-import chromadb
-from chromadb.utils import embedding_functions
+import threading
+import time
+from medical_docs import MEDICAL_DOCS
 
-client = chromadb.PersistentClient(path="./chroma_db")
-embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
-    model_name="all-MiniLM-L6-v2"
-)
+CHROMA_PATH = "./chroma_db"
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+# Seconds before a failed load is retried, in the background
+LOAD_RETRY_SECONDS = 60
 
-def query_medical_knowledge(vitals, risk_level):
+GENERIC_CONTEXT = "General cardiac monitoring guidelines apply."
+
+# chromadb and sentence-transformers take seconds to import and load on a Pi,
+# so the collection is loaded by the startup warm-up (or a breaker probe),
+# never while a request waits
+_client = None
+_embedding_function = None
+_collection = None
+_load_lock = threading.Lock()  # held for the whole load
+_state_lock = threading.Lock()
+_loading = False
+_failed_at = None  # time.monotonic() of the last failed load
+
+class KnowledgeBaseUnavailable(RuntimeError):
+    """Raised by get_collection while the collection is loading or failed to load"""
+
+def load_collection():
+    """Open the collection, importing chromadb and loading the embedding model.
+
+    Slow; concurrent callers wait for the one load in progress.
+    """
+    global _client, _embedding_function, _collection, _loading, _failed_at
+    with _load_lock:
+        if _collection is not None:
+            return _collection
+        with _state_lock:
+            _loading = True
+        try:
+            if _client is None:
+                import chromadb
+                _client = chromadb.PersistentClient(path=CHROMA_PATH)
+            if _embedding_function is None:
+                from chromadb.utils import embedding_functions
+                _embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
+                    model_name=EMBEDDING_MODEL
+                )
+            _collection = _client.get_collection(
+                name="medical_knowledge",
+                embedding_function=_embedding_function
+            )
+        except Exception:
+            with _state_lock:
+                _failed_at = time.monotonic()
+            raise
+        finally:
+            with _state_lock:
+                _loading = False
+        return _collection
+
+def get_collection():
+    """The loaded collection; raises KnowledgeBaseUnavailable at once if it is not loaded"""
+    collection = _collection
+    if collection is None:
+        with _state_lock:
+            state = "loading" if _loading else "failed to load" if _failed_at is not None else "not loaded"
+        raise KnowledgeBaseUnavailable(f"knowledge base {state}")
+    return collection
+
+def is_loaded():
+    return _collection is not None
+
+def _retry_load():
+    """Start another background load if the last one failed long enough ago"""
+    global _failed_at
+    with _state_lock:
+        if _loading or _failed_at is None or time.monotonic() - _failed_at < LOAD_RETRY_SECONDS:
+            return
+        _failed_at = time.monotonic()  # at most one retry per interval
+    def load():
+        try:
+            load_collection()
+        except Exception:
+            pass
+    threading.Thread(target=load, name="knowledge-base-load", daemon=True).start()
+
+# Knowledge-base categories for each rule ID reported by risk_engine.assess_risk
+RULE_CATEGORIES = {
+    "bradycardia": ["heart_rate"],
+    "tachycardia": ["heart_rate"],
+    "severe_tachycardia": ["heart_rate", "critical_care"],
+    "extreme_tachycardia": ["heart_rate", "critical_care"],
+    "hypertension": ["blood_pressure"],
+    "stage2_hypertension": ["blood_pressure", "critical_care"],
+    "low_oxygen": ["oxygen"],
+    "hypoxemia": ["oxygen", "critical_care"],
+    "severe_hypoxemia": ["oxygen", "critical_care"],
+    "fever": ["temperature"],
+    "hypothermia": ["temperature"],
+    "prolonged_p_wave": ["ecg_conduction"],
+    "short_p_wave": ["ecg_conduction"],
+    "first_degree_av_block": ["ecg_conduction"],
+    "pre_excitation": ["ecg_conduction"],
+    "bundle_branch_block": ["ecg_conduction"],
+    "long_qt": ["ecg_conduction", "critical_care"],
+    "short_qt": ["ecg_conduction"],
+    "flattened_t_wave": ["ecg_ischemia"],
+    "inverted_t_wave": ["ecg_ischemia"],
+    "peaked_t_wave": ["ecg_ischemia"],
+    "stemi": ["ecg_ischemia", "critical_care"],
+    "st_depression": ["ecg_ischemia"],
+}
+
+# Plain-language finding for each rule ID, used in rule-based explanations
+RULE_FINDINGS = {
+    "bradycardia": "bradycardia (heart rate below 60 bpm)",
+    "tachycardia": "tachycardia (heart rate above 100 bpm)",
+    "severe_tachycardia": "severe tachycardia (heart rate above 120 bpm)",
+    "extreme_tachycardia": "extreme tachycardia (heart rate above 150 bpm)",
+    "hypertension": "hypertension (blood pressure above 140/90 mmHg)",
+    "stage2_hypertension": "stage 2 hypertension (blood pressure above 180/120 mmHg)",
+    "low_oxygen": "low oxygen saturation (below 95%)",
+    "hypoxemia": "hypoxemia (oxygen saturation below 90%)",
+    "severe_hypoxemia": "severe hypoxemia (oxygen saturation below 85%)",
+    "fever": "fever (temperature above 38°C)",
+    "hypothermia": "hypothermia (temperature below 36°C)",
+    "prolonged_p_wave": "prolonged P wave (possible atrial enlargement)",
+    "short_p_wave": "short P wave",
+    "first_degree_av_block": "first-degree AV block (PR interval above 0.20 s)",
+    "pre_excitation": "possible pre-excitation (PR interval below 0.12 s)",
+    "bundle_branch_block": "bundle branch block (QRS above 0.12 s)",
+    "long_qt": "long QT interval",
+    "short_qt": "short QT interval",
+    "flattened_t_wave": "flattened T wave",
+    "inverted_t_wave": "inverted T wave",
+    "peaked_t_wave": "peaked T wave",
+    "stemi": "ST elevation consistent with STEMI",
+    "st_depression": "ST depression",
+}
+
+# Most urgent context first when several rules fire
+CATEGORY_PRIORITY = [
+    "critical_care",
+    "ecg_ischemia",
+    "ecg_conduction",
+    "blood_pressure",
+    "oxygen",
+    "heart_rate",
+    "temperature",
+    "cardiac_risk",
+]
+
+MAX_CONTEXT_DOCS = 3
+
+# Precomputed rule ID -> knowledge-base document IDs
+DOCS_BY_ID = {doc["id"]: doc for doc in MEDICAL_DOCS}
+RULE_INDEX = {
+    rule: [doc["id"] for doc in MEDICAL_DOCS if doc["metadata"]["category"] in categories]
+    for rule, categories in RULE_CATEGORIES.items()
+}
+
+def _doc_priority(doc_id):
+    category = DOCS_BY_ID[doc_id]["metadata"]["category"]
+    return CATEGORY_PRIORITY.index(category) if category in CATEGORY_PRIORITY else len(CATEGORY_PRIORITY)
+
+def rule_context(rules):
+    """Look up context for fired rules without embedding; None if no rule is indexed"""
+    doc_ids = {doc_id for rule in rules for doc_id in RULE_INDEX.get(rule, [])}
+    if not doc_ids:
+        return None
+    if len(rules) > 1:
+        # Several abnormal findings: include the combined cardiac risk guidance
+        doc_ids.update(doc["id"] for doc in MEDICAL_DOCS if doc["metadata"]["category"] == "cardiac_risk")
+    ranked = sorted(doc_ids, key=lambda doc_id: (_doc_priority(doc_id), doc_id))
+    return "\n".join(DOCS_BY_ID[doc_id]["text"] for doc_id in ranked[:MAX_CONTEXT_DOCS])
+
+def search_knowledge(vitals, risk_level, n_results=3):
+    """Embedding search of the knowledge base; raises if Chroma is unavailable"""
+    collection = get_collection()
+    
+    # Build query based on vitals
+    query_text = f"cardiac risk {risk_level} heart rate {vitals.heart_rate} blood pressure {vitals.blood_pressure_systolic}/{vitals.blood_pressure_diastolic} oxygen {vitals.oxygen_saturation}"
+    
+    # Query the collection
+    results = collection.query(
+        query_texts=[query_text],
+        n_results=n_results
+    )
+    
+    # Combine retrieved documents
+    return "\n".join(results['documents'][0])
+
+def query_medical_knowledge(vitals, risk_level, rules=None, breaker=None):
+    """Context for the prompt: the rule index, else an embedding search.
+
+    With a circuit breaker the search goes through breaker.call, so an
+    unavailable Chroma is skipped at once instead of failing on every call.
+    Until the collection has loaded, the generic context is used.
+    """
+    # Known conditions come straight from the rule index
+    if rules:
+        context = rule_context(rules)
+        if context is not None:
+            return context
+    
+    if not is_loaded():
+        _retry_load()
+        return GENERIC_CONTEXT
+    
     try:
-        collection = client.get_collection(
-            name="medical_knowledge",
-            embedding_function=embedding_function
-        )
-        
-        # Build query based on vitals
-        query_text = f"cardiac risk {risk_level} heart rate {vitals.heart_rate} blood pressure {vitals.blood_pressure_systolic}/{vitals.blood_pressure_diastolic} oxygen {vitals.oxygen_saturation}"
-        
-        # Query the collection
-        results = collection.query(
-            query_texts=[query_text],
-            n_results=3
-        )
-        
-        # Combine retrieved documents
-        context = "\n".join(results['documents'][0])
-        return context
+        if breaker is not None:
+            return breaker.call(search_knowledge, vitals, risk_level)
+        return search_knowledge(vitals, risk_level)
     
-    except Exception as e:
-        return "General cardiac monitoring guidelines apply."
+    except Exception:
+        return GENERIC_CONTEXT
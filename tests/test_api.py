@@ -1,8 +1,13 @@
 import pytest
+import json
+import time
+import threading
+from types import SimpleNamespace
 from fastapi.testclient import TestClient
 import sys
 sys.path.append('../backend')
 from main import app
+from ecg_features import encode_int16, synthetic_ecg
 
 client = TestClient(app)
 
@@ -38,6 +43,8 @@ def test_analyze_high_risk():
     assert response.status_code == 200
     data = response.json()
     assert data["risk_level"] in ["HIGH", "CRITICAL"]
+    if data["risk_level"] == "CRITICAL":
+        assert data["emergency_alert"]["reading_id"] == data["explanation_id"]
 
 def test_analyze_moderate_risk():
     vitals = {
@@ -62,3 +69,592 @@ def test_invalid_vitals():
     }
     response = client.post("/analyze", json=vitals)
     assert response.status_code == 422
+
+def test_analyze_batch():
+    readings = [
+        {
+            "heart_rate": 75,
+            "blood_pressure_systolic": 120,
+            "blood_pressure_diastolic": 80,
+            "oxygen_saturation": 98,
+            "temperature": 37.0
+        },
+        {
+            "heart_rate": 160,
+            "blood_pressure_systolic": 190,
+            "blood_pressure_diastolic": 125,
+            "oxygen_saturation": 84,
+            "temperature": 38.5,
+            "st_segment_elevation": 0.2
+        }
+    ]
+    response = client.post("/analyze/batch", json=readings)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["count"] == 2
+    assert [r["risk_level"] for r in data["results"]] == ["LOW", "CRITICAL"]
+    assert data["emergency_alert"]["readings"] == [1]
+    assert data["emergency_alert"]["call_911"]
+
+def test_batch_alert_keeps_each_patient():
+    critical = {
+        "heart_rate": 160,
+        "blood_pressure_systolic": 190,
+        "blood_pressure_diastolic": 125,
+        "oxygen_saturation": 84,
+        "temperature": 38.5
+    }
+    normal = dict(critical, heart_rate=75, blood_pressure_systolic=120, blood_pressure_diastolic=80,
+                  oxygen_saturation=98, temperature=37.0)
+    readings = [dict(critical, patient_id="bed-a"), dict(normal, patient_id="bed-b"), dict(critical, patient_id="bed-c")]
+    data = client.post("/analyze/batch", json=readings).json()
+    alert = data["emergency_alert"]
+    assert alert["readings"] == [0, 2]
+    assert alert["patient_ids"] == ["bed-a", "bed-c"]
+    assert len(alert["reading_ids"]) == 2
+    assert "patient_id" not in alert
+
+def test_analyze_async_explanation():
+    vitals = {
+        "heart_rate": 105,
+        "blood_pressure_systolic": 145,
+        "blood_pressure_diastolic": 92,
+        "oxygen_saturation": 94,
+        "temperature": 37.2
+    }
+    response = client.post("/analyze", params={"async_explanation": True}, json=vitals)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["risk_level"] in ["MODERATE", "HIGH"]
+    assert data["explanation_status"] == "pending"
+    
+    explanation_id = data["explanation_id"]
+    for _ in range(100):
+        result = client.get(f"/explanations/{explanation_id}").json()
+        if result["status"] == "ready":
+            break
+        time.sleep(0.1)
+    assert result["status"] == "ready"
+    assert result["explanation"]
+
+def test_analyze_raw_ecg():
+    strip = encode_int16(synthetic_ecg(heart_rate=80, qrs_duration=0.14))
+    params = {
+        "blood_pressure_systolic": 120,
+        "blood_pressure_diastolic": 80,
+        "oxygen_saturation": 98,
+        "temperature": 37.0
+    }
+    response = client.post(
+        "/analyze/ecg",
+        params=params,
+        content=strip,
+        headers={"Content-Type": "application/octet-stream", "X-Sample-Rate": "500"}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert abs(data["vitals"]["heart_rate"] - 80) <= 1
+    assert abs(data["vitals"]["qrs_duration"] - 0.14) <= 0.01
+    assert "bundle_branch_block" in data["rules_fired"]
+    assert data["ecg_features"]["beats_detected"] >= 12
+    
+    flat = client.post("/analyze/ecg", params=params, content=bytes(10000))
+    assert flat.status_code == 422
+
+def test_explanation_not_found():
+    response = client.get("/explanations/999999999")
+    assert response.status_code == 404
+
+def test_ready():
+    with TestClient(app) as startup_client:
+        response = startup_client.get("/ready")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["risk_scoring"] is True
+        assert data["components"]["database"]["status"] == "ready"
+        assert "explanations" in data
+
+def test_history_pagination():
+    ids = []
+    for heart_rate in [70, 72, 74]:
+        vitals = {
+            "heart_rate": heart_rate,
+            "blood_pressure_systolic": 120,
+            "blood_pressure_diastolic": 80,
+            "oxygen_saturation": 98,
+            "temperature": 37.0
+        }
+        ids.append(client.post("/analyze", json=vitals).json()["explanation_id"])
+    
+    page = client.get("/history", params={"limit": 2}).json()
+    assert [r["id"] for r in page] == [ids[2], ids[1]]
+    
+    older = client.get("/history", params={"limit": 2, "before_id": page[-1]["id"]}).json()
+    assert older[0]["id"] == ids[0]
+    
+    delta = client.get("/history", params={"since_id": ids[0], "include_explanation": False}).json()
+    assert [r["id"] for r in delta] == [ids[1], ids[2]]
+    assert "explanation" not in delta[0]
+    
+    low = client.get("/history", params={"risk_level": "LOW", "limit": 5}).json()
+    assert all(r["risk_level"] == "LOW" for r in low)
+
+def test_trends_and_pdf_report():
+    vitals = {
+        "heart_rate": 88,
+        "blood_pressure_systolic": 125,
+        "blood_pressure_diastolic": 82,
+        "oxygen_saturation": 97,
+        "temperature": 37.1
+    }
+    client.post("/analyze", json=vitals)
+    
+    response = client.get("/trends", params={"resolution": "minute", "limit": 10})
+    assert response.status_code == 200
+    buckets = response.json()
+    assert buckets and buckets[-1]["count"] >= 1
+    assert set(buckets[-1]["heart_rate"]) == {"min", "max", "mean"}
+    
+    assert client.get("/trends", params={"resolution": "week"}).status_code == 422
+    
+    response = client.get("/report/pdf")
+    assert response.status_code == 200
+    assert response.content.startswith(b"%PDF")
+
+def test_patient_scoped_endpoints():
+    vitals = {
+        "patient_id": "ward-a-bed-7",
+        "heart_rate": 95,
+        "blood_pressure_systolic": 135,
+        "blood_pressure_diastolic": 85,
+        "oxygen_saturation": 96,
+        "temperature": 37.4
+    }
+    client.post("/analyze", json=vitals)
+    client.post("/analyze/batch", json=[vitals, dict(vitals, heart_rate=99)])
+    
+    response = client.put("/patients/ward-a-bed-7", json={"name": "Grace Hopper", "age": 79})
+    assert response.json()["total_readings"] == 3
+    
+    history = client.get("/history", params={"patient_id": "ward-a-bed-7"}).json()
+    assert len(history) == 3 and all(r["patient_id"] == "ward-a-bed-7" for r in history)
+    
+    report = client.get("/report", params={"patient_id": "ward-a-bed-7"}).json()
+    assert report["total_readings"] == 3
+    assert client.get("/report").json()["total_readings"] >= 3
+    
+    response = client.get("/report/pdf", params={"patient_id": "ward-a-bed-7"})
+    assert response.status_code == 200
+    assert client.get("/report/pdf", params={"patient_id": "nobody"}).status_code == 404
+    
+    client.delete("/clear", params={"patient_id": "ward-a-bed-7"})
+    assert client.get("/history", params={"patient_id": "ward-a-bed-7"}).json() == []
+    assert client.get("/patients/ward-a-bed-7").json()["name"] == "Grace Hopper"
+
+def test_pdf_report_etag_and_cache():
+    vitals = {
+        "patient_id": "pdf-cache",
+        "heart_rate": 82,
+        "blood_pressure_systolic": 128,
+        "blood_pressure_diastolic": 84,
+        "oxygen_saturation": 97,
+        "temperature": 37.0
+    }
+    client.post("/analyze", json=vitals)
+    
+    first = client.get("/report/pdf", params={"patient_id": "pdf-cache"})
+    assert first.status_code == 200
+    assert first.content.startswith(b"%PDF")
+    etag = first.headers["etag"]
+    
+    not_modified = client.get("/report/pdf", params={"patient_id": "pdf-cache"}, headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    for header, status in ((f'"other", W/{etag}', 304), ("*", 304), (f'"x{etag[1:]}', 200), (etag[:-2] + '"', 200)):
+        response = client.get("/report/pdf", params={"patient_id": "pdf-cache"}, headers={"If-None-Match": header})
+        assert response.status_code == status, header
+    
+    hits = client.get("/cache/stats").json()["pdf_reports"]["hits"]
+    again = client.get("/report/pdf", params={"patient_id": "pdf-cache"})
+    assert again.content == first.content
+    assert client.get("/cache/stats").json()["pdf_reports"]["hits"] == hits + 1
+    
+    # New data changes the report and therefore the ETag
+    client.post("/analyze", json=dict(vitals, heart_rate=120))
+    changed = client.get("/report/pdf", params={"patient_id": "pdf-cache"}, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+
+def test_full_report_job(tmp_path, monkeypatch):
+    import report_jobs
+    monkeypatch.setattr(report_jobs, "REPORTS_DIR", str(tmp_path))
+    readings = [
+        {
+            "patient_id": "full-report",
+            "heart_rate": 70 + i % 30,
+            "blood_pressure_systolic": 120,
+            "blood_pressure_diastolic": 80,
+            "oxygen_saturation": 97,
+            "temperature": 37.0
+        }
+        for i in range(120)
+    ]
+    readings[-1].update(heart_rate=160, blood_pressure_systolic=200, oxygen_saturation=82)
+    assert client.post("/analyze/batch", json=readings).status_code == 200
+    
+    created = client.post("/reports", json={"patient_id": "full-report"})
+    assert created.status_code == 202
+    job = created.json()
+    assert job["status"] in ("queued", "running")
+    
+    deadline = time.time() + 60
+    while job["status"] in ("queued", "running") and time.time() < deadline:
+        time.sleep(0.2)
+        job = client.get(job["status_url"]).json()
+    assert job["status"] == "done", job
+    
+    pdf = client.get(job["download_url"])
+    assert pdf.status_code == 200
+    assert pdf.content.startswith(b"%PDF")
+    assert pdf.content.count(b"/Type /Page\n") >= 4
+    assert len(pdf.content) == job["size_bytes"]
+
+def test_report_job_errors():
+    assert client.get("/reports/unknown").status_code == 404
+    assert client.get("/reports/unknown/download").status_code == 404
+    assert client.post("/reports", json={"patient_id": "no-such-patient"}).status_code == 404
+
+def read_sse(response):
+    events = []
+    event = {}
+    for line in response.iter_lines():
+        if not line:
+            if event:
+                events.append(event)
+            event = {}
+        elif not line.startswith(":"):
+            field, _, value = line.partition(": ")
+            event[field] = json.loads(value) if field == "data" else value
+    return events
+
+def test_explanation_token_stream(monkeypatch):
+    import llm_service
+    tokens = ["Heart rate ", "is elevated. ", "Monitor ", "closely."]
+    def fake_generate(prompt):
+        for token in tokens:
+            time.sleep(0.05)
+            yield token
+    monkeypatch.setattr(llm_service.scheduler, "generate", fake_generate)
+    llm_service.ollama_breaker.reset()
+    
+    vitals = {
+        "patient_id": "token-stream",
+        "heart_rate": 112,
+        "blood_pressure_systolic": 150,
+        "blood_pressure_diastolic": 95,
+        "oxygen_saturation": 95,
+        "temperature": 37.1
+    }
+    reading_id = client.post("/analyze", params={"async_explanation": True}, json=vitals).json()["explanation_id"]
+    
+    with client.stream("GET", f"/explanations/{reading_id}/stream") as response:
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = read_sse(response)
+    assert events[-1]["event"] == "explanation"
+    text = "".join(event["data"]["text"] for event in events if event["event"] == "token")
+    assert text == "".join(tokens) == events[-1]["data"]["explanation"]
+    
+    # Persisted, and a reconnect resumes from its character offset
+    assert client.get(f"/explanations/{reading_id}").json()["explanation"] == text
+    with client.stream("GET", f"/explanations/{reading_id}/stream", headers={"Last-Event-ID": "11"}) as response:
+        events = read_sse(response)
+    assert [event["event"] for event in events] == ["token", "explanation"]
+    assert events[0]["data"]["text"] == text[11:]
+    
+    assert client.get("/explanations/999999999/stream").status_code == 404
+
+def test_failed_generation_stores_rule_based_explanation(monkeypatch):
+    import llm_service
+    def failing_generate(prompt):
+        yield "Heart rate is "
+        raise ConnectionError("ollama went away")
+    monkeypatch.setattr(llm_service.scheduler, "generate", failing_generate)
+    llm_service.ollama_breaker.reset()
+    
+    vitals = {
+        "patient_id": "token-stream",
+        "heart_rate": 117,
+        "blood_pressure_systolic": 155,
+        "blood_pressure_diastolic": 97,
+        "oxygen_saturation": 94,
+        "temperature": 37.6
+    }
+    data = client.post("/analyze", params={"async_explanation": True}, json=vitals).json()
+    with client.stream("GET", f"/explanations/{data['explanation_id']}/stream") as response:
+        events = read_sse(response)
+    
+    # The partial text was streamed, but the rule-based explanation is what is kept
+    expected = llm_service.rule_based_explanation(
+        SimpleNamespace(**vitals), data["risk_score"], data["risk_level"], data["rules_fired"]
+    )
+    assert events[-1]["event"] == "explanation"
+    assert events[-1]["data"]["explanation"] == expected
+    assert client.get(f"/explanations/{data['explanation_id']}").json()["explanation"] == expected
+    llm_service.ollama_breaker.reset()
+
+def test_slow_llm_falls_back_to_rule_based_explanation(monkeypatch):
+    import llm_service
+    def slow_generate(prompt):
+        time.sleep(0.5)
+        yield "LLM explanation."
+    monkeypatch.setattr(llm_service.scheduler, "generate", slow_generate)
+    llm_service.ollama_breaker.reset()
+    
+    vitals = {
+        "patient_id": "budget",
+        "heart_rate": 131,
+        "blood_pressure_systolic": 150,
+        "blood_pressure_diastolic": 85,
+        "oxygen_saturation": 96,
+        "temperature": 37.3
+    }
+    started = time.monotonic()
+    data = client.post("/analyze", params={"explanation_budget": 0.1}, json=vitals).json()
+    assert time.monotonic() - started < 0.45
+    assert data["explanation_status"] == "fallback"
+    assert "Findings: tachycardia (heart rate above 100 bpm), severe tachycardia" in data["explanation"]
+    assert "hypertension" in data["explanation"]
+    
+    # Deterministic: the same reading gets the same rule-based text
+    assert llm_service.rule_based_explanation(
+        SimpleNamespace(**vitals), data["risk_score"], data["risk_level"], data["rules_fired"]
+    ) == data["explanation"]
+    
+    # The LLM text replaces it once generated
+    for _ in range(50):
+        result = client.get(f"/explanations/{data['explanation_id']}").json()
+        if result["explanation"] == "LLM explanation.":
+            break
+        time.sleep(0.05)
+    assert result["explanation"] == "LLM explanation."
+
+def test_slow_rag_lookup_counts_against_budget(monkeypatch):
+    import llm_service
+    query = llm_service.query_medical_knowledge
+    def slow_query(*args, **kwargs):
+        time.sleep(1.0)
+        return query(*args, **kwargs)
+    monkeypatch.setattr(llm_service, "query_medical_knowledge", slow_query)
+    monkeypatch.setattr(llm_service.scheduler, "generate", lambda prompt: iter(["Late ", "answer."]))
+    llm_service.ollama_breaker.reset()
+    
+    vitals = {
+        "patient_id": "budget",
+        "heart_rate": 127,
+        "blood_pressure_systolic": 161,
+        "blood_pressure_diastolic": 99,
+        "oxygen_saturation": 93,
+        "temperature": 37.9
+    }
+    started = time.monotonic()
+    data = client.post("/analyze", params={"explanation_budget": 0.1}, json=vitals).json()
+    assert time.monotonic() - started < 0.9
+    assert data["explanation_status"] == "fallback"
+    assert data["explanation"].startswith("Risk level:")
+    
+    for _ in range(100):
+        result = client.get(f"/explanations/{data['explanation_id']}").json()
+        if result["explanation"] == "Late answer.":
+            break
+        time.sleep(0.05)
+    assert result["explanation"] == "Late answer."
+
+def test_saturated_llm_queue_sheds_non_critical_explanations(monkeypatch):
+    import llm_service
+    release = threading.Event()
+    calls = []
+    def gated_generate(prompt):
+        calls.append(prompt)
+        release.wait(timeout=5)
+        yield "Late answer."
+    monkeypatch.setattr(llm_service.scheduler, "generate", gated_generate)
+    monkeypatch.setattr(llm_service, "LLM_SHED_BACKLOG", 1)
+    llm_service.ollama_breaker.reset()
+    # Occupy every Ollama slot so new generations queue
+    held = [llm_service.scheduler.submit(f"hold {i}", "LOW") for i in range(llm_service.LLM_CONCURRENCY)]
+    while len(calls) < len(held):
+        time.sleep(0.01)
+    cancelled = llm_service.scheduler.stats()["cancelled"]
+    
+    vitals = {
+        "patient_id": "budget",
+        "heart_rate": 112,
+        "blood_pressure_systolic": 147,
+        "blood_pressure_diastolic": 91,
+        "oxygen_saturation": 95,
+        "temperature": 37.6
+    }
+    # Past the budget with a backlog: the queued generation is cancelled, not followed
+    data = client.post("/analyze", params={"explanation_budget": 0.1}, json=vitals).json()
+    assert data["risk_level"] != "CRITICAL"
+    assert data["explanation_status"] == "ready"
+    assert data["explanation"].startswith("Risk level:")
+    for _ in range(100):
+        if llm_service.scheduler.stats()["cancelled"] > cancelled:
+            break
+        time.sleep(0.05)
+    assert llm_service.scheduler.stats()["cancelled"] == cancelled + 1
+    
+    # Already saturated: answered without queueing anything
+    submitted = llm_service.scheduler.stats()["submitted"]
+    monkeypatch.setattr(llm_service, "LLM_SHED_BACKLOG", 0)
+    started = time.monotonic()
+    data = client.post("/analyze", json={**vitals, "heart_rate": 113}).json()
+    assert time.monotonic() - started < 1.0
+    assert data["explanation"].startswith("Risk level:")
+    assert llm_service.scheduler.stats()["submitted"] == submitted
+    
+    release.set()
+    for generation in held:
+        generation.result(timeout=5)
+    assert len(calls) == len(held)
+
+def test_llm_within_budget_is_returned_directly(monkeypatch):
+    import llm_service
+    monkeypatch.setattr(llm_service.scheduler, "generate", lambda prompt: iter(["Fast ", "answer."]))
+    llm_service.ollama_breaker.reset()
+    vitals = {
+        "patient_id": "budget",
+        "heart_rate": 58,
+        "blood_pressure_systolic": 118,
+        "blood_pressure_diastolic": 76,
+        "oxygen_saturation": 99,
+        "temperature": 36.8
+    }
+    data = client.post("/analyze", json=vitals).json()
+    assert data["explanation_status"] == "ready"
+    assert data["explanation"] == "Fast answer."
+
+def test_open_breaker_skips_ollama(monkeypatch):
+    import llm_service
+    calls = []
+    def generate(prompt):
+        calls.append(prompt)
+        raise ConnectionError("ollama down")
+        yield
+    monkeypatch.setattr(llm_service.scheduler, "generate", generate)
+    llm_service.ollama_breaker.reset()
+    
+    vitals = {
+        "patient_id": "breaker",
+        "heart_rate": 101,
+        "blood_pressure_systolic": 142,
+        "blood_pressure_diastolic": 88,
+        "oxygen_saturation": 97,
+        "temperature": 36.9
+    }
+    for i in range(llm_service.ollama_breaker.min_calls):
+        llm_service.ollama_breaker.record(0.01, ConnectionError("ollama down"))
+    assert client.get("/status/breakers").json()["ollama"]["state"] == "open"
+    
+    data = client.post("/analyze", json=vitals).json()
+    assert data["explanation_status"] == "ready"
+    assert data["explanation"].startswith("Risk level:")
+    assert calls == []
+    status = client.get("/status/breakers").json()
+    assert status["ollama"]["rejected"] >= 1
+    assert status["chromadb"]["state"] == "closed"
+    llm_service.ollama_breaker.reset()
+
+def test_metrics_and_server_timing(monkeypatch):
+    import llm_service
+    monkeypatch.setattr(llm_service.scheduler, "generate", lambda prompt: iter(["Timed ", "answer."]))
+    llm_service.ollama_breaker.reset()
+    vitals = {
+        "patient_id": "metrics",
+        "heart_rate": 112,
+        "blood_pressure_systolic": 151,
+        "blood_pressure_diastolic": 93,
+        "oxygen_saturation": 95,
+        "temperature": 37.4
+    }
+    response = client.post("/analyze", json=vitals)
+    assert response.status_code == 200
+    timing = response.headers["server-timing"]
+    for stage in ("risk_scoring", "rag_query", "llm_wait", "save_reading", "total"):
+        assert f"{stage};dur=" in timing
+    
+    assert "report_query;dur=" in client.get("/report", params={"patient_id": "metrics"}).headers["server-timing"]
+    
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert 'cardiosense_stage_duration_seconds_count{stage="risk_scoring"}' in text
+    assert 'cardiosense_stage_duration_seconds_bucket{stage="save_reading",le="+Inf"}' in text
+    assert 'cardiosense_http_request_duration_seconds_count{method="POST",route="/analyze",status="200"}' in text
+    assert 'cardiosense_readings_total{risk_level=' in text
+    assert 'cardiosense_circuit_breaker_state{dependency="ollama"} 0' in text
+
+def test_stream_backfill_resets_after_long_gap(monkeypatch):
+    import main
+    vitals = {
+        "patient_id": "backfill",
+        "heart_rate": 75,
+        "blood_pressure_systolic": 120,
+        "blood_pressure_diastolic": 80,
+        "oxygen_saturation": 98,
+        "temperature": 37.0
+    }
+    results, _ = main.ingest_readings([main.VitalSigns(**vitals)] * 3, explain=False)
+    ids = [result["reading_id"] for result in results]
+    assert [e["id"] for e in main.stream_backfill(ids[0] - 1, "backfill")] == ids
+    
+    monkeypatch.setattr(main, "STREAM_BACKFILL_LIMIT", 2)
+    events = main.stream_backfill(ids[0] - 1, "backfill")
+    assert [(e["event"], e["id"]) for e in events] == [("reset", ids[-1])]
+    assert events[0]["data"]["last_id"] == ids[-1]
+
+def test_archive_endpoints():
+    assert client.post("/archive").status_code == 400
+    result = client.post("/archive", params={"older_than_days": 3650}).json()
+    assert result["archived"] == 0
+    assert result["vacuum"]["free_pages_after"] >= 0
+    status = client.get("/archive").json()
+    assert status["retention"]["retention_days"] is None
+    assert status["retention"]["last_run"]["cutoff"] == result["cutoff"]
+    assert status["database_bytes"] > 0
+
+def test_export_streams_filtered_history(monkeypatch):
+    import csv
+    import io
+    import export
+    monkeypatch.setattr(export, "EXPORT_CHUNK_SIZE", 3)
+    readings = [
+        {"patient_id": "export", "heart_rate": 70 + i * 15, "blood_pressure_systolic": 120 + i * 20,
+         "blood_pressure_diastolic": 80 + i * 10, "oxygen_saturation": 98 - i * 3, "temperature": 37.0}
+        for i in range(5)
+    ]
+    client.post("/analyze/batch", json=readings)
+    history = list(reversed(client.get("/history", params={"patient_id": "export"}).json()))
+    
+    response = client.get("/export", params={"format": "ndjson", "patient_id": "export"})
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert "attachment" in response.headers["content-disposition"]
+    assert [json.loads(line) for line in response.text.splitlines()] == history
+    
+    response = client.get("/export", params={"patient_id": "export", "include_explanation": False})
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [int(row["id"]) for row in rows] == [reading["id"] for reading in history]
+    assert "explanation" not in rows[0] and rows[0]["patient_id"] == "export"
+    
+    critical = client.get("/export", params={"patient_id": "export", "risk_level": "CRITICAL", "format": "ndjson"}).text
+    assert all(json.loads(line)["risk_level"] == "CRITICAL" for line in critical.splitlines())
+    assert client.get("/export", params={"patient_id": "nobody"}).text.strip() == ",".join(export.database.READING_COLUMNS)
+    
+    response = client.get("/export", params={"format": "arrow", "patient_id": "export"})
+    if not export.arrow_available():
+        assert response.status_code == 501
+        return
+    import pyarrow
+    table = pyarrow.ipc.open_stream(response.content).read_all()
+    assert table.to_pylist() == history
@@ -0,0 +1,89 @@
+import threading
+import time
+import pytest
+import sys
+sys.path.append('../backend')
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+
+def failing():
+    raise ConnectionError("refused")
+
+def test_opens_at_failure_rate_and_rejects_immediately():
+    breaker = CircuitBreaker("dep", probe=lambda: None, failure_rate=0.5, window=4, min_calls=4, open_seconds=60)
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.call(lambda: "ok") == "ok"
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            breaker.call(failing)
+    assert breaker.status()["state"] == "open"
+    
+    called = []
+    with pytest.raises(CircuitOpenError):
+        breaker.call(called.append, 1)
+    assert called == []
+    assert breaker.status()["rejected"] == 1
+    breaker.reset()
+
+def test_slow_calls_count_as_failures():
+    breaker = CircuitBreaker("dep", probe=lambda: None, min_calls=2, slow_call_seconds=0.01, open_seconds=60)
+    breaker.call(time.sleep, 0.02)
+    breaker.call(time.sleep, 0.02)
+    assert breaker.status()["state"] == "open"
+    assert "took" in breaker.status()["last_error"]
+    breaker.reset()
+
+def test_call_timeout_bounds_the_wait():
+    breaker = CircuitBreaker("dep", probe=lambda: None, failure_rate=0.6, min_calls=2, call_timeout=0.05, open_seconds=60)
+    release = threading.Event()
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        breaker.call(release.wait, 5)
+    assert time.monotonic() - started < 1
+    assert "timed out" in breaker.status()["last_error"]
+    
+    assert breaker.call(lambda: "ok") == "ok"
+    with pytest.raises(TimeoutError):
+        breaker.call(release.wait, 5)
+    assert breaker.status()["state"] == "open"
+    release.set()
+    breaker.reset()
+
+def test_background_probe_closes_breaker():
+    healthy = threading.Event()
+    def probe():
+        if not healthy.is_set():
+            raise ConnectionError("still down")
+    breaker = CircuitBreaker("dep", probe=probe, min_calls=1, open_seconds=0.05)
+    with pytest.raises(ConnectionError):
+        breaker.call(failing)
+    
+    # A failed probe keeps it open; requests never act as the trial call
+    deadline = time.monotonic() + 2
+    while breaker.status()["probes"] < 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert breaker.status()["state"] in ("open", "half_open")
+    assert breaker.status()["probes"] >= 1
+    assert not breaker.allow()
+    
+    healthy.set()
+    deadline = time.monotonic() + 2
+    while breaker.status()["state"] != "closed" and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert breaker.status()["state"] == "closed"
+    assert breaker.call(lambda: "ok") == "ok"
+
+def test_hung_probe_times_out_and_is_retried():
+    release = threading.Event()
+    breaker = CircuitBreaker("dep", probe=lambda: release.wait(5), min_calls=1, open_seconds=0.05, call_timeout=0.05)
+    with pytest.raises(ConnectionError):
+        breaker.call(failing)
+    
+    deadline = time.monotonic() + 2
+    while breaker.status()["probes"] < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # The first probe gave up instead of leaving the breaker half-open
+    assert breaker.status()["probes"] >= 2
+    assert "timed out" in breaker.status()["last_error"]
+    assert not breaker.allow()
+    release.set()
+    breaker.reset()
@@ -0,0 +1,362 @@
+import os
+import threading
+from types import SimpleNamespace
+import sys
+sys.path.append('../backend')
+import database
+import pytest
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "test.db"))
+    yield database
+    database.close_db()
+
+def vitals(heart_rate=75):
+    return SimpleNamespace(
+        heart_rate=heart_rate,
+        blood_pressure_systolic=120,
+        blood_pressure_diastolic=80,
+        oxygen_saturation=98,
+        temperature=37.0
+    )
+
+def test_wal_enabled(db):
+    db.ensure_db()
+    assert db._connect().execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+def test_save_reading_visible_to_readers(db):
+    reading_id = db.save_reading(vitals(), 0, "LOW", "stable")
+    found, explanation = db.get_reading_explanation(reading_id)
+    assert found and explanation == "stable"
+    assert db.get_all_readings()[0]["id"] == reading_id
+
+def test_concurrent_writes_are_grouped_and_committed(db):
+    ids = []
+    lock = threading.Lock()
+    
+    def write(n):
+        for i in range(25):
+            reading_id = db.save_reading(vitals(60 + i), 2, "MODERATE", None)
+            with lock:
+                ids.append(reading_id)
+    
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert len(set(ids)) == 200
+    assert len(db.get_all_readings()) == 200
+
+def test_failed_write_does_not_discard_batch(db):
+    db.ensure_db()
+    bad = db.submit_write(lambda conn: conn.execute("INSERT INTO missing_table VALUES (1)"))
+    good = db.submit_write(lambda conn: conn.execute(db.INSERT_READING, db._reading_row("2024-01-01T00:00:00", vitals(), 0, "LOW", "ok")).lastrowid)
+    with pytest.raises(Exception):
+        bad.result()
+    assert db.get_reading_explanation(good.result()) == (True, "ok")
+
+def test_close_flushes_and_writer_restarts(db):
+    db.save_reading(vitals(), 0, "LOW", "first")
+    db.close_db()
+    db.save_reading(vitals(), 0, "LOW", "second")
+    db.flush()
+    assert [r["explanation"] for r in db.get_all_readings()] == ["second", "first"]
+
+def full_scan_report(db):
+    conn = db._connect()
+    count, hr, sys_bp, dia_bp, spo2, temp, risk = conn.execute("""
+        SELECT COUNT(*), AVG(heart_rate), AVG(blood_pressure_systolic), AVG(blood_pressure_diastolic),
+               AVG(oxygen_saturation), AVG(temperature), AVG(risk_score) FROM readings
+    """).fetchone()
+    distribution = dict(conn.execute("SELECT risk_level, COUNT(*) FROM readings GROUP BY risk_level").fetchall())
+    max_risk = conn.execute("SELECT MAX(risk_score), timestamp FROM readings").fetchone()
+    return {
+        "total_readings": count,
+        "averages": {
+            "heart_rate": round(hr, 1),
+            "blood_pressure": f"{round(sys_bp, 1)}/{round(dia_bp, 1)}",
+            "oxygen_saturation": round(spo2, 1),
+            "temperature": round(temp, 1),
+            "risk_score": round(risk, 1)
+        },
+        "risk_distribution": distribution,
+        "highest_risk": {"score": max_risk[0], "timestamp": max_risk[1]}
+    }
+
+def test_summary_matches_full_scan(db):
+    assert db.get_summary_report() == {"message": "No readings recorded"}
+    levels = ["LOW", "MODERATE", "HIGH", "CRITICAL"]
+    for i in range(40):
+        db.save_reading(vitals(60 + i), (i * 7) % 23, levels[i % 4], None)
+    db.save_readings([(vitals(90), 22, "CRITICAL", None), (vitals(95), 1, "LOW", None)])
+    assert db.get_summary_report() == full_scan_report(db)
+
+def test_clear_resets_summary(db):
+    db.save_reading(vitals(), 12, "HIGH", None)
+    db.clear_all_readings()
+    assert db.get_summary_report() == {"message": "No readings recorded"}
+    db.save_reading(vitals(80), 3, "MODERATE", None)
+    assert db.get_summary_report() == full_scan_report(db)
+
+def test_rebuild_detects_drift(db):
+    db.save_reading(vitals(), 5, "MODERATE", None)
+    assert db.rebuild_summary()["consistent"]
+    db.submit_write(lambda conn: conn.execute("UPDATE reading_stats SET total_readings = 99")).result()
+    result = db.rebuild_summary()
+    assert not result["consistent"]
+    assert result["after"] == full_scan_report(db)
+
+def test_aggregates_built_for_existing_database(tmp_path, monkeypatch):
+    import sqlite3
+    path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE readings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT NOT NULL, heart_rate INTEGER,
+            blood_pressure_systolic INTEGER, blood_pressure_diastolic INTEGER, oxygen_saturation INTEGER,
+            temperature REAL, risk_score INTEGER, risk_level TEXT, explanation TEXT
+        )
+    """)
+    conn.execute("INSERT INTO readings VALUES (NULL, '2024-01-01T00:00:00', 80, 130, 85, 97, 37.0, 4, 'MODERATE', 'x')")
+    conn.commit()
+    conn.close()
+    
+    monkeypatch.setattr(database, "DB_PATH", path)
+    try:
+        assert database.get_summary_report()["total_readings"] == 1
+    finally:
+        database.close_db()
+
+def test_rollups_match_readings(db):
+    rows = [
+        ("2024-01-01T08:30:05", 70, 1, "LOW"),
+        ("2024-01-01T08:30:40", 90, 4, "MODERATE"),
+        ("2024-01-01T08:45:00", 110, 9, "HIGH"),
+        ("2024-01-01T09:10:00", 160, 20, "CRITICAL"),
+        ("2024-01-02T00:05:00", 80, 0, "LOW"),
+    ]
+    for timestamp, heart_rate, risk_score, risk_level in rows:
+        db.save_reading(vitals(heart_rate), risk_score, risk_level, None, timestamp)
+    
+    minutes = db.get_trends("minute")
+    assert minutes[0]["bucket_start"] == "2024-01-01T08:30:00"
+    assert minutes[0]["count"] == 2
+    assert minutes[0]["heart_rate"] == {"min": 70, "max": 90, "mean": 80.0}
+    assert minutes[0]["risk_levels"] == {"LOW": 1, "MODERATE": 1, "HIGH": 0, "CRITICAL": 0}
+    
+    hours = db.get_trends("hour")
+    assert [(h["bucket_start"], h["count"]) for h in hours] == [
+        ("2024-01-01T08:00:00", 3), ("2024-01-01T09:00:00", 1), ("2024-01-02T00:00:00", 1)
+    ]
+    
+    days = db.get_trends("day", start="2024-01-02T00:00:00")
+    assert [(d["bucket_start"], d["count"]) for d in days] == [("2024-01-02T00:00:00", 1)]
+    assert db.get_trends("hour", limit=1)[0]["bucket_start"] == "2024-01-02T00:00:00"
+    
+    # Incremental rollups agree with a rebuild from the raw readings
+    before = {r: db.get_trends(r) for r in db.ROLLUP_RESOLUTIONS}
+    db.rebuild_summary()
+    assert {r: db.get_trends(r) for r in db.ROLLUP_RESOLUTIONS} == before
+    
+    db.clear_all_readings()
+    assert db.get_trends("day") == []
+
+def test_iter_readings_pages_in_order(db):
+    db.save_readings([(vitals(60 + i), i, "LOW", None) for i in range(25)])
+    chunks = list(db.iter_readings(chunk_size=10))
+    assert [len(chunk) for chunk in chunks] == [10, 10, 5]
+    ids = [reading["id"] for chunk in chunks for reading in chunk]
+    assert ids == sorted(ids) and len(set(ids)) == 25
+    assert list(db.iter_readings(chunk_size=10, risk_level="HIGH")) == []
+
+def test_patients_are_partitioned(db):
+    for i in range(6):
+        db.save_reading(SimpleNamespace(patient_id="bed-1", **vars(vitals(70 + i))), 1, "LOW", None, f"2024-01-01T08:0{i}:00")
+    db.save_reading(SimpleNamespace(patient_id="bed-2", **vars(vitals(150))), 20, "CRITICAL", None, "2024-01-01T08:03:30")
+    db.save_reading(vitals(80), 2, "MODERATE", None, "2024-01-01T08:04:00")
+    
+    bed_1 = db.get_summary_report("bed-1")
+    assert bed_1["total_readings"] == 6
+    assert bed_1["averages"]["heart_rate"] == 72.5
+    assert bed_1["risk_distribution"] == {"LOW": 6}
+    
+    ward = db.get_summary_report()
+    assert ward["total_readings"] == 8
+    assert ward["highest_risk"] == {"score": 20, "timestamp": "2024-01-01T08:03:30"}
+    assert ward == full_scan_report(db)
+    
+    assert {r["patient_id"] for r in db.get_readings(patient_id="bed-2")} == {"bed-2"}
+    assert [r["heart_rate"] for r in db.get_readings(patient_id="bed-1", limit=2)] == [75, 74]
+    
+    ward_hour = db.get_trends("hour")[0]
+    assert ward_hour["count"] == 8
+    assert ward_hour["heart_rate"]["max"] == 150
+    assert db.get_trends("hour", patient_id="bed-1")[0]["heart_rate"] == {"min": 70, "max": 75, "mean": 72.5}
+    
+    db.save_patient("bed-1", "Ada Lovelace", 36)
+    db.save_patient("bed-3", "New Admission", 50)
+    patients = {p["patient_id"]: p for p in db.get_patients()}
+    assert patients["bed-1"]["name"] == "Ada Lovelace" and patients["bed-1"]["total_readings"] == 6
+    assert patients["bed-2"]["name"] is None and patients["bed-2"]["total_readings"] == 1
+    assert patients["bed-3"]["total_readings"] == 0
+    
+    db.clear_all_readings("bed-2")
+    assert db.get_summary_report("bed-2") == {"message": "No readings recorded"}
+    assert db.get_summary_report()["total_readings"] == 7
+    assert db.rebuild_summary()["consistent"]
+
+def test_patient_queries_use_patient_indexes(db):
+    db.ensure_db()
+    conn = db._connect()
+    plans = {
+        "keyset": "SELECT id FROM readings WHERE patient_id = ? ORDER BY id DESC LIMIT 50",
+        "range": "SELECT id FROM readings WHERE patient_id = ? AND timestamp >= ? AND timestamp <= ?",
+    }
+    params = {"keyset": ("bed-1",), "range": ("bed-1", "2024-01-01", "2024-01-02")}
+    for name, query in plans.items():
+        plan = " ".join(row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + query, params[name]))
+        assert "USING" in plan and "patient" in plan, (name, plan)
+
+def test_single_patient_database_is_migrated(tmp_path, monkeypatch):
+    import sqlite3
+    path = str(tmp_path / "v0.db")
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE readings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT NOT NULL, heart_rate INTEGER,
+            blood_pressure_systolic INTEGER, blood_pressure_diastolic INTEGER, oxygen_saturation INTEGER,
+            temperature REAL, risk_score INTEGER, risk_level TEXT, explanation TEXT
+        )
+    """)
+    conn.execute("CREATE TABLE reading_stats (id INTEGER PRIMARY KEY CHECK (id = 1), total_readings INTEGER)")
+    conn.execute("INSERT INTO reading_stats VALUES (1, 1)")
+    conn.execute("INSERT INTO readings VALUES (NULL, '2024-01-01T00:00:00', 80, 130, 85, 97, 37.0, 4, 'MODERATE', 'x')")
+    conn.commit()
+    conn.close()
+    
+    monkeypatch.setattr(database, "DB_PATH", path)
+    try:
+        assert database.get_readings()[0]["patient_id"] == database.DEFAULT_PATIENT
+        assert database.get_summary_report(database.DEFAULT_PATIENT)["total_readings"] == 1
+        assert database._connect().execute("PRAGMA user_version").fetchone()[0] == database.SCHEMA_VERSION
+    finally:
+        database.close_db()
+
+def seed_days(db):
+    """Readings for two patients over four old days, plus today's"""
+    levels = ["LOW", "MODERATE", "HIGH", "CRITICAL"]
+    for day in range(1, 5):
+        for i in range(12):
+            patient = SimpleNamespace(**vars(vitals(60 + i * 5)), patient_id=f"bed-{i % 2}")
+            db.save_reading(patient, (day * i) % 23, levels[(day + i) % 4], f"note {day}-{i} " + "x" * 400,
+                            f"2024-03-0{day}T{8 + i:02d}:15:00")
+    db.save_reading(vitals(70), 1, "LOW", "today")
+
+def test_archive_reads_are_transparent(db):
+    seed_days(db)
+    queries = [
+        {}, {"limit": 7}, {"limit": 10, "before_id": 30}, {"since_id": 5, "limit": 20},
+        {"patient_id": "bed-1"}, {"risk_level": "CRITICAL", "limit": 3},
+        {"start": "2024-03-02T10:00:00", "end": "2024-03-03T09:00:00"},
+        {"limit": 5, "include_explanation": False},
+    ]
+    before = [db.get_readings(**query) for query in queries]
+    summary, trends = db.get_summary_report(), db.get_trends("hour", limit=1000)
+    
+    result = db.archive_readings(before="2024-03-04")
+    assert result["archived"] == 36 and [day["day"] for day in result["days"]] == ["2024-03-01", "2024-03-02", "2024-03-03"]
+    assert db._connect().execute("SELECT COUNT(*) FROM readings").fetchone()[0] == 13
+    assert db.archive.list_days(db.archive_dir()) == ["2024-03-01", "2024-03-02", "2024-03-03"]
+    
+    assert [db.get_readings(**query) for query in queries] == before
+    assert [r["id"] for chunk in db.iter_readings(chunk_size=8) for r in chunk] == sorted(r["id"] for r in before[0])
+    assert db.get_reading_explanation(1) == (True, "note 1-0 " + "x" * 400)
+    assert db.get_reading_explanation(9999) == (False, None)
+    
+    # Aggregates are kept, and a rebuild counts the archived readings
+    assert db.get_summary_report() == summary
+    assert db.get_trends("hour", limit=1000) == trends
+    assert db.rebuild_summary()["consistent"]
+    
+    # Running again archives nothing new and leaves no duplicates
+    assert db.archive_readings(before="2024-03-04")["archived"] == 0
+    assert db.get_readings() == before[0]
+
+def test_archive_vacuum_shrinks_database(db):
+    seed_days(db)
+    db.archive_readings(before="2024-03-05")
+    status = db.get_archive_status()
+    assert status["incremental_vacuum"] and status["free_pages"] > 0
+    assert status["archived_readings"] == 48
+    
+    result = db.vacuum()
+    assert result["free_pages_after"] == 0
+    assert result["pages_after"] == result["pages_before"] - result["free_pages_before"]
+    assert result["bytes_after"] < result["bytes_before"]
+
+def test_failed_archive_rewrite_keeps_day_file(db, monkeypatch):
+    seed_days(db)
+    db.archive_readings(before="2024-03-05")
+    day = db.archive.list_days(db.archive_dir())[0]
+    path = db.archive.day_path(db.archive_dir(), day)
+    before = db.archive.day_rows(path)
+    
+    def failing_save(*args, **kwargs):
+        raise OSError("disk full")
+    monkeypatch.setattr(db.archive.np, "savez_compressed", failing_save)
+    with pytest.raises(OSError):
+        db.archive.remove_patient(db.archive_dir(), day, "bed-0")
+    db.archive.clear_cache()
+    assert db.archive.day_rows(path) == before
+    assert not os.path.exists(path + ".tmp")
+
+def test_rewritten_day_file_is_not_served_from_cache(db):
+    seed_days(db)
+    db.archive_readings(before="2024-03-05")
+    day = db.archive.list_days(db.archive_dir())[0]
+    path = db.archive.day_path(db.archive_dir(), day)
+    mtime = os.stat(path).st_mtime_ns
+    assert any(row["patient_id"] == "bed-0" for row in db.archive.day_rows(path))
+    
+    db.archive.remove_patient(db.archive_dir(), day, "bed-0")
+    # Same mtime, as on a filesystem with coarse timestamps
+    os.utime(path, ns=(mtime, mtime))
+    assert not any(row["patient_id"] == "bed-0" for row in db.archive.day_rows(path))
+
+def test_clear_removes_archived_readings(db):
+    seed_days(db)
+    db.archive_readings(before="2024-03-05")
+    db.clear_all_readings("bed-0")
+    assert {r["patient_id"] for r in db.get_readings()} == {"bed-1", "default"}
+    assert db.get_summary_report("bed-1")["total_readings"] == 24
+    assert db.rebuild_summary()["consistent"]
+    
+    db.clear_all_readings()
+    assert db.get_readings() == []
+    assert db.archive.list_days(db.archive_dir()) == []
+    assert db.get_archive_status()["days"] == []
+
+def test_failed_clear_keeps_archive_files(db, monkeypatch):
+    seed_days(db)
+    db.archive_readings(before="2024-03-05")
+    before = db.get_readings()
+    
+    def failing_rebuild(*args, **kwargs):
+        raise RuntimeError("rebuild failed")
+    with monkeypatch.context() as patch:
+        patch.setattr(db, "_rebuild_rollups", failing_rebuild)
+        with pytest.raises(RuntimeError):
+            db.clear_all_readings()
+    assert db.archive.list_days(db.archive_dir()) == ["2024-03-01", "2024-03-02", "2024-03-03", "2024-03-04"]
+    assert db.get_readings() == before
+
+def test_uncataloged_day_file_is_not_merged(db):
+    seed_days(db)
+    stray = dict(db.get_readings(start="2024-03-01", end="2024-03-01T23:59:59")[0], id=99999)
+    # As left by a clear interrupted between its commit and removing the file
+    db.archive.write_day(db.archive_dir(), "2024-03-01", [stray])
+    db.archive_readings(before="2024-03-02")
+    assert 99999 not in {r["id"] for r in db.get_readings()}
@@ -0,0 +1,69 @@
+import pytest
+from types import SimpleNamespace
+import sys
+sys.path.append('../backend')
+from ecg_features import ECGError, decode_int16, encode_int16, extract_features, synthetic_ecg
+from risk_engine import assess_risk
+
+# (synthetic_ecg parameters) covering normal and each abnormal range of the risk engine
+CASES = [
+    {},
+    {"heart_rate": 50},
+    {"heart_rate": 110, "qt_interval": 0.34},
+    {"pr_interval": 0.24},
+    {"pr_interval": 0.11, "p_wave_duration": 0.06},
+    {"p_wave_duration": 0.13, "pr_interval": 0.20},
+    {"qrs_duration": 0.14},
+    {"qt_interval": 0.50},
+    {"t_wave_amplitude": -0.2},
+    {"t_wave_amplitude": 0.7},
+    {"st_segment_elevation": 0.2},
+    {"st_segment_elevation": -0.1},
+    {"baseline_wander": 0.3, "noise": 0.02},
+]
+
+# Allowed error per feature (seconds or mV)
+TOLERANCE = {
+    "p_wave_duration": 0.015,
+    "pr_interval": 0.015,
+    "qrs_duration": 0.01,
+    "qt_interval": 0.02,
+    "t_wave_amplitude": 0.05,
+    "st_segment_elevation": 0.03,
+}
+
+DEFAULTS = {"heart_rate": 72, "p_wave_duration": 0.08, "pr_interval": 0.16, "qrs_duration": 0.09,
+            "qt_interval": 0.40, "t_wave_amplitude": 0.3, "st_segment_elevation": 0.0}
+
+@pytest.mark.parametrize("params", CASES)
+def test_features_match_synthetic_input(params):
+    expected = {**DEFAULTS, **params}
+    features = extract_features(synthetic_ecg(**params))
+    
+    assert features["heart_rate"] == pytest.approx(expected["heart_rate"], abs=1)
+    for field, tolerance in TOLERANCE.items():
+        if field == "t_wave_amplitude" and expected["st_segment_elevation"]:
+            continue  # The T peak rides on the elevated ST segment
+        assert features[field] == pytest.approx(expected[field], abs=tolerance), field
+
+def test_int16_round_trip():
+    samples = synthetic_ecg(duration=4)
+    decoded = decode_int16(encode_int16(samples))
+    assert abs(decoded - samples).max() <= 0.0005
+    
+    with pytest.raises(ECGError):
+        decode_int16(b"\x00\x01\x02")
+
+def test_rejects_flat_or_short_strips():
+    with pytest.raises(ECGError):
+        extract_features(synthetic_ecg(duration=1))
+    with pytest.raises(ECGError):
+        extract_features([0.0] * 5000)
+
+def test_extracted_stemi_is_critical():
+    features = extract_features(synthetic_ecg(st_segment_elevation=0.2))
+    vitals = dict(features, heart_rate=round(features["heart_rate"]), blood_pressure_systolic=120,
+                  blood_pressure_diastolic=80, oxygen_saturation=98, temperature=37.0)
+    _, level, rules = assess_risk(SimpleNamespace(**vitals))
+    assert "stemi" in rules
+    assert level in ("HIGH", "CRITICAL")
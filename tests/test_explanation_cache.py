@@ -0,0 +1,68 @@
+from types import SimpleNamespace
+import sys
+sys.path.append('../backend')
+from explanation_cache import ExplanationCache, cache_key
+
+def vitals(heart_rate=75, systolic=120, diastolic=80, spo2=98, temperature=37.0):
+    return SimpleNamespace(
+        heart_rate=heart_rate,
+        blood_pressure_systolic=systolic,
+        blood_pressure_diastolic=diastolic,
+        oxygen_saturation=spo2,
+        temperature=temperature
+    )
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+    def __call__(self):
+        return self.now
+
+def test_key_quantizes_vitals():
+    assert cache_key(vitals(heart_rate=76), 0, "LOW") == cache_key(vitals(heart_rate=79), 0, "LOW")
+    assert cache_key(vitals(heart_rate=79), 0, "LOW") != cache_key(vitals(heart_rate=80), 0, "LOW")
+    assert cache_key(vitals(spo2=97), 2, "LOW") != cache_key(vitals(spo2=98), 2, "LOW")
+    assert cache_key(vitals(), 3, "MODERATE") != cache_key(vitals(), 4, "MODERATE")
+
+def test_key_includes_fired_rules():
+    stemi = cache_key(vitals(), 10, "CRITICAL", ["stemi"])
+    conduction = cache_key(vitals(), 10, "CRITICAL", ["short_p_wave", "pre_excitation", "bundle_branch_block"])
+    assert stemi != conduction
+    assert conduction == cache_key(vitals(), 10, "CRITICAL", ["bundle_branch_block", "pre_excitation", "short_p_wave"])
+
+def test_hits_and_misses():
+    cache = ExplanationCache()
+    assert cache.get("k") is None
+    cache.put("k", "stable")
+    assert cache.get("k") == "stable"
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+def test_ttl_expires_entries():
+    clock = FakeClock()
+    cache = ExplanationCache(ttl_seconds=60, clock=clock)
+    cache.put("k", "stable")
+    clock.now += 61
+    assert cache.get("k") is None
+
+def test_max_size_evicts_least_recently_used():
+    cache = ExplanationCache(max_size=2)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    cache.get("a")
+    cache.put("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.stats()["evictions"] == 1
+
+def test_persists_to_sqlite(tmp_path):
+    db_path = str(tmp_path / "cache.db")
+    clock = FakeClock()
+    ExplanationCache(db_path=db_path, ttl_seconds=60, clock=clock).put("k", "stable")
+    
+    reloaded = ExplanationCache(db_path=db_path, ttl_seconds=60, clock=clock)
+    assert reloaded.get("k") == "stable"
+    
+    clock.now += 61
+    assert ExplanationCache(db_path=db_path, ttl_seconds=60, clock=clock).get("k") is None
@@ -0,0 +1,133 @@
+import threading
+import pytest
+import sys
+sys.path.append('../backend')
+from llm_scheduler import Generation, LLMScheduler, QueueFullError
+
+class GatedLLM:
+    """Fake generate(): records prompt order and holds each generation until released"""
+
+    def __init__(self):
+        self.order = []
+        self.calls = 0
+        self.release = threading.Event()
+
+    def __call__(self, prompt):
+        self.calls += 1
+        self.order.append(prompt)
+        self.release.wait(timeout=5)
+        if prompt == "fail":
+            raise RuntimeError("ollama unavailable")
+        yield prompt
+        yield " done"
+
+def test_critical_prompts_run_before_queued_low_ones():
+    llm = GatedLLM()
+    scheduler = LLMScheduler(llm, max_concurrent=1)
+    blocker = scheduler.submit("first", "LOW")
+    while blocker.started is None:
+        pass
+    low = [scheduler.submit(f"low {i}", "LOW") for i in range(3)]
+    critical = scheduler.submit("critical", "CRITICAL")
+    assert scheduler.stats()["queue_depth"] == 4
+    assert scheduler.stats()["queued_by_level"]["CRITICAL"] == 1
+    
+    llm.release.set()
+    assert critical.result(timeout=5) == "critical done"
+    for generation in low:
+        generation.result(timeout=5)
+    assert llm.order == ["first", "critical", "low 0", "low 1", "low 2"]
+    scheduler.shutdown()
+
+def test_identical_prompts_share_one_generation():
+    llm = GatedLLM()
+    scheduler = LLMScheduler(llm, max_concurrent=1)
+    blocker = scheduler.submit("first", "LOW")
+    queued = scheduler.submit("same", "LOW")
+    # A more severe duplicate joins the queued generation and promotes it
+    assert scheduler.submit("same", "HIGH") is queued
+    assert queued.priority == 1
+    
+    tokens = []
+    queued.add_listener(on_token=tokens.append)
+    llm.release.set()
+    assert queued.result(timeout=5) == "same done"
+    blocker.result(timeout=5)
+    assert tokens == ["same", " done"]
+    assert llm.calls == 2
+    
+    stats = scheduler.stats()
+    assert stats["submitted"] == 3 and stats["coalesced"] == 1 and stats["completed"] == 2
+    assert stats["wait_seconds"]["samples"] == 2
+    assert stats["wait_seconds_by_level"]["HIGH"]["samples"] == 1
+    scheduler.shutdown()
+
+def test_full_queue_sheds_least_severe_work():
+    llm = GatedLLM()
+    scheduler = LLMScheduler(llm, max_concurrent=1, max_queued=3)
+    blocker = scheduler.submit("first", "LOW")
+    while blocker.started is None:
+        pass
+    low = [scheduler.submit(f"low {i}", "LOW") for i in range(3)]
+    # Another LOW prompt has nothing less severe to displace
+    with pytest.raises(QueueFullError):
+        scheduler.submit("low 3", "LOW")
+    # A flood of CRITICAL prompts displaces the newest LOW ones first
+    critical = [scheduler.submit(f"critical {i}", "CRITICAL") for i in range(3)]
+    assert [g.done for g in low] == [True, True, True]
+    for generation in low:
+        with pytest.raises(QueueFullError):
+            generation.result(timeout=0)
+    with pytest.raises(QueueFullError):
+        scheduler.submit("critical 3", "CRITICAL")
+    stats = scheduler.stats()
+    assert stats["queue_depth"] == 3 and stats["queued_by_level"]["CRITICAL"] == 3
+    assert stats["dropped"] == 3 and stats["rejected"] == 2
+    
+    llm.release.set()
+    for generation in critical:
+        generation.result(timeout=5)
+    assert llm.order == ["first", "critical 0", "critical 1", "critical 2"]
+    scheduler.shutdown()
+
+def test_cancel_drops_only_queued_generations():
+    llm = GatedLLM()
+    scheduler = LLMScheduler(llm, max_concurrent=1)
+    running = scheduler.submit("first", "LOW")
+    while running.started is None:
+        pass
+    queued = scheduler.submit("queued", "MODERATE")
+    assert scheduler.queued() == 1
+    assert not scheduler.cancel(running)
+    assert scheduler.cancel(queued)
+    assert scheduler.queued() == 0
+    with pytest.raises(QueueFullError):
+        queued.result(timeout=0)
+    
+    llm.release.set()
+    assert running.result(timeout=5) == "first done"
+    # Resubmitting the prompt starts a fresh generation
+    assert scheduler.submit("queued", "MODERATE").result(timeout=5) == "queued done"
+    assert llm.order == ["first", "queued"]
+    assert scheduler.stats()["cancelled"] == 1
+    scheduler.shutdown()
+
+def test_failure_reaches_every_caller():
+    llm = GatedLLM()
+    llm.release.set()
+    scheduler = LLMScheduler(llm, max_concurrent=2)
+    generation = scheduler.submit("fail", "CRITICAL")
+    finished = threading.Event()
+    generation.add_listener(on_done=lambda done: finished.set())
+    with pytest.raises(RuntimeError):
+        generation.result(timeout=5)
+    assert finished.wait(timeout=1)
+    assert scheduler.stats()["failed"] == 1
+    scheduler.shutdown()
+
+def test_completed_generation_replays_to_late_listeners():
+    generation = Generation.completed("cached text")
+    tokens, done = [], []
+    generation.add_listener(tokens.append, done.append)
+    assert tokens == ["cached text"] and done == [generation]
+    assert generation.result() == "cached text"
@@ -0,0 +1,27 @@
+import sys
+sys.path.append('../backend')
+from metrics import Counter, Histogram, server_timing
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("demo_seconds", "Demo", ["stage"], buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.5, 0.7, 3.0):
+        histogram.observe(seconds, "rag")
+    lines = histogram.render()
+    assert lines[:2] == ["# HELP demo_seconds Demo", "# TYPE demo_seconds histogram"]
+    assert 'demo_seconds_bucket{stage="rag",le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{stage="rag",le="1.0"} 3' in lines
+    assert 'demo_seconds_bucket{stage="rag",le="+Inf"} 4' in lines
+    assert 'demo_seconds_sum{stage="rag"} 4.25' in lines
+    assert 'demo_seconds_count{stage="rag"} 4' in lines
+    assert histogram.count("rag") == 4
+
+def test_counter_escapes_label_values():
+    counter = Counter("demo_total", "Demo", ["name"])
+    counter.inc('a"b')
+    counter.inc('a"b', amount=2)
+    assert counter.value('a"b') == 3
+    assert 'demo_total{name="a\\"b"} 3' in counter.render()
+
+def test_server_timing_sums_repeated_stages():
+    value = server_timing([("rag_query", 0.010), ("save_reading", 0.002), ("rag_query", 0.005)], 0.05)
+    assert value == "rag_query;dur=15.0, save_reading;dur=2.0, total;dur=50.0"
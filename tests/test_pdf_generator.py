@@ -0,0 +1,84 @@
+import gc
+import weakref
+import numpy as np
+import sys
+sys.path.append('../backend')
+from reportlab.graphics import renderPDF
+from reportlab.graphics.shapes import Path, PolyLine
+from ecg_features import synthetic_ecg
+import pdf_generator
+from pdf_generator import ECG_MV_SCALE, build_full_report, create_ecg_waveform
+
+def trace(drawing):
+    polylines = [shape for shape in drawing.contents if isinstance(shape, PolyLine)]
+    assert len(polylines) == 1
+    return np.array(polylines[0].points).reshape(-1, 2)
+
+def test_ecg_drawing_is_a_few_shapes():
+    drawing = create_ecg_waveform(beats=12)
+    assert len(drawing.contents) == 3
+    assert sum(isinstance(shape, Path) for shape in drawing.contents) == 1
+    assert renderPDF.drawToString(drawing).startswith(b"%PDF")
+
+def test_raw_samples_keep_qrs_peaks():
+    samples = synthetic_ecg(duration=10, noise=0.0, baseline_wander=0.0)
+    points = trace(create_ecg_waveform(samples=samples, width=500, height=180))
+    
+    # Min/max decimation keeps the full R and S amplitudes of every beat
+    baseline = 180 * 0.4
+    assert points[:, 1].max() == np.round(baseline + samples.max() * ECG_MV_SCALE, 1)
+    assert points[:, 1].min() == np.round(baseline + samples.min() * ECG_MV_SCALE, 1)
+    assert len(points) <= 2 * 500
+    assert np.all(np.diff(points[:, 0]) >= 0)
+
+def test_features_change_the_trace():
+    normal = trace(create_ecg_waveform(features={"heart_rate": 70}))
+    elevated = trace(create_ecg_waveform(features={"heart_rate": 70, "st_segment_elevation": 0.2}))
+    assert elevated[:, 1].mean() > normal[:, 1].mean()
+    
+    stemi = create_ecg_waveform(st_elevation=0.2)
+    assert trace(stemi).shape[0] > 10
+    polyline = [shape for shape in stemi.contents if isinstance(shape, PolyLine)][0]
+    assert polyline.strokeColor.hexval() == "0xef4444"
+
+def test_full_report_lays_out_one_chunk_at_a_time(tmp_path, monkeypatch):
+    tables = weakref.WeakSet()
+    history_table = pdf_generator._history_table
+    def tracked_table(chunk, with_patient):
+        table = history_table(chunk, with_patient)
+        tables.add(table)
+        return table
+    monkeypatch.setattr(pdf_generator, "_history_table", tracked_table)
+    
+    live = []
+    def chunks(count, size=200):
+        for i in range(count):
+            gc.collect()
+            live.append(len(tables))
+            yield [{
+                "id": i * size + j,
+                "timestamp": "2024-05-01T12:00:00",
+                "patient_id": "bed-1",
+                "heart_rate": 72,
+                "blood_pressure_systolic": 120,
+                "blood_pressure_diastolic": 80,
+                "oxygen_saturation": 98,
+                "temperature": 36.8,
+                "risk_score": 0,
+                "risk_level": "LOW"
+            } for j in range(size)]
+    
+    report = {
+        "total_readings": 1200,
+        "averages": {"heart_rate": 72, "blood_pressure": "120/80", "oxygen_saturation": 98,
+                     "temperature": 36.8, "risk_score": 0},
+        "risk_distribution": {"LOW": 1200},
+        "highest_risk": {"score": 0, "timestamp": "2024-05-01T12:00:00"}
+    }
+    out_path = tmp_path / "full.pdf"
+    build_full_report(str(out_path), report, "Test", 40, "bed-1", [], [], [], chunks(6))
+    
+    assert out_path.read_bytes().startswith(b"%PDF")
+    # Tables of chunks already drawn are released before the next chunk is read
+    assert len(live) == 6
+    assert max(live) <= 1
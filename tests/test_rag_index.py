@@ -0,0 +1,52 @@
+import random
+import time
+from types import SimpleNamespace
+import sys
+sys.path.append('../backend')
+sys.path.append('../rag_pipeline')
+from risk_engine import assess_risk
+import pytest
+import rag_query
+from rag_query import GENERIC_CONTEXT, RULE_CATEGORIES, RULE_INDEX, KnowledgeBaseUnavailable, rule_context, query_medical_knowledge
+from medical_docs import MEDICAL_DOCS
+from test_risk_engine import random_vitals
+
+def test_every_rule_is_indexed():
+    rng = random.Random(11)
+    fired = set()
+    for _ in range(3000):
+        fired.update(assess_risk(random_vitals(rng))[2])
+    assert fired <= set(RULE_CATEGORIES)
+    for rule in fired:
+        assert RULE_INDEX[rule]
+
+def test_categories_exist_in_knowledge_base():
+    categories = {doc["metadata"]["category"] for doc in MEDICAL_DOCS}
+    for rule_categories in RULE_CATEGORIES.values():
+        assert set(rule_categories) <= categories
+
+def test_stemi_context_includes_ischemia_doc():
+    context = rule_context(["stemi"])
+    assert "STEMI" in context
+    assert context.count("\n") < 3
+
+def test_unmatched_rules_fall_back():
+    assert rule_context([]) is None
+    assert rule_context(["unknown_rule"]) is None
+
+def test_query_uses_rule_index():
+    vitals = SimpleNamespace(heart_rate=130, blood_pressure_systolic=120, blood_pressure_diastolic=80, oxygen_saturation=98)
+    context = query_medical_knowledge(vitals, "MODERATE", ["tachycardia", "severe_tachycardia"])
+    assert "Tachycardia" in context
+
+def test_unloaded_collection_fails_fast(monkeypatch):
+    monkeypatch.setattr(rag_query, "_collection", None)
+    monkeypatch.setattr(rag_query, "_loading", True)
+    with pytest.raises(KnowledgeBaseUnavailable, match="loading"):
+        rag_query.get_collection()
+    
+    # Searches made meanwhile use the generic context instead of waiting for the load
+    vitals = SimpleNamespace(heart_rate=75, blood_pressure_systolic=120, blood_pressure_diastolic=80, oxygen_saturation=98)
+    started = time.monotonic()
+    assert query_medical_knowledge(vitals, "LOW", []) == GENERIC_CONTEXT
+    assert time.monotonic() - started < 0.1
@@ -0,0 +1,63 @@
+import random
+from types import SimpleNamespace
+import sys
+sys.path.append('../backend')
+from risk_engine import assess_risk, calculate_risk, calculate_risk_batch, VITAL_FIELDS
+
+# Values on and around every threshold used by calculate_risk
+BOUNDARIES = {
+    "heart_rate": [45, 59, 60, 75, 100, 101, 120, 121, 150, 151, 170],
+    "blood_pressure_systolic": [110, 140, 141, 180, 181, 200],
+    "blood_pressure_diastolic": [70, 90, 91, 120, 121, 130],
+    "oxygen_saturation": [80, 84, 85, 89, 90, 94, 95, 99],
+    "temperature": [35.5, 35.9, 36.0, 37.0, 38.0, 38.1, 39.5],
+    "p_wave_duration": [0.05, 0.06, 0.08, 0.12, 0.13],
+    "pr_interval": [0.10, 0.12, 0.16, 0.20, 0.21],
+    "qrs_duration": [0.08, 0.12, 0.13],
+    "qt_interval": [0.28, 0.30, 0.40, 0.50, 0.51],
+    "t_wave_amplitude": [-0.2, 0.0, 0.05, 0.1, 0.3, 0.6, 0.7],
+    "st_segment_elevation": [-0.2, -0.1, 0.0, 0.1, 0.15],
+}
+
+def random_vitals(rng):
+    return SimpleNamespace(**{field: rng.choice(values) for field, values in BOUNDARIES.items()})
+
+def test_batch_matches_scalar():
+    rng = random.Random(42)
+    readings = [random_vitals(rng) for _ in range(2000)]
+    batch = calculate_risk_batch(readings)
+    assert batch == [calculate_risk(v) for v in readings]
+
+def test_batch_covers_every_level():
+    rng = random.Random(7)
+    readings = [random_vitals(rng) for _ in range(2000)]
+    levels = {level for _, level in calculate_risk_batch(readings)}
+    assert levels == {"LOW", "MODERATE", "HIGH", "CRITICAL"}
+
+def test_batch_normal_reading():
+    normal = SimpleNamespace(
+        heart_rate=75, blood_pressure_systolic=120, blood_pressure_diastolic=80,
+        oxygen_saturation=98, temperature=37.0, p_wave_duration=0.08, pr_interval=0.16,
+        qrs_duration=0.09, qt_interval=0.40, t_wave_amplitude=0.3, st_segment_elevation=0.0
+    )
+    assert calculate_risk_batch([normal]) == [(0, "LOW")]
+    assert set(vars(normal)) == set(VITAL_FIELDS)
+
+def test_empty_batch():
+    assert calculate_risk_batch([]) == []
+
+def test_assess_risk_reports_fired_rules():
+    rng = random.Random(3)
+    for _ in range(500):
+        vitals = random_vitals(rng)
+        score, level, rules = assess_risk(vitals)
+        assert (score, level) == calculate_risk(vitals)
+        assert len(rules) == len(set(rules))
+
+def test_stemi_rule():
+    stemi = SimpleNamespace(
+        heart_rate=75, blood_pressure_systolic=120, blood_pressure_diastolic=80,
+        oxygen_saturation=98, temperature=37.0, p_wave_duration=0.08, pr_interval=0.16,
+        qrs_duration=0.09, qt_interval=0.40, t_wave_amplitude=0.3, st_segment_elevation=0.2
+    )
+    assert assess_risk(stemi) == (10, "CRITICAL", ["stemi"])
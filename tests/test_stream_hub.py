@@ -0,0 +1,117 @@
+import asyncio
+import threading
+import sys
+sys.path.append('../backend')
+from stream_hub import BroadcastHub, format_sse
+
+async def collect(events, count):
+    received = []
+    async for event in events:
+        if event is not None:
+            received.append(event)
+        if len(received) == count:
+            break
+    return received
+
+def test_publish_from_another_thread():
+    async def run():
+        hub = BroadcastHub()
+        events = hub.events(keepalive=0.1)
+        task = asyncio.ensure_future(collect(events, 2))
+        while hub.subscriber_count() == 0:
+            await asyncio.sleep(0.01)
+        
+        def ingest():
+            hub.publish("reading", 1, {"id": 1})
+            hub.publish("alert", 1, {"reading_id": 1})
+        threading.Thread(target=ingest).start()
+        return await asyncio.wait_for(task, timeout=2)
+    
+    received = asyncio.run(run())
+    assert [(e["event"], e["id"]) for e in received] == [("reading", 1), ("alert", 1)]
+
+def test_slow_subscriber_is_dropped():
+    async def run():
+        hub = BroadcastHub(buffer_size=2)
+        events = hub.events(keepalive=0.1)
+        first = asyncio.ensure_future(events.__anext__())
+        while hub.subscriber_count() == 0:
+            await asyncio.sleep(0.01)
+        for i in range(1, 6):
+            hub.publish("reading", i, {"id": i})
+        await asyncio.sleep(0.05)
+        
+        # The overflowed buffer is discarded and the stream ends
+        try:
+            await asyncio.wait_for(first, timeout=1)
+            ended = False
+        except StopAsyncIteration:
+            ended = True
+        return ended, hub.dropped, hub.subscriber_count()
+    
+    ended, dropped, subscribers = asyncio.run(run())
+    assert ended
+    assert dropped == 1
+    assert subscribers == 0
+
+def test_resume_backfills_without_duplicates():
+    stored = [
+        {"id": 4, "event": "reading", "data": {"id": 4}},
+        {"id": 5, "event": "reading", "data": {"id": 5}},
+    ]
+    
+    async def run():
+        hub = BroadcastHub()
+        
+        def backfill(last_id):
+            # A reading committed while resuming is both stored and published
+            hub.publish("reading", 5, {"id": 5})
+            return [event for event in stored if event["id"] > last_id]
+        
+        events = hub.events(last_id=3, backfill=backfill, keepalive=0.1)
+        task = asyncio.ensure_future(collect(events, 3))
+        while hub.subscriber_count() == 0:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+        hub.publish("reading", 6, {"id": 6})
+        return await asyncio.wait_for(task, timeout=2)
+    
+    received = asyncio.run(run())
+    assert [e["id"] for e in received] == [4, 5, 6]
+
+def test_events_without_id_pass_after_backfill():
+    async def run():
+        hub = BroadcastHub()
+        events = hub.events(last_id=3, backfill=lambda last_id: [{"id": 5, "event": "reading", "data": {"id": 5}}], keepalive=0.1)
+        task = asyncio.ensure_future(collect(events, 2))
+        while hub.subscriber_count() == 0:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+        hub.publish("explanation", None, {"id": 2})
+        return await asyncio.wait_for(task, timeout=2)
+    
+    received = asyncio.run(run())
+    assert [(e["event"], e["id"]) for e in received] == [("reading", 5), ("explanation", None)]
+
+def test_format_sse():
+    assert format_sse({"id": 7, "event": "reading", "data": {"id": 7}}) == 'id: 7\nevent: reading\ndata: {"id": 7}\n\n'
+    # Explanation updates must not move the client's Last-Event-ID
+    assert format_sse({"id": None, "event": "explanation", "data": {"id": 3}}) == 'event: explanation\ndata: {"id": 3}\n\n'
+    assert format_sse(None).startswith(":")
+
+def test_match_filters_before_queueing():
+    async def run():
+        hub = BroadcastHub(buffer_size=2)
+        events = hub.events(keepalive=0.1, match=lambda event: event["data"]["id"] == 7)
+        task = asyncio.ensure_future(collect(events, 1))
+        while hub.subscriber_count() == 0:
+            await asyncio.sleep(0.01)
+        # Far more events for other readings than the buffer holds
+        for i in range(20):
+            hub.publish("token", i, {"id": 8, "text": "x"})
+        hub.publish("token", 3, {"id": 7, "text": "own"})
+        return await asyncio.wait_for(task, timeout=2), hub.dropped
+    
+    received, dropped = asyncio.run(run())
+    assert [e["data"]["text"] for e in received] == ["own"]
+    assert dropped == 0
@@ -0,0 +1,110 @@
+import threading
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+import sys
+sys.path.append('../backend')
+import main
+import ws_ingest
+
+client = TestClient(main.app)
+
+NORMAL = {
+    "heart_rate": 72,
+    "blood_pressure_systolic": 118,
+    "blood_pressure_diastolic": 78,
+    "oxygen_saturation": 98,
+    "temperature": 36.8
+}
+
+CRITICAL = dict(NORMAL, heart_rate=160, oxygen_saturation=84, st_segment_elevation=0.25)
+
+def receive_until(websocket, done):
+    messages = []
+    while not done(messages):
+        messages.append(websocket.receive_json())
+    return messages
+
+def test_stream_readings_and_credit():
+    with client.websocket_connect("/ws/ingest") as websocket:
+        assert websocket.receive_json() == {"type": "credit", "credit": ws_ingest.INGEST_WINDOW}
+        
+        for seq, vitals in enumerate([CRITICAL, NORMAL, NORMAL]):
+            websocket.send_json({"seq": seq, "vitals": vitals})
+        
+        def done(messages):
+            results = [m for m in messages if m["type"] == "result"]
+            credit = sum(m["credit"] for m in messages if m["type"] == "credit")
+            explained = any(m["type"] == "explanation" for m in messages)
+            return len(results) == 3 and credit == 3 and explained
+        messages = receive_until(websocket, done)
+    
+    results = {m["seq"]: m for m in messages if m["type"] == "result"}
+    assert results[0]["risk_level"] == "CRITICAL"
+    assert results[0]["emergency_alert"]["reading_id"] == results[0]["reading_id"]
+    assert results[2]["risk_level"] == "LOW"
+    
+    # The most severe reading of the first batch waits on the LLM
+    assert results[0]["explanation_status"] == "pending"
+    explanation = next(m for m in messages if m["type"] == "explanation")
+    assert explanation["reading_id"] == results[0]["reading_id"]
+    
+    stored = client.get("/history", params={"since_id": results[0]["reading_id"] - 1}).json()
+    assert [r["id"] for r in stored][:3] == [results[seq]["reading_id"] for seq in range(3)]
+
+def test_invalid_frames_return_credit():
+    with client.websocket_connect("/ws/ingest") as websocket:
+        websocket.receive_json()
+        websocket.send_text("not json")
+        websocket.send_json({"seq": 7, "vitals": {"heart_rate": "fast"}})
+        
+        messages = receive_until(websocket, lambda m: sum(x.get("credit", 0) for x in m) == 2)
+    
+    errors = [m for m in messages if m["type"] == "error"]
+    assert [e["seq"] for e in errors] == [None, 7]
+    assert errors[0]["detail"] == "Invalid JSON"
+
+def test_failed_batch_returns_error_and_credit(monkeypatch):
+    ingest = main.ingest_readings
+    calls = []
+    
+    def flaky_ingest(readings, explain):
+        calls.append(len(readings))
+        if len(calls) == 1:
+            raise RuntimeError("database is locked")
+        return ingest(readings, False)
+    
+    monkeypatch.setattr(main, "ingest_readings", flaky_ingest)
+    with client.websocket_connect("/ws/ingest") as websocket:
+        websocket.receive_json()
+        websocket.send_json({"seq": 1, "vitals": NORMAL})
+        assert websocket.receive_json() == {"type": "error", "seq": 1, "detail": "Reading could not be stored"}
+        assert websocket.receive_json() == {"type": "credit", "credit": 1}
+        
+        # The session keeps working after the failure
+        websocket.send_json({"seq": 2, "vitals": NORMAL})
+        messages = receive_until(websocket, lambda m: any(x["type"] == "credit" for x in m))
+    assert [m["seq"] for m in messages if m["type"] == "result"] == [2]
+
+def test_device_exceeding_credit_is_closed(monkeypatch):
+    release = threading.Event()
+    ingest = main.ingest_readings
+    
+    def slow_ingest(readings, explain):
+        release.wait(5)
+        return ingest(readings, False)
+    
+    monkeypatch.setattr(ws_ingest, "INGEST_WINDOW", 2)
+    monkeypatch.setattr(main, "ingest_readings", slow_ingest)
+    try:
+        with client.websocket_connect("/ws/ingest") as websocket:
+            assert websocket.receive_json()["credit"] == 2
+            for seq in range(3):
+                websocket.send_json({"seq": seq, "vitals": NORMAL})
+            
+            assert websocket.receive_json() == {"type": "error", "seq": None, "detail": "Credit exhausted"}
+            with pytest.raises(WebSocketDisconnect) as closed:
+                websocket.receive_json()
+            assert closed.value.code == ws_ingest.CREDIT_EXCEEDED_CLOSE_CODE
+    finally:
+        release.set()